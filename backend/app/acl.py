@@ -0,0 +1,215 @@
+"""
+Set-based record-level access control.
+
+Expresses the owner-group / creator / RecordAccess rules as SQL predicates so
+list endpoints can filter in the same statement that loads the page, instead
+of materializing every accessible ID in Python and sending it back as an
+``IN (...)`` list.
+"""
+import os
+
+from sqlalchemy import and_, or_, exists, select, true, false
+from sqlalchemy.orm import Query, Session
+
+from . import models
+from .models import now_utc
+
+ACCESS_LEVELS = {"Read": 0, "Write": 1, "Full": 2}
+ROLE_CAPS = {"Viewer": 0, "User": 1, "Manager": 2, "Admin": 2}
+UNRESTRICTED_ROLES = ["Admin", "Manager"]
+
+# Record types governed by owner_group_id + created_by + grants
+OWNED_RECORD_TYPES = [
+    "BudgetItem",
+    "BusinessCaseLineItem",
+    "WBS",
+    "Asset",
+    "PurchaseOrder",
+    "GoodsReceipt",
+    "Resource",
+    "ResourcePOAllocation",
+]
+
+# Record types accessible_ids() answers for; any other table is not access-controlled per record
+CHECKABLE_RECORD_TYPES = OWNED_RECORD_TYPES + ["BusinessCase"]
+
+# When enabled, access checks read the materialized effective_access table
+# (see app.effective_access) instead of evaluating the rules each time.
+USE_EFFECTIVE_ACCESS = os.getenv("EFFECTIVE_ACCESS_ENABLED", "").lower() in ["true", "1", "yes"]
+
+
+def levels_at_least(required_level: str):
+    """Return the access level names that satisfy required_level."""
+    required = ACCESS_LEVELS.get(required_level, 2)
+    return [level for level, value in ACCESS_LEVELS.items() if value >= required]
+
+
+def exceeds_role_cap(user: models.User, required_level: str) -> bool:
+    """Viewer cannot Write, User cannot get Full - regardless of grants."""
+    return ACCESS_LEVELS.get(required_level, 2) > ROLE_CAPS.get(user.role, 0)
+
+
+def user_group_ids_select(user_id: int):
+    """SELECT of the group IDs a user belongs to (usable as a subquery)."""
+    return select(models.UserGroupMembership.group_id).where(
+        models.UserGroupMembership.user_id == user_id
+    )
+
+
+def active_grant_filter():
+    """RecordAccess rows that have not expired."""
+    return or_(
+        models.RecordAccess.expires_at.is_(None),
+        models.RecordAccess.expires_at > now_utc()
+    )
+
+
+def granted_record_ids_select(user_id: int, record_type: str, required_level: str = "Read"):
+    """
+    SELECT of record IDs explicitly granted to the user, either directly or
+    through one of their groups, at required_level or higher.
+    """
+    return select(models.RecordAccess.record_id).where(
+        models.RecordAccess.record_type == record_type,
+        or_(
+            models.RecordAccess.user_id == user_id,
+            models.RecordAccess.group_id.in_(user_group_ids_select(user_id))
+        ),
+        models.RecordAccess.access_level.in_(levels_at_least(required_level)),
+        active_grant_filter()
+    )
+
+
+def effective_record_ids_select(user_id: int, record_type: str, required_level: str = "Read"):
+    """SELECT of record IDs the user can access according to effective_access."""
+    return select(models.EffectiveAccess.record_id).where(
+        models.EffectiveAccess.user_id == user_id,
+        models.EffectiveAccess.record_type == record_type,
+        models.EffectiveAccess.level.in_(levels_at_least(required_level)),
+        or_(
+            models.EffectiveAccess.expires_at.is_(None),
+            models.EffectiveAccess.expires_at > now_utc()
+        )
+    )
+
+
+def has_effective_access(db: Session, user: models.User, record_type: str, record_id: int, required_level: str = "Read") -> bool:
+    """Single indexed lookup against effective_access for one record."""
+    return db.query(
+        effective_record_ids_select(user.id, record_type, required_level)
+        .where(models.EffectiveAccess.record_id == record_id)
+        .exists()
+    ).scalar()
+
+
+def record_access_clause(user: models.User, model, record_type: str = None, required_level: str = "Read"):
+    """
+    Build a WHERE clause matching the rows of `model` the user can access.
+
+    A row is accessible if:
+    1. The user is a member of its owner_group_id
+    2. The user created it
+    3. There is an unexpired RecordAccess grant (user or group) at required_level+
+
+    Admin/Manager see everything; role caps apply before any grant.
+    """
+    if user.role in UNRESTRICTED_ROLES:
+        return true()
+    if exceeds_role_cap(user, required_level):
+        return false()
+
+    record_type = record_type or model.__name__
+    if USE_EFFECTIVE_ACCESS and record_type in OWNED_RECORD_TYPES:
+        return model.id.in_(effective_record_ids_select(user.id, record_type, required_level))
+
+    clauses = []
+    if hasattr(model, "owner_group_id"):
+        clauses.append(model.owner_group_id.in_(user_group_ids_select(user.id)))
+    if hasattr(model, "created_by"):
+        clauses.append(model.created_by == user.id)
+    clauses.append(model.id.in_(granted_record_ids_select(user.id, record_type, required_level)))
+    return or_(*clauses)
+
+
+def filter_accessible(query: Query, user: models.User, model, record_type: str = None, required_level: str = "Read") -> Query:
+    """Restrict a list query to the rows the user can access."""
+    if user.role in UNRESTRICTED_ROLES:
+        return query
+    return query.filter(record_access_clause(user, model, record_type, required_level))
+
+
+def business_case_access_clause(user: models.User, required_level: str = "Read"):
+    """
+    Set-based version of the hybrid BusinessCase rule (see
+    auth.check_business_case_access):
+
+    - Read: creator, line-item access, or explicit BusinessCase grant
+    - Write/Full with lead_group_id: lead-group membership (Write only) or an
+      explicit BusinessCase grant at the required level
+    - Write/Full without lead_group_id: line-item access or explicit grant
+
+    Line-item access means some line item's budget item is owned by one of the
+    user's groups, or is explicitly granted at required_level+.
+    """
+    if user.role in UNRESTRICTED_ROLES:
+        return true()
+    if exceeds_role_cap(user, required_level):
+        return false()
+
+    bc = models.BusinessCase
+    line_item = models.BusinessCaseLineItem
+    budget_item = models.BudgetItem
+    group_ids = user_group_ids_select(user.id)
+
+    bc_grant = bc.id.in_(granted_record_ids_select(user.id, "BusinessCase", required_level))
+    line_item_access = exists().where(
+        line_item.business_case_id == bc.id,
+        budget_item.id == line_item.budget_item_id,
+        or_(
+            budget_item.owner_group_id.in_(group_ids),
+            budget_item.id.in_(granted_record_ids_select(user.id, "BudgetItem", required_level))
+        )
+    )
+
+    if required_level == "Read":
+        return or_(bc.created_by == user.id, line_item_access, bc_grant)
+
+    if required_level == "Write":
+        lead_group_access = or_(bc.lead_group_id.in_(group_ids), bc_grant)
+    else:
+        lead_group_access = bc_grant
+
+    return or_(
+        and_(bc.lead_group_id.isnot(None), lead_group_access),
+        and_(bc.lead_group_id.is_(None), or_(line_item_access, bc_grant))
+    )
+
+
+# Keep each IN (...) well under SQLite's bound-parameter limit
+ID_BATCH_SIZE = 500
+
+
+def accessible_ids(db: Session, user: models.User, record_type: str, record_ids, required_level: str = "Read") -> set:
+    """
+    Return the subset of record_ids the user can access at required_level.
+
+    One query per ID_BATCH_SIZE IDs, regardless of how the access was granted.
+    Raises ValueError for a record type outside CHECKABLE_RECORD_TYPES.
+    """
+    if record_type not in CHECKABLE_RECORD_TYPES:
+        raise ValueError(f"Unknown record type: {record_type}")
+    model = getattr(models, record_type)
+
+    if record_type == "BusinessCase":
+        clause = business_case_access_clause(user, required_level)
+    else:
+        clause = record_access_clause(user, model, record_type, required_level)
+
+    ids = list(dict.fromkeys(record_ids))
+    allowed = set()
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        batch = ids[start:start + ID_BATCH_SIZE]
+        allowed.update(
+            record_id for (record_id,) in db.query(model.id).filter(model.id.in_(batch), clause)
+        )
+    return allowed
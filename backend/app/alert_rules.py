@@ -0,0 +1,188 @@
+"""
+Set-based alert rules.
+
+Each rule family is one SQL statement: goods receipts are aggregated per PO in
+a grouped subquery, the Asset -> WBS -> Line Item -> Business Case chain is
+checked with outer joins, resource allocations with NOT EXISTS, and the
+caller's access filter is part of the same WHERE clause. The number of queries
+is fixed no matter how many POs or resources exist; Python only formats the
+rows that matched.
+
+Every alert carries the PO or resource it was computed for (source_type,
+source_id), which alert_store uses to recompute and access-filter it.
+Without a user the rules run unfiltered, for alert_store.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, exists, func, or_, select, type_coerce, Numeric
+from sqlalchemy.orm import Session
+
+from . import acl, models
+
+# A PO is low on balance when less than 1/LOW_BALANCE_DIVISOR (10%) remains
+LOW_BALANCE_DIVISOR = 10
+
+
+def _month_bounds(now: datetime):
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def purchase_order_alerts(
+    db: Session,
+    user: Optional[models.User] = None,
+    now: datetime = None,
+    po_ids: Optional[Iterable[int]] = None
+) -> List[Dict[str, Any]]:
+    """Low balance, no GR this month and missing Asset/WBS/Business Case chain."""
+    now = now or datetime.now()
+    month_start, month_end = _month_bounds(now)
+
+    PO = models.PurchaseOrder
+    GR = models.GoodsReceipt
+    Asset = models.Asset
+    WBS = models.WBS
+    LineItem = models.BusinessCaseLineItem
+    BC = models.BusinessCase
+
+    gr_totals = (
+        select(
+            GR.po_id.label("po_id"),
+            func.sum(GR.amount).label("received"),
+            func.max(case(
+                (and_(GR.gr_date >= month_start, GR.gr_date < month_end), 1),
+                else_=0
+            )).label("has_gr_this_month"),
+        )
+        .group_by(GR.po_id)
+        .subquery()
+    )
+
+    remaining = type_coerce(PO.total_amount - func.coalesce(gr_totals.c.received, 0), Numeric(10, 2))
+    low_balance = and_(PO.status == "Open", remaining * LOW_BALANCE_DIVISOR < PO.total_amount)
+    no_gr_this_month = and_(PO.status == "Open", func.coalesce(gr_totals.c.has_gr_this_month, 0) == 0)
+
+    statement = (
+        select(
+            PO.id, PO.po_number,
+            remaining.label("remaining"),
+            low_balance.label("low_balance"),
+            no_gr_this_month.label("no_gr_this_month"),
+            Asset.id.label("asset_id"), Asset.asset_code,
+            WBS.id.label("wbs_id"), WBS.wbs_code,
+            BC.id.label("business_case_id"),
+        )
+        .select_from(PO)
+        .outerjoin(gr_totals, gr_totals.c.po_id == PO.id)
+        .outerjoin(Asset, Asset.id == PO.asset_id)
+        .outerjoin(WBS, WBS.id == Asset.wbs_id)
+        .outerjoin(LineItem, LineItem.id == WBS.business_case_line_item_id)
+        .outerjoin(BC, BC.id == LineItem.business_case_id)
+        .where(or_(low_balance, no_gr_this_month, Asset.id.is_(None), WBS.id.is_(None), BC.id.is_(None)))
+        .order_by(PO.id)
+    )
+    if user is not None:
+        statement = statement.where(acl.record_access_clause(user, PO, "PurchaseOrder"))
+    if po_ids is not None:
+        statement = statement.where(PO.id.in_(list(po_ids)))
+
+    alerts = []
+    for row in db.execute(statement):
+        source = {"source_type": "PurchaseOrder", "source_id": row.id}
+        if row.low_balance:
+            alerts.append({
+                "type": "low_po_balance",
+                "message": f"PO {row.po_number} has low balance ({row.remaining} remaining)",
+                "severity": "warning",
+                "entity_id": row.id,
+                "entity_type": "purchase_order",
+                **source
+            })
+        if row.no_gr_this_month:
+            alerts.append({
+                "type": "no_gr_this_month",
+                "message": f"PO {row.po_number} has no Goods Receipt for this month ({now.year}-{now.month:02d})",
+                "severity": "info",
+                "entity_id": row.id,
+                "entity_type": "purchase_order",
+                **source
+            })
+        if row.asset_id is None:
+            alerts.append({
+                "type": "missing_chain",
+                "message": f"PO {row.po_number} is missing an Asset",
+                "severity": "error",
+                "entity_id": row.id,
+                "entity_type": "purchase_order",
+                **source
+            })
+        elif row.wbs_id is None:
+            alerts.append({
+                "type": "missing_chain",
+                "message": f"Asset {row.asset_code} (linked to PO {row.po_number}) is missing a WBS",
+                "severity": "error",
+                "entity_id": row.asset_id,
+                "entity_type": "asset",
+                **source
+            })
+        elif row.business_case_id is None:
+            alerts.append({
+                "type": "missing_chain",
+                "message": f"WBS {row.wbs_code} (linked to PO {row.po_number}) is missing a Business Case",
+                "severity": "error",
+                "entity_id": row.wbs_id,
+                "entity_type": "wbs",
+                **source
+            })
+    return alerts
+
+
+def resource_alerts(
+    db: Session,
+    user: Optional[models.User] = None,
+    now: datetime = None,
+    resource_ids: Optional[Iterable[int]] = None
+) -> List[Dict[str, Any]]:
+    """Active resources without an allocation covering today."""
+    now = now or datetime.now()
+    today = now.date()
+    day_start = datetime.combine(today, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+
+    Resource = models.Resource
+    Alloc = models.ResourcePOAllocation
+
+    covered_today = exists().where(
+        Alloc.resource_id == Resource.id,
+        Alloc.allocation_start < day_end,
+        Alloc.allocation_end >= day_start,
+    )
+    statement = (
+        select(Resource.id, Resource.name)
+        .where(Resource.status == "Active", ~covered_today)
+        .order_by(Resource.id)
+    )
+    if user is not None:
+        statement = statement.where(acl.record_access_clause(user, Resource, "Resource"))
+    if resource_ids is not None:
+        statement = statement.where(Resource.id.in_(list(resource_ids)))
+
+    return [
+        {
+            "type": "resource_without_po",
+            "message": f"Resource {row.name} is Active but has no PO allocation for today ({today})",
+            "severity": "warning",
+            "entity_id": row.id,
+            "entity_type": "resource",
+            "source_type": "Resource",
+            "source_id": row.id
+        }
+        for row in db.execute(statement)
+    ]
+
+
+def compute_alerts(db: Session, user: Optional[models.User] = None, now: datetime = None) -> List[Dict[str, Any]]:
+    now = now or datetime.now()
+    return purchase_order_alerts(db, user, now) + resource_alerts(db, user, now)
@@ -0,0 +1,209 @@
+"""
+Persisted alerts, recomputed only where something changed.
+
+- Writes to POs, GRs, allocations, resources, assets, WBS, line items and
+  business cases mark the touched records in alert_dirty (session flush
+  listener, same transaction as the write).
+- refresh_dirty() resolves those marks to the affected POs and resources and
+  recomputes just their alerts with app.alert_rules.
+- "No GR this month" and "no allocation today" change with the calendar, not
+  with writes, so sweep_if_due() recomputes everything once per day (which
+  covers month boundaries). The first caller of the day claims the sweep by
+  updating alert_sweep, so concurrent workers do not repeat it.
+- read_alerts() is an indexed read of the alert table, filtered by the
+  caller's access to each alert's PO or resource.
+- Sources whose alerts actually changed are published to app.events, so
+  connected clients get the delta instead of re-fetching /alerts.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import and_, delete, event, insert, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import acl, alert_rules, events, hierarchy, models
+from .models import now_utc
+
+# Changes to these records can change alerts; GRs and allocations are marked as their PO / resource
+MARKED_TYPES = (
+    models.PurchaseOrder, models.Resource, models.Asset, models.WBS,
+    models.BusinessCaseLineItem, models.BusinessCase,
+)
+
+
+def _old_and_new(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return set(history.deleted or ()) | set(history.unchanged or ()) | set(history.added or ())
+
+
+@event.listens_for(Session, "after_flush")
+def mark_alerts_dirty(session, flush_context):
+    marks = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, models.GoodsReceipt):
+            marks |= {("PurchaseOrder", po_id) for po_id in _old_and_new(obj, "po_id")}
+        elif isinstance(obj, models.ResourcePOAllocation):
+            marks |= {("Resource", resource_id) for resource_id in _old_and_new(obj, "resource_id")}
+        elif isinstance(obj, MARKED_TYPES):
+            marks.add((type(obj).__name__, obj.id))
+
+    marks = {(entity_type, entity_id) for entity_type, entity_id in marks if entity_id is not None}
+    if not marks:
+        return
+    session.connection().execute(insert(models.AlertDirty), [
+        {"entity_type": entity_type, "entity_id": entity_id, "marked_at": now_utc()}
+        for entity_type, entity_id in marks
+    ])
+
+
+def _affected_sources(db: Session, marks):
+    """Resolve dirty marks to the PO and resource IDs whose alerts must be recomputed."""
+    by_type = {}
+    for entity_type, entity_id in marks:
+        by_type.setdefault(entity_type, set()).add(entity_id)
+
+    po_ids = set(by_type.get("PurchaseOrder", ()))
+    resource_ids = set(by_type.get("Resource", ()))
+
+    # Records above a PO in the chain: every PO below them, one closure lookup
+    ancestors = [
+        (entity_type, entity_id)
+        for entity_type in ("Asset", "WBS", "BusinessCaseLineItem", "BusinessCase")
+        for entity_id in by_type.get(entity_type, ())
+    ]
+    if ancestors:
+        po_ids |= set(db.execute(hierarchy.descendants_of_any_select(ancestors, "PurchaseOrder")).scalars())
+
+    return po_ids, resource_ids
+
+
+def _store(db: Session, alerts: List[Dict[str, Any]]):
+    if not alerts:
+        return
+    computed_at = now_utc()
+    db.execute(insert(models.Alert), [
+        {
+            "source_type": alert["source_type"],
+            "source_id": alert["source_id"],
+            "rule": alert["type"],
+            "entity_type": alert["entity_type"],
+            "entity_id": alert["entity_id"],
+            "severity": alert["severity"],
+            "message": alert["message"],
+            "computed_at": computed_at,
+        }
+        for alert in alerts
+    ])
+
+
+def _public(alert: Dict[str, Any]) -> Dict[str, Any]:
+    """The /alerts representation of a computed or stored alert."""
+    return {key: alert[key] for key in ("type", "message", "severity", "entity_id", "entity_type")}
+
+
+def _replace(db: Session, source_type: str, source_ids: List[int], alerts: List[Dict[str, Any]]) -> Dict[tuple, list]:
+    """Swap the stored alerts of some sources; returns the new alerts of the sources that changed."""
+    Alert = models.Alert
+    where = (Alert.source_type == source_type, Alert.source_id.in_(source_ids))
+    old = {source_id: [] for source_id in source_ids}
+    for row in db.execute(select(Alert).where(*where).order_by(Alert.id)).scalars():
+        old[row.source_id].append({
+            "type": row.rule, "message": row.message, "severity": row.severity,
+            "entity_id": row.entity_id, "entity_type": row.entity_type,
+        })
+    new = {source_id: [] for source_id in source_ids}
+    for alert in alerts:
+        new[alert["source_id"]].append(_public(alert))
+
+    db.execute(delete(Alert).where(*where))
+    _store(db, alerts)
+    return {(source_type, source_id): new[source_id] for source_id in source_ids if new[source_id] != old[source_id]}
+
+
+def refresh_sources(db: Session, po_ids: Iterable[int], resource_ids: Iterable[int], now: datetime = None):
+    """Replace the alerts of the given POs and resources."""
+    now = now or datetime.now()
+    po_ids, resource_ids = list(po_ids), list(resource_ids)
+    deltas = {}
+    if po_ids:
+        deltas.update(_replace(db, "PurchaseOrder", po_ids,
+                               alert_rules.purchase_order_alerts(db, now=now, po_ids=po_ids)))
+    if resource_ids:
+        deltas.update(_replace(db, "Resource", resource_ids,
+                               alert_rules.resource_alerts(db, now=now, resource_ids=resource_ids)))
+    events.record_alert_deltas(db, deltas)
+
+
+def refresh_dirty(db: Session, now: datetime = None) -> int:
+    """Recompute alerts for everything marked dirty. Returns the number of marks processed."""
+    marks = db.execute(select(models.AlertDirty.id, models.AlertDirty.entity_type, models.AlertDirty.entity_id)).all()
+    if not marks:
+        return 0
+    po_ids, resource_ids = _affected_sources(db, {(row.entity_type, row.entity_id) for row in marks})
+    refresh_sources(db, po_ids, resource_ids, now)
+    # Marks added while we were computing have higher IDs and stay for the next refresh
+    db.execute(delete(models.AlertDirty).where(models.AlertDirty.id <= max(row.id for row in marks)))
+    return len(marks)
+
+
+def rebuild(db: Session, now: datetime = None) -> int:
+    """Recompute every alert. Returns the number of alerts stored."""
+    db.execute(delete(models.AlertDirty))
+    db.execute(delete(models.Alert))
+    alerts = alert_rules.compute_alerts(db, now=now or datetime.now())
+    _store(db, alerts)
+    events.record_alerts_reset(db)
+    return len(alerts)
+
+
+def sweep_if_due(db: Session, now: datetime = None) -> bool:
+    """Run the daily full recomputation if nobody has done it today."""
+    now = now or datetime.now()
+    today = now.date().isoformat()
+    claimed = db.execute(
+        update(models.AlertSweep)
+        .where(models.AlertSweep.id == 1, models.AlertSweep.day != today)
+        .values(day=today, swept_at=now_utc())
+    ).rowcount
+    if not claimed:
+        if db.get(models.AlertSweep, 1) is not None:
+            return False
+        db.add(models.AlertSweep(id=1, day=today, swept_at=now_utc()))
+        db.flush()
+    rebuild(db, now)
+    return True
+
+
+def bring_up_to_date(db: Session, now: datetime = None):
+    """Daily sweep if due, otherwise refresh what changed; commits when anything was recomputed."""
+    if sweep_if_due(db, now) or refresh_dirty(db, now):
+        db.commit()
+
+
+def read_alerts(db: Session, user: models.User) -> List[Dict[str, Any]]:
+    Alert = models.Alert
+    statement = select(Alert)
+    if user.role not in acl.UNRESTRICTED_ROLES:
+        accessible_pos = select(models.PurchaseOrder.id).where(
+            acl.record_access_clause(user, models.PurchaseOrder, "PurchaseOrder")
+        )
+        accessible_resources = select(models.Resource.id).where(
+            acl.record_access_clause(user, models.Resource, "Resource")
+        )
+        statement = statement.where(or_(
+            and_(Alert.source_type == "PurchaseOrder", Alert.source_id.in_(accessible_pos)),
+            and_(Alert.source_type == "Resource", Alert.source_id.in_(accessible_resources)),
+        ))
+    # PO alerts first, then resources; rule order within a source is insertion order
+    statement = statement.order_by(Alert.source_type, Alert.source_id, Alert.id)
+
+    return [
+        {
+            "type": alert.rule,
+            "message": alert.message,
+            "severity": alert.severity,
+            "entity_id": alert.entity_id,
+            "entity_type": alert.entity_type,
+        }
+        for alert in db.execute(statement).scalars()
+    ]
@@ -0,0 +1,424 @@
+"""
+Monthly archival of old audit entries to compressed segment files.
+
+audit_log shares the SQLite file with the operational data, so as it grows it
+slows backups, VACUUM and its own queries. The archive_audit_log job
+(AUDIT_ARCHIVE_ENABLED) moves every complete month older than
+AUDIT_RETENTION_DAYS out of the table into append-only files under
+AUDIT_ARCHIVE_DIR:
+
+- audit-YYYY-MM.<first id>-<last id>.jsonl.gz: one JSON object per entry in
+  (timestamp, id) order, written as independent gzip members of
+  ARCHIVE_BLOCK_SIZE lines, so one block is read without the rest;
+- the same name with .idx.json: the sparse index, one item per block with its
+  byte range, first and last (timestamp, id), its users and the record ids
+  it holds per table.
+
+Segments are never rewritten; rows of a month that arrive after it was
+archived go to another segment on the next run. The files are fsynced before
+one transaction records the segment in audit_archive_segment and deletes its
+rows, so a crash leaves at worst an unreferenced file. In that transaction
+every record of the month also gets an audit_snapshot of its state at the
+end of the month, so point-in-time lookups after the archive horizon start
+from a snapshot and never open a segment.
+
+read_entries() reads the segments newest first with the audit API's filters;
+the API continues into it once the hot table has no more matching rows.
+
+Usage:
+    python -m app.audit_archive run [--dry-run]
+    python -m app.audit_archive verify
+"""
+import argparse
+import gzip
+import heapq
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import audit_history, models
+from .models import as_utc, now_utc
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ARCHIVE_ENABLED = os.getenv("AUDIT_ARCHIVE_ENABLED", "false").lower() in ["true", "1", "yes"]
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "../audit_archive")
+ARCHIVE_BLOCK_SIZE = 1000
+READ_BATCH_SIZE = 5000
+
+
+def _month_start(value: datetime) -> datetime:
+    """First instant of the value's month, as naive UTC like the stored timestamps."""
+    return as_utc(value).replace(tzinfo=None, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _key(entry) -> Tuple[datetime, int]:
+    return as_utc(entry.timestamp), entry.id
+
+
+def _path(name: str) -> str:
+    return os.path.join(AUDIT_ARCHIVE_DIR, name)
+
+
+def _fsync_replace(tmp_path: str, path: str):
+    os.replace(tmp_path, path)
+    directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+# Writing
+
+class SegmentWriter:
+    """Writes one segment and its sparse index; the files appear under their final name on close()."""
+
+    def __init__(self, month: str):
+        os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+        self.month = month
+        self.tmp_path = _path(f"audit-{month}.partial")
+        self.file = open(self.tmp_path, "wb")
+        self.blocks: List[Dict[str, Any]] = []
+        self.lines: List[str] = []
+        self.block_rows: List[Any] = []
+        self.first = self.last = None
+        self.entries = 0
+        self.first_id = self.last_id = None
+
+    def add(self, row):
+        item = {column: getattr(row, column) for column in row._fields}
+        item["timestamp"] = as_utc(row.timestamp).isoformat()
+        self.lines.append(json.dumps(item))
+        self.block_rows.append(row)
+        self.entries += 1
+        self.first_id = row.id if self.first_id is None else min(self.first_id, row.id)
+        self.last_id = row.id if self.last_id is None else max(self.last_id, row.id)
+        if len(self.lines) >= ARCHIVE_BLOCK_SIZE:
+            self._write_block()
+
+    def _write_block(self):
+        if not self.lines:
+            return
+        data = gzip.compress(("\n".join(self.lines) + "\n").encode(), compresslevel=6)
+        records: Dict[str, set] = {}
+        for row in self.block_rows:
+            records.setdefault(row.table_name, set()).add(row.record_id)
+        first, last = self.block_rows[0], self.block_rows[-1]
+        self.blocks.append({
+            "offset": self.file.tell(),
+            "length": len(data),
+            "entries": len(self.lines),
+            "first": [as_utc(first.timestamp).isoformat(), first.id],
+            "last": [as_utc(last.timestamp).isoformat(), last.id],
+            "users": sorted({row.user_id for row in self.block_rows if row.user_id is not None}),
+            "records": {table: sorted(ids) for table, ids in records.items()},
+        })
+        self.file.write(data)
+        self.lines, self.block_rows = [], []
+
+    def close(self) -> Dict[str, Any]:
+        """Flush, fsync and publish the segment; returns its manifest values."""
+        self._write_block()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        name = f"audit-{self.month}.{self.first_id}-{self.last_id}.jsonl.gz"
+        index_tmp = _path(name + ".idx.partial")
+        with open(index_tmp, "w") as index:
+            json.dump({"blocks": self.blocks}, index)
+            index.flush()
+            os.fsync(index.fileno())
+        _fsync_replace(self.tmp_path, _path(name))
+        _fsync_replace(index_tmp, _path(name + ".idx.json"))
+        return {
+            "name": name,
+            "month": self.month,
+            "first_id": self.first_id,
+            "last_id": self.last_id,
+            "first_timestamp": datetime.fromisoformat(self.blocks[0]["first"][0]),
+            "last_timestamp": datetime.fromisoformat(self.blocks[-1]["last"][0]),
+            "entries": self.entries,
+            "size_bytes": size,
+            "created_at": now_utc(),
+        }
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def _end_of_month_snapshots(db: Session, month_rows, month_end: datetime) -> List[Dict[str, Any]]:
+    """audit_snapshot rows holding each record's state at the end of the month being archived."""
+    snapshot = models.AuditSnapshot.__table__
+    last = db.execute(
+        select(models.AuditLog.table_name, models.AuditLog.record_id,
+               func.max(models.AuditLog.id).label("audit_log_id"),
+               func.max(models.AuditLog.timestamp).label("timestamp"))
+        .where(month_rows)
+        .group_by(models.AuditLog.table_name, models.AuditLog.record_id)
+        .order_by(models.AuditLog.table_name, models.AuditLog.record_id)
+    ).all()
+    rows = []
+    for start in range(0, len(last), audit_history.STATE_BATCH_SIZE):
+        batch = last[start:start + audit_history.STATE_BATCH_SIZE]
+        for table_name in {row.table_name for row in batch}:
+            group = [row for row in batch if row.table_name == table_name]
+            existing = set(db.execute(select(snapshot.c.record_id, snapshot.c.audit_log_id).where(
+                snapshot.c.table_name == table_name,
+                snapshot.c.audit_log_id.in_([row.audit_log_id for row in group])
+            )).all())
+            states = audit_history.states_as_of(db, table_name, [row.record_id for row in group],
+                                                month_end - timedelta(microseconds=1))
+            for row in group:
+                # A record deleted by then gets a "null" state, so later lookups need not read the month
+                if (row.record_id, row.audit_log_id) not in existing:
+                    rows.append({"table_name": table_name, "record_id": row.record_id,
+                                 "audit_log_id": row.audit_log_id, "timestamp": row.timestamp,
+                                 "state": json.dumps(states[row.record_id])})
+    return rows
+
+
+def archive_month(db: Session, month: datetime, high_id: int) -> Optional[Dict[str, Any]]:
+    """Move the month's entries (up to high_id) to a new segment; returns its manifest values."""
+    AuditLog = models.AuditLog.__table__
+    month_end = _next_month(month)
+    month_rows = and_(AuditLog.c.timestamp >= month, AuditLog.c.timestamp < month_end, AuditLog.c.id <= high_id)
+    snapshots = _end_of_month_snapshots(db, month_rows, month_end)
+
+    writer = SegmentWriter(month.strftime("%Y-%m"))
+    try:
+        after = None
+        while True:
+            query = select(AuditLog).where(month_rows)
+            if after is not None:
+                query = query.where((AuditLog.c.timestamp > after[0]) |
+                                    and_(AuditLog.c.timestamp == after[0], AuditLog.c.id > after[1]))
+            rows = db.execute(query.order_by(AuditLog.c.timestamp, AuditLog.c.id).limit(READ_BATCH_SIZE)).all()
+            for row in rows:
+                writer.add(row)
+            if len(rows) < READ_BATCH_SIZE:
+                break
+            after = (rows[-1].timestamp, rows[-1].id)
+        if not writer.entries:
+            writer.abort()
+            return None
+        segment = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    db.execute(insert(models.AuditArchiveSegment), [segment])
+    if snapshots:
+        db.execute(insert(models.AuditSnapshot), snapshots)
+    db.execute(delete(AuditLog).where(month_rows))
+    db.commit()
+    logger.info(f"Archived {segment['entries']} audit entries of {segment['month']} to {segment['name']}")
+    return segment
+
+
+def archive(db: Session, now: Optional[datetime] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Archive every complete month older than AUDIT_RETENTION_DAYS, oldest
+    first. Returns the segments written (with dry_run, the months and counts).
+    """
+    AuditLog = models.AuditLog.__table__
+    cutoff = _month_start((now or now_utc()) - timedelta(days=AUDIT_RETENTION_DAYS))
+    oldest = db.scalar(select(func.min(AuditLog.c.timestamp)))
+    high_id = db.scalar(select(func.max(AuditLog.c.id)))
+    results = []
+    month = _month_start(oldest) if oldest is not None else cutoff
+    while month < cutoff:
+        month_end = _next_month(month)
+        if dry_run:
+            count = db.scalar(select(func.count()).select_from(AuditLog).where(
+                AuditLog.c.timestamp >= month, AuditLog.c.timestamp < month_end))
+            if count:
+                results.append({"month": month.strftime("%Y-%m"), "entries": count})
+        else:
+            segment = archive_month(db, month, high_id)
+            if segment is not None:
+                results.append(segment)
+        month = month_end
+    return results
+
+
+# Reading
+
+@lru_cache(maxsize=256)
+def _index(path: str) -> List[Dict[str, Any]]:
+    # Segments are immutable, so their indexes can be cached by path
+    with open(path + ".idx.json") as index:
+        return json.load(index)["blocks"]
+
+
+def _read_block(path: str, block: Dict[str, Any]) -> List[str]:
+    """The block's JSON lines, unparsed."""
+    with open(path, "rb") as segment:
+        segment.seek(block["offset"])
+        data = gzip.decompress(segment.read(block["length"]))
+    return data.decode().splitlines()
+
+
+def _entry(item: Dict[str, Any]) -> models.AuditLog:
+    """A transient AuditLog (never added to a session) for an archived entry, with a naive UTC timestamp as stored."""
+    timestamp = datetime.fromisoformat(item["timestamp"]).replace(tzinfo=None)
+    return models.AuditLog(**{**item, "timestamp": timestamp})
+
+
+def segments(conn) -> list:
+    segment = models.AuditArchiveSegment.__table__
+    return conn.execute(select(segment).order_by(segment.c.last_timestamp.desc(), segment.c.id.desc())).all()
+
+
+def horizon(conn) -> Optional[datetime]:
+    """Timestamp of the newest archived entry, None when nothing is archived."""
+    newest = conn.execute(select(func.max(models.AuditArchiveSegment.last_timestamp))).scalar()
+    return as_utc(newest) if newest is not None else None
+
+
+def _block_matches(block, table_name, record_ids, user_id, start, end, before) -> bool:
+    if start is not None and as_utc(datetime.fromisoformat(block["last"][0])) < start:
+        return False
+    if end is not None and as_utc(datetime.fromisoformat(block["first"][0])) > end:
+        return False
+    if before is not None and (datetime.fromisoformat(block["first"][0]), block["first"][1]) >= before:
+        return False
+    if user_id is not None and user_id not in block["users"]:
+        return False
+    if table_name is not None:
+        ids = block["records"].get(table_name)
+        if ids is None or (record_ids is not None and not record_ids.intersection(ids)):
+            return False
+    return True
+
+
+def _segment_entries(path, table_name, record_ids, user_id, action, start, end, needle, before) -> Iterator:
+    line_needle = needle if needle is not None and json.dumps(needle)[1:-1] == needle else None
+    for block in reversed(_index(path)):
+        if not _block_matches(block, table_name, record_ids, user_id, start, end, before):
+            continue
+        for line in reversed(_read_block(path, block)):
+            # The line holds the values JSON-encoded once more; a needle that
+            # encoding leaves alone must appear in it, which skips parsing most lines
+            if line_needle is not None and line_needle not in line.lower():
+                continue
+            item = json.loads(line)
+            if (table_name is not None and item["table_name"] != table_name) or \
+                    (record_ids is not None and item["record_id"] not in record_ids) or \
+                    (user_id is not None and item["user_id"] != user_id) or \
+                    (action is not None and item["action"] != action):
+                continue
+            if needle is not None and not any(
+                needle in (item.get(column) or "").lower() for column in ("old_values", "new_values", "changes")
+            ):
+                continue
+            timestamp = datetime.fromisoformat(item["timestamp"])
+            if (before is not None and (timestamp, item["id"]) >= before) or \
+                    (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            yield _entry(item)
+
+
+def read_entries(conn, table_name: Optional[str] = None, record_ids: Optional[List[int]] = None,
+                 user_id: Optional[int] = None, action: Optional[str] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None, q: Optional[str] = None,
+                 before: Optional[Tuple[datetime, int]] = None) -> Iterator[models.AuditLog]:
+    """
+    Archived entries matching the filters (the same as the audit list's), newest
+    first by (timestamp, id), older than `before` if given. Blocks are only
+    decompressed when the index says they can hold a match and the reader gets
+    that far.
+    """
+    start = as_utc(start) if start is not None else None
+    end = as_utc(end) if end is not None else None
+    before = (as_utc(before[0]), before[1]) if before is not None else None
+    record_ids = set(record_ids) if record_ids is not None else None
+    # Same matching as the SQL LIKE: JSON-encoded, ASCII case-insensitive
+    needle = json.dumps(q)[1:-1].lower() if q else None
+    streams = []
+    for segment in segments(conn):
+        if (start is not None and as_utc(segment.last_timestamp) < start) or \
+                (end is not None and as_utc(segment.first_timestamp) > end) or \
+                (before is not None and (as_utc(segment.first_timestamp), segment.first_id) >= before):
+            continue
+        streams.append(_segment_entries(_path(segment.name), table_name, record_ids, user_id,
+                                        action, start, end, needle, before))
+    # Segments of one month can overlap in time
+    return heapq.merge(*streams, key=_key, reverse=True)
+
+
+def record_ids(conn, table_name: str) -> List[int]:
+    """Ids of every record of a table with archived entries, ascending."""
+    ids = set()
+    for segment in segments(conn):
+        for block in _index(_path(segment.name)):
+            ids.update(block["records"].get(table_name, ()))
+    return sorted(ids)
+
+
+def verify(conn) -> List[str]:
+    """Problems found reading every segment back against the manifest."""
+    problems = []
+    for segment in segments(conn):
+        path = _path(segment.name)
+        try:
+            items = [json.loads(line) for block in _index(path) for line in _read_block(path, block)]
+        except (OSError, ValueError, EOFError) as e:
+            problems.append(f"{segment.name}: unreadable ({e!r})")
+            continue
+        if len(items) != segment.entries:
+            problems.append(f"{segment.name}: {len(items)} entries, manifest says {segment.entries}")
+        elif items and (min(item["id"] for item in items), max(item["id"] for item in items)) != \
+                (segment.first_id, segment.last_id):
+            problems.append(f"{segment.name}: id range does not match the manifest")
+    return problems
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine, ensure_columns
+
+    parser = argparse.ArgumentParser(description="Archive old audit entries to compressed segments")
+    parser.add_argument("command", choices=["run", "verify"])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_columns()
+    db = SessionLocal()
+    try:
+        if args.command == "verify":
+            problems = verify(db)
+            for problem in problems:
+                print(problem)
+            print(f"{len(segments(db))} segments, {len(problems)} problems")
+            return 1 if problems else 0
+        results = archive(db, dry_run=args.dry_run)
+        for result in results:
+            target = result.get("name", "(dry run)")
+            print(f"{result['month']}: {result['entries']} entries -> {target}")
+        if not results:
+            print(f"Nothing older than {AUDIT_RETENTION_DAYS} days to archive")
+        elif not args.dry_run:
+            print("Run VACUUM to return the freed pages to the filesystem")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
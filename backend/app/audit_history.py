@@ -0,0 +1,536 @@
+"""
+Field-level audit diffs and reconstruction of full record versions.
+
+UPDATE entries store only what changed, in AuditLog.changes, as JSON-patch
+operations (RFC 6902). Every changed field gets a `test` op with its old value
+followed by a `replace` op (or `add`, for a field the old snapshot lacked):
+
+    [{"op": "test", "path": "/status", "value": "Open"},
+     {"op": "replace", "path": "/status", "value": "Closed"}]
+
+so a patch can be applied forwards and reverted backwards. CREATE and DELETE
+entries keep their full snapshot in new_values / old_values. Snapshots can be
+partial (an attribute that was not loaded is missing), so a field missing
+from the new snapshot is treated as unchanged, never as removed.
+
+versions() rebuilds the full before/after view of each entry of one record:
+forwards from the CREATE snapshot (or an older full-snapshot UPDATE entry),
+and backwards from the current row for history older than the audit trail.
+
+states_as_of() answers "what did the record look like at time T". Replaying
+a whole trail would cost time linear in its length, so a scheduled job
+(take_snapshots) stores the full state in audit_snapshot after every
+AUDIT_SNAPSHOT_EVERY entries of a record; a lookup starts from the newest
+snapshot at or before T and replays at most that many diffs.
+stream_states_as_of() does the same for every record of a table, in batches.
+
+Entries written before diffs existed keep both snapshots; the migration
+converts them. `snapshot` takes the snapshots for the whole existing trail
+(the job only looks at records changed since its last run):
+
+Usage:
+    python -m app.audit_history migrate [--dry-run] [--batch-size N]
+    python -m app.audit_history snapshot
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+from datetime import datetime
+from itertools import groupby, islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Business tables whose trails can be replayed against the live row: audit table name -> model
+AUDITED_MODELS = {
+    "budget_item": "BudgetItem",
+    "business_case": "BusinessCase",
+    "business_case_line_item": "BusinessCaseLineItem",
+    "wbs": "WBS",
+    "asset": "Asset",
+    "purchase_order": "PurchaseOrder",
+    "goods_receipt": "GoodsReceipt",
+    "resource": "Resource",
+    "resource_po_allocation": "ResourcePOAllocation",
+}
+# Never part of a returned state, whatever the table
+CREDENTIAL_COLUMNS = {"hashed_password"}
+
+AUDIT_SNAPSHOT_EVERY = int(os.getenv("AUDIT_SNAPSHOT_EVERY", "50"))
+MIGRATE_BATCH_SIZE = 1000
+STATE_BATCH_SIZE = 500
+
+# Highest audit entry id take_snapshots() has looked at in this process
+_snapshot_watermark = 0
+
+
+def _pointer(key: str) -> str:
+    return "/" + key.replace("~", "~0").replace("/", "~1")
+
+
+def _key(path: str) -> str:
+    return path[1:].replace("~1", "/").replace("~0", "~")
+
+
+def normalize(values: Optional[dict]) -> Optional[dict]:
+    """Values as they are stored: JSON round-tripped, non-JSON types as strings."""
+    if values is None:
+        return None
+    return json.loads(json.dumps(values, default=str))
+
+
+def diff(old: dict, new: dict) -> List[Dict[str, Any]]:
+    """JSON-patch ops turning `old` into `new` (fields missing from `new` are unchanged)."""
+    old, new = normalize(old) or {}, normalize(new) or {}
+    ops = []
+    for key, value in new.items():
+        if key in old:
+            if old[key] != value:
+                ops.append({"op": "test", "path": _pointer(key), "value": old[key]})
+                ops.append({"op": "replace", "path": _pointer(key), "value": value})
+        else:
+            ops.append({"op": "add", "path": _pointer(key), "value": value})
+    return ops
+
+
+def apply(state: dict, ops: List[Dict[str, Any]]) -> dict:
+    """State after the patch; `test` ops are not enforced since snapshots can be partial."""
+    state = dict(state)
+    for op in ops:
+        if op["op"] in ("add", "replace"):
+            state[_key(op["path"])] = op["value"]
+        elif op["op"] == "remove":
+            state.pop(_key(op["path"]), None)
+    return state
+
+
+def revert(state: dict, ops: List[Dict[str, Any]]) -> dict:
+    """State before the patch: tested fields get their old value, added ones are dropped."""
+    state = dict(state)
+    old = {op["path"]: op["value"] for op in ops if op["op"] == "test"}
+    for op in ops:
+        if op["op"] == "test":
+            continue
+        if op["path"] in old:
+            state[_key(op["path"])] = old[op["path"]]
+        elif op["op"] == "add":
+            state.pop(_key(op["path"]), None)
+    return state
+
+
+def changed_views(ops: List[Dict[str, Any]]):
+    """(before, after) of the changed fields only."""
+    before = {_key(op["path"]): op["value"] for op in ops if op["op"] == "test"}
+    return before, apply({}, ops)
+
+
+def _loads(value: Optional[str]) -> Optional[dict]:
+    return json.loads(value) if value else None
+
+
+def versions(entries: List[models.AuditLog], current: Optional[dict] = None,
+             start: Optional[dict] = None) -> List[Dict[str, Any]]:
+    """
+    Full (before, after) of each entry of one record, oldest first. `start` is
+    the state before the first entry if known (an audit_snapshot), `current`
+    the record's present values (None if deleted, or if later entries are not
+    in `entries`). Unknown states are None.
+    """
+    entries = sorted(entries, key=lambda entry: entry.id)
+    views = []
+
+    # Forwards from snapshots
+    state = start
+    for entry in entries:
+        ops = json.loads(entry.changes) if entry.changes is not None else None
+        if entry.action == "CREATE":
+            before, after = None, _loads(entry.new_values)
+        elif entry.action == "DELETE":
+            before, after = _loads(entry.old_values) or state, None
+        elif ops is None:
+            before, after = _loads(entry.old_values), _loads(entry.new_values)
+        else:
+            before, after = state, apply(state, ops) if state is not None else None
+        views.append({"entry": entry, "ops": ops, "before": before, "after": after})
+        state = after
+
+    # Backwards from the current row, for entries older than any snapshot
+    known = normalize(current)
+    for view in reversed(views):
+        entry = view["entry"]
+        if view["after"] is None and entry.action != "DELETE":
+            view["after"] = known
+        if view["before"] is None and entry.action == "UPDATE" and view["after"] is not None and view["ops"] is not None:
+            view["before"] = revert(view["after"], view["ops"])
+        known = view["before"] if entry.action != "CREATE" else None
+    return views
+
+
+def entry_view(entry: models.AuditLog, before: Optional[dict] = None, after: Optional[dict] = None) -> Dict[str, Any]:
+    """
+    An entry as the API returns it. A diff entry's old_values/new_values are
+    `before`/`after` when given, else just the fields it changed.
+    """
+    view = {attr.key: getattr(entry, attr.key) for attr in inspect(models.AuditLog).column_attrs}
+    if entry.changes is not None:
+        changed_before, changed_after = changed_views(json.loads(entry.changes))
+        before = changed_before if before is None else before
+        after = changed_after if after is None else after
+    if before is not None:
+        view["old_values"] = json.dumps(before)
+    if after is not None:
+        view["new_values"] = json.dumps(after)
+    return view
+
+
+def _audited_model(table_name: str):
+    """The model of an audited business table; None for any other table (users, grants, the audit log)."""
+    model_name = AUDITED_MODELS.get(table_name)
+    return getattr(models, model_name) if model_name is not None else None
+
+
+def without_credentials(values: Optional[dict]) -> Optional[dict]:
+    if values is None:
+        return None
+    return {key: value for key, value in values.items() if key not in CREDENTIAL_COLUMNS}
+
+
+def _resolved(view: Dict[str, Any]) -> bool:
+    action = view["entry"].action
+    return (view["before"] is not None or action == "CREATE") and (view["after"] is not None or action == "DELETE")
+
+
+def history(db: Session, table_name: str, record_id: int,
+            entries: Optional[List[models.AuditLog]] = None) -> List[Dict[str, Any]]:
+    """
+    versions() of a record's audit entries, newest first: all of them, or just
+    `entries` (one page of them), replayed from the newest snapshot before the
+    page. Only a trail without a starting point also reads the later entries
+    and the current row. Entries older than the snapshot may be archived
+    (app.audit_archive); those are read from the archive.
+    """
+    from . import audit_archive
+    from .audit_writer import audit_values
+
+    AuditLog, AuditSnapshot = models.AuditLog, models.AuditSnapshot
+    trail = db.query(AuditLog).filter(AuditLog.table_name == table_name, AuditLog.record_id == record_id)
+    if entries is None:
+        entries = trail.all()
+    if not entries:
+        return []
+    page = {entry.id for entry in entries}
+    snapshot = db.query(AuditSnapshot).filter(
+        AuditSnapshot.table_name == table_name,
+        AuditSnapshot.record_id == record_id,
+        AuditSnapshot.audit_log_id < min(page)
+    ).order_by(AuditSnapshot.audit_log_id.desc()).first()
+    start = json.loads(snapshot.state) if snapshot is not None else None
+    after_id = snapshot.audit_log_id if snapshot else 0
+    known = trail.filter(AuditLog.id > after_id, AuditLog.id <= max(page)).all()
+    archived = []
+    horizon = audit_archive.horizon(db)
+    if horizon is not None and (snapshot is None or models.as_utc(snapshot.timestamp) <= horizon):
+        archived = _archived_trails(db, table_name, [record_id], {record_id: after_id})[record_id]
+        known = [entry for entry in archived if entry.id <= max(page)] + known
+
+    views = [view for view in versions(known, start=start) if view["entry"].id in page]
+    if not all(_resolved(view) for view in views):
+        later = [entry for entry in archived if entry.id > max(page)] + trail.filter(AuditLog.id > max(page)).all()
+        model = _audited_model(table_name)
+        record = db.get(model, record_id) if model is not None else None
+        current = without_credentials(audit_values(record)) if record is not None else None
+        views = [view for view in versions(known + later, current, start) if view["entry"].id in page]
+    return views[::-1]
+
+
+# Point-in-time states
+
+def _latest_snapshot_ids(table_name: str, record_ids: List[int], as_of: Optional[datetime] = None):
+    """Subquery (record_id, audit_log_id) of each record's newest snapshot (taken at or before as_of)."""
+    snapshot = models.AuditSnapshot.__table__
+    query = select(snapshot.c.record_id, func.max(snapshot.c.audit_log_id).label("audit_log_id")).where(
+        snapshot.c.table_name == table_name, snapshot.c.record_id.in_(record_ids)
+    )
+    if as_of is not None:
+        query = query.where(snapshot.c.timestamp <= as_of)
+    return query.group_by(snapshot.c.record_id).subquery()
+
+
+def _snapshot_states(conn, table_name: str, latest) -> Dict[int, dict]:
+    snapshot = models.AuditSnapshot.__table__
+    rows = conn.execute(
+        select(snapshot.c.record_id, snapshot.c.state)
+        .join(latest, and_(snapshot.c.record_id == latest.c.record_id,
+                           snapshot.c.audit_log_id == latest.c.audit_log_id))
+        .where(snapshot.c.table_name == table_name)
+    )
+    return {row.record_id: json.loads(row.state) for row in rows}
+
+
+def _entries_after(conn, table_name: str, record_ids: List[int], latest, *conditions) -> Dict[int, list]:
+    """Each record's audit entries after its snapshot in `latest`, oldest first."""
+    audit_log = models.AuditLog.__table__
+    rows = conn.execute(
+        select(audit_log)
+        .select_from(audit_log.outerjoin(latest, latest.c.record_id == audit_log.c.record_id))
+        .where(
+            audit_log.c.table_name == table_name,
+            audit_log.c.record_id.in_(record_ids),
+            audit_log.c.id > func.coalesce(latest.c.audit_log_id, 0),
+            *conditions
+        )
+        .order_by(audit_log.c.record_id, audit_log.c.id)
+    ).all()
+    entries = {record_id: [] for record_id in record_ids}
+    for row in rows:
+        entries[row.record_id].append(row)
+    return entries
+
+
+def _current_rows(conn, table_name: str, record_ids: List[int]) -> Dict[int, dict]:
+    model = _audited_model(table_name)
+    if model is None or not record_ids:
+        return {}
+    table = model.__table__
+    rows = conn.execute(select(table).where(table.c.id.in_(record_ids)))
+    return {row.id: without_credentials(dict(row._mapping)) for row in rows}
+
+
+def _archived_trails(conn, table_name: str, record_ids: List[int], after_ids: Dict[int, int]) -> Dict[int, list]:
+    """Each record's archived entries after audit id after_ids[record_id] (all if missing), oldest first."""
+    from . import audit_archive
+
+    trails = {record_id: [] for record_id in record_ids}
+    for entry in audit_archive.read_entries(conn, table_name, record_ids):
+        if entry.id > after_ids.get(entry.record_id, 0):
+            trails[entry.record_id].append(entry)
+    return {record_id: trail[::-1] for record_id, trail in trails.items()}
+
+
+def states_as_of(conn, table_name: str, record_ids: List[int], as_of: datetime) -> Dict[int, Optional[dict]]:
+    """
+    State of each record at `as_of`, None where it did not exist. `conn` is a
+    Session or Connection. Starts from the newest snapshot at or before as_of;
+    only records whose trail has no starting point (no snapshot, no CREATE
+    entry) also read the later entries and the current row to replay backwards.
+    """
+    from . import audit_archive
+
+    as_of = models.as_utc(as_of)
+    audit_log = models.AuditLog.__table__
+    latest = _latest_snapshot_ids(table_name, record_ids, as_of)
+    snapshots = _snapshot_states(conn, table_name, latest)
+    entries = _entries_after(conn, table_name, record_ids, latest, audit_log.c.timestamp <= as_of)
+    # Archived months end with a snapshot of every record they touched, so only
+    # an instant before the archive horizon needs the archived entries
+    archived = None
+    horizon = audit_archive.horizon(conn)
+    if horizon is not None and as_of < horizon:
+        snapshot_ids = dict(conn.execute(select(latest.c.record_id, latest.c.audit_log_id)).all())
+        archived = _archived_trails(conn, table_name, record_ids, snapshot_ids)
+        for record_id in record_ids:
+            older = [entry for entry in archived[record_id] if models.as_utc(entry.timestamp) <= as_of]
+            entries[record_id] = older + entries[record_id]
+
+    states, unresolved = {}, []
+    for record_id in record_ids:
+        start = snapshots.get(record_id)
+        views = versions(entries[record_id], start=start)
+        if views and (views[-1]["after"] is not None or views[-1]["entry"].action == "DELETE"):
+            states[record_id] = views[-1]["after"]
+        elif not views and record_id in snapshots:
+            # A "null" snapshot marks a record deleted in an archived month
+            states[record_id] = start
+        else:
+            unresolved.append(record_id)
+    if not unresolved:
+        return states
+
+    later = _entries_after(conn, table_name, unresolved, latest, audit_log.c.timestamp > as_of)
+    if archived is not None:
+        for record_id in unresolved:
+            newer = [entry for entry in archived[record_id] if models.as_utc(entry.timestamp) > as_of]
+            later[record_id] = newer + later[record_id]
+    current = _current_rows(conn, table_name, unresolved)
+    for record_id in unresolved:
+        known = entries[record_id]
+        views = versions(known + later[record_id], current.get(record_id), snapshots.get(record_id))
+        if known:
+            states[record_id] = views[len(known) - 1]["after"]
+        elif views:
+            states[record_id] = views[0]["before"]
+        else:
+            # Never audited: the current row, unless it was created after as_of
+            row = current.get(record_id)
+            created_at = row.get("created_at") if row is not None else None
+            exists = row is not None and (created_at is None or models.as_utc(created_at) <= as_of)
+            states[record_id] = normalize(row) if exists else None
+    return states
+
+
+def _distinct_ids(conn, column, conditions, batch_size: int) -> Iterator[int]:
+    """Distinct non-null values of an integer column in ascending order, fetched in keyset batches."""
+    last = None
+    while True:
+        query = select(column).distinct().where(column.isnot(None), *conditions)
+        if last is not None:
+            query = query.where(column > last)
+        batch = conn.execute(query.order_by(column).limit(batch_size)).scalars().all()
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def stream_states_as_of(conn, table_name: str, as_of: datetime,
+                        batch_size: int = STATE_BATCH_SIZE) -> Iterator[Tuple[int, dict]]:
+    """(record_id, state) of every record of the table that existed at `as_of`, by id."""
+    from . import audit_archive
+
+    audit_log = models.AuditLog.__table__
+    streams = [_distinct_ids(conn, audit_log.c.record_id, [audit_log.c.table_name == table_name], batch_size)]
+    model = _audited_model(table_name)
+    if model is not None:
+        # Records that were never audited
+        streams.append(_distinct_ids(conn, model.__table__.c.id, [], batch_size))
+    if audit_archive.horizon(conn) is not None:
+        streams.append(iter(audit_archive.record_ids(conn, table_name)))
+    record_ids = (record_id for record_id, _ in groupby(heapq.merge(*streams)))
+    while True:
+        batch = list(islice(record_ids, batch_size))
+        if not batch:
+            return
+        states = states_as_of(conn, table_name, batch, as_of)
+        for record_id in batch:
+            if states[record_id] is not None:
+                yield record_id, states[record_id]
+
+
+def _snapshot_batch(db: Session, table_name: str, record_ids: List[int], every: int) -> int:
+    latest = _latest_snapshot_ids(table_name, record_ids)
+    snapshots = _snapshot_states(db, table_name, latest)
+    entries = _entries_after(db, table_name, record_ids, latest)
+    due = [record_id for record_id in record_ids if len(entries[record_id]) >= every]
+    current = _current_rows(db, table_name, [record_id for record_id in due if record_id not in snapshots])
+    rows = []
+    for record_id in due:
+        views = versions(entries[record_id], current.get(record_id), snapshots.get(record_id))
+        for view in views[every - 1::every]:
+            if view["after"] is not None:
+                rows.append({
+                    "table_name": table_name,
+                    "record_id": record_id,
+                    "audit_log_id": view["entry"].id,
+                    "timestamp": view["entry"].timestamp,
+                    "state": json.dumps(view["after"]),
+                })
+    if rows:
+        db.execute(insert(models.AuditSnapshot), rows)
+    return len(rows)
+
+
+def take_snapshots(db: Session, every: int = AUDIT_SNAPSHOT_EVERY, since: Optional[int] = None,
+                   batch_size: int = STATE_BATCH_SIZE) -> int:
+    """
+    Snapshot records with `every` or more audit entries since their last
+    snapshot. Only records with entries after audit id `since` are looked at;
+    by default, those written since the previous run. Returns the count taken.
+    """
+    global _snapshot_watermark
+    audit_log, snapshot = models.AuditLog.__table__, models.AuditSnapshot.__table__
+    if since is None:
+        since = max(_snapshot_watermark, db.scalar(select(func.max(snapshot.c.audit_log_id))) or 0)
+    high = db.scalar(select(func.max(audit_log.c.id))) or 0
+    touched = db.execute(
+        select(audit_log.c.table_name, audit_log.c.record_id)
+        .where(audit_log.c.id > since, audit_log.c.id <= high)
+        .distinct()
+        .order_by(audit_log.c.table_name, audit_log.c.record_id)
+    ).all()
+
+    taken = 0
+    for table_name, rows in groupby(touched, key=lambda row: row.table_name):
+        record_ids = [row.record_id for row in rows]
+        for start in range(0, len(record_ids), batch_size):
+            taken += _snapshot_batch(db, table_name, record_ids[start:start + batch_size], every)
+            db.commit()
+    _snapshot_watermark = max(_snapshot_watermark, high)
+    return taken
+
+
+def migrate(db: Session, batch_size: int = MIGRATE_BATCH_SIZE, dry_run: bool = False) -> Dict[str, int]:
+    """Convert UPDATE entries holding both snapshots to diffs. Returns counts and sizes in bytes."""
+    AuditLog = models.AuditLog
+    report = {"converted": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(AuditLog.id, AuditLog.old_values, AuditLog.new_values)
+            .where(
+                AuditLog.id > last_id,
+                AuditLog.action == "UPDATE",
+                AuditLog.changes.is_(None),
+                AuditLog.old_values.isnot(None),
+                AuditLog.new_values.isnot(None),
+            )
+            .order_by(AuditLog.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            changes = json.dumps(diff(json.loads(row.old_values), json.loads(row.new_values)))
+            report["bytes_before"] += len(row.old_values) + len(row.new_values)
+            report["bytes_after"] += len(changes)
+            updates.append({"entry_id": row.id, "changes": changes})
+        if not dry_run:
+            db.execute(
+                update(AuditLog.__table__)
+                .where(AuditLog.__table__.c.id == bindparam("entry_id"))
+                .values(changes=bindparam("changes"), old_values=None, new_values=None),
+                updates
+            )
+            db.commit()
+        report["converted"] += len(rows)
+        last_id = rows[-1].id
+    return report
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine, ensure_columns
+
+    parser = argparse.ArgumentParser(description="Convert audit snapshots to diffs, or take point-in-time snapshots")
+    parser.add_argument("command", choices=["migrate", "snapshot"])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be converted")
+    parser.add_argument("--batch-size", type=int, default=MIGRATE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_columns()
+    db = SessionLocal()
+    try:
+        if args.command == "snapshot":
+            print(f"Took {take_snapshots(db, since=0)} snapshots (one every {AUDIT_SNAPSHOT_EVERY} changes)")
+            return 0
+        total = db.scalar(select(func.count()).select_from(models.AuditLog))
+        report = migrate(db, args.batch_size, args.dry_run)
+        saved = report["bytes_before"] - report["bytes_after"]
+        share = f" ({saved / report['bytes_before']:.0%})" if report["bytes_before"] else ""
+        verb = "Would convert" if args.dry_run else "Converted"
+        print(f"{verb} {report['converted']} of {total} audit entries")
+        print(f"UPDATE payload: {report['bytes_before']} -> {report['bytes_after']} bytes, {saved} saved{share}")
+        if not args.dry_run and report["converted"]:
+            print("Run VACUUM to return the freed pages to the filesystem")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
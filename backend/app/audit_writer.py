@@ -0,0 +1,311 @@
+"""
+Audit entries of routes decorated with auth.audit_log_change.
+
+The decorator used to add the AuditLog row after the route had committed and
+then commit again, so every audited write paid for two transactions. Now the
+decorator opens a capture on the session (capture()) and the rows are built
+from the ORM objects the route actually flushed:
+
+- AUDIT_WRITE_MODE=transaction (default): a before_commit hook inserts the
+  audit rows in the route's own transaction, so the change and its audit
+  entry commit (or roll back) together with a single commit.
+- AUDIT_WRITE_MODE=queue: after the route's transaction commits, the rows are
+  handed to a background writer that inserts them in batches (one executemany
+  INSERT per batch of up to AUDIT_BATCH_SIZE). The queue holds at most
+  AUDIT_QUEUE_SIZE entries; when it is full AUDIT_QUEUE_OVERFLOW decides:
+  `block` waits up to AUDIT_QUEUE_BLOCK_SECONDS and then writes inline,
+  `sync` writes inline right away, `drop` counts and logs the entry. The queue
+  is drained on shutdown (lifespan), but entries still queued when a process
+  dies are lost, which is why transaction mode is the default.
+
+Queue depth, lag of the oldest entry and write counters are at
+GET /admin/audit-writer.
+
+UPDATE rows store the changed fields only (AuditLog.changes, see
+app.audit_history); CREATE and DELETE rows keep the full snapshot.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.orm import Session
+
+from . import audit_history, models
+from .models import now_utc
+
+logger = logging.getLogger(__name__)
+
+AUDIT_WRITE_MODE = os.getenv("AUDIT_WRITE_MODE", "transaction").lower()
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_QUEUE_OVERFLOW = os.getenv("AUDIT_QUEUE_OVERFLOW", "block").lower()
+AUDIT_QUEUE_BLOCK_SECONDS = float(os.getenv("AUDIT_QUEUE_BLOCK_SECONDS", "5"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_SHUTDOWN_TIMEOUT_SECONDS = 30
+
+if AUDIT_WRITE_MODE not in ("transaction", "queue"):
+    raise ValueError(f"Invalid AUDIT_WRITE_MODE: {AUDIT_WRITE_MODE!r}")
+if AUDIT_QUEUE_OVERFLOW not in ("block", "sync", "drop"):
+    raise ValueError(f"Invalid AUDIT_QUEUE_OVERFLOW: {AUDIT_QUEUE_OVERFLOW!r}")
+
+
+def audit_values(obj) -> Optional[dict]:
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    state = inspect(obj, raiseerr=False)
+    if state is not None and hasattr(state, 'mapper'):
+        # Loaded column attributes only, never related objects
+        columns = {attr.key for attr in state.mapper.column_attrs}
+        return {k: v for k, v in obj.__dict__.items() if k in columns}
+    if hasattr(obj, '__dict__'):
+        return {k: v for k, v in obj.__dict__.items() if not k.startswith('_')}
+    return None
+
+
+def audit_row(table_name: str, record_id: int, action: str, user_id: Optional[int],
+              old_values: Optional[dict], new_values: Optional[dict]) -> Dict[str, Any]:
+    """Column values of one AuditLog row; an UPDATE with both snapshots is stored as a diff."""
+    changes = None
+    if action == "UPDATE" and old_values and new_values:
+        changes = json.dumps(audit_history.diff(old_values, new_values))
+        old_values = new_values = None
+    return {
+        "table_name": table_name,
+        "record_id": record_id,
+        "action": action,
+        "old_values": json.dumps(old_values, default=str) if old_values else None,
+        "new_values": json.dumps(new_values, default=str) if new_values else None,
+        "changes": changes,
+        "user_id": user_id,
+        "timestamp": now_utc(),
+        "ip_address": None,
+    }
+
+
+class PendingAudit:
+    """The change a decorated route is expected to make, and the objects it flushed for it."""
+
+    def __init__(self, action: str, table_name: str, model, user_id: int, record_id, old_values):
+        self.action = action
+        self.table_name = table_name
+        self.model = model
+        self.user_id = user_id
+        self.record_id = record_id
+        self.old_values = old_values
+        self.objects: List[Any] = []
+        self.written = False
+
+    def matches(self, session: Session, obj) -> bool:
+        if self.model is None or not isinstance(obj, self.model) or obj in self.objects:
+            return False
+        if self.action == "CREATE":
+            return obj in session.new
+        return self.record_id is not None and obj.id == self.record_id
+
+    def rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        for obj in self.objects:
+            new_values = audit_values(obj) if self.action in ("CREATE", "UPDATE") else None
+            old_values = self.old_values if self.action != "DELETE" else (self.old_values or audit_values(obj))
+            rows.append(audit_row(self.table_name, obj.id, self.action, self.user_id, old_values, new_values))
+        return rows
+
+
+@contextmanager
+def capture(db: Session, action: str, table_name: str, model, user_id: int, record_id=None, old_values=None):
+    """Audit what the block commits for `model` on `db`; yields the PendingAudit."""
+    pending = PendingAudit(action, table_name, model, user_id, record_id, old_values)
+    previous = db.info.get("pending_audit")
+    db.info["pending_audit"] = pending
+    try:
+        yield pending
+    finally:
+        if previous is None:
+            db.info.pop("pending_audit", None)
+        else:
+            db.info["pending_audit"] = previous
+
+
+@event.listens_for(Session, "after_flush")
+def track_audited_objects(session, flush_context):
+    pending = session.info.get("pending_audit")
+    if pending is None:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if pending.matches(session, obj):
+            pending.objects.append(obj)
+
+
+@event.listens_for(Session, "before_commit")
+def write_pending_audit(session):
+    pending = session.info.get("pending_audit")
+    if pending is None:
+        return
+    session.flush()
+    rows = pending.rows()
+    pending.objects = []
+    if not rows:
+        return
+    pending.written = True
+    if AUDIT_WRITE_MODE == "transaction":
+        session.connection().execute(insert(models.AuditLog), rows)
+    else:
+        session.info.setdefault("audit_rows_after_commit", []).extend(rows)
+
+
+@event.listens_for(Session, "after_commit")
+def enqueue_committed_audit(session):
+    rows = session.info.pop("audit_rows_after_commit", None)
+    if rows:
+        writer.submit(session.get_bind(), rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_rolled_back_audit(session):
+    session.info.pop("audit_rows_after_commit", None)
+
+
+def add_entry(db: Session, row: Dict[str, Any]):
+    """Write an entry that no capture picked up (the route committed nothing for it)."""
+    if AUDIT_WRITE_MODE == "queue":
+        writer.submit(db.get_bind(), [row])
+        return
+    db.add(models.AuditLog(**row))
+    db.commit()
+
+
+class AuditWriter:
+    """Bounded queue of audit rows drained by one thread in executemany batches."""
+
+    def __init__(self, size: int = AUDIT_QUEUE_SIZE, overflow: str = AUDIT_QUEUE_OVERFLOW,
+                 batch_size: int = AUDIT_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=size)
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sync_writes = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = None
+
+    def _ensure_thread(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._drain, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, bind, rows: List[Dict[str, Any]]):
+        self._ensure_thread()
+        for row in rows:
+            item = (bind, row, time.monotonic())
+            try:
+                self.queue.put_nowait(item)
+                self.enqueued += 1
+                continue
+            except queue.Full:
+                pass
+            if self.overflow == "drop":
+                self.dropped += 1
+                logger.error(f"Audit queue full, dropped {row['action']} {row['table_name']} {row['record_id']}")
+                continue
+            if self.overflow == "block":
+                try:
+                    self.queue.put(item, timeout=AUDIT_QUEUE_BLOCK_SECONDS)
+                    self.enqueued += 1
+                    continue
+                except queue.Full:
+                    pass
+            self._write(bind, [row])
+            self.sync_writes += 1
+
+    def _write(self, bind, rows: List[Dict[str, Any]]):
+        try:
+            with bind.begin() as conn:
+                conn.execute(insert(models.AuditLog), rows)
+            self.written += len(rows)
+        except Exception:
+            self.failed += len(rows)
+            logger.exception(f"Failed to write {len(rows)} audit entries")
+
+    def _write_batch(self, batch):
+        started = time.monotonic()
+        by_bind: Dict[Any, List[Dict[str, Any]]] = {}
+        for bind, row, _ in batch:
+            by_bind.setdefault(bind, []).append(row)
+        for bind, rows in by_bind.items():
+            self._write(bind, rows)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_ms = round((time.monotonic() - started) * 1000, 2)
+        for _ in batch:
+            self.queue.task_done()
+
+    def _drain(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def flush(self):
+        """Block until every queued entry is written."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def stop(self, timeout: float = AUDIT_SHUTDOWN_TIMEOUT_SECONDS):
+        """Drain the queue and stop the thread; leftovers are written from this thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftovers:
+            self._write_batch(leftovers)
+
+    def lag_seconds(self) -> float:
+        with self.queue.mutex:
+            oldest = self.queue.queue[0][2] if self.queue.queue else None
+        return round(time.monotonic() - oldest, 3) if oldest is not None else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": AUDIT_WRITE_MODE,
+            "overflow": self.overflow,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "lag_seconds": self.lag_seconds(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "sync_writes": self.sync_writes,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": self.last_batch_ms,
+        }
+
+
+writer = AuditWriter()
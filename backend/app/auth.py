@@ -1,14 +1,19 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Union
-import json
+from typing import List, Optional, Union
+import contextlib
+import functools
+import inspect
 import os
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2PasswordBearer
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from .database import SessionLocal
-from . import models
+from . import models, acl, audit_writer, principal_cache
+from .audit_writer import audit_values as _audit_values
+from .password_hashing import hasher
 
 def now_utc() -> datetime:
     """Get current UTC timestamp as timezone-aware datetime."""
@@ -24,7 +29,6 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=14)
 # We use OAuth2PasswordBearer for Swagger UI compatibility, but logic allows custom header too
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -36,10 +40,66 @@ def get_db():
         db.close()
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # Runs in the bounded hashing pool; raises PasswordHashingBusy when it is full
+    return hasher.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hasher.hash(password)
+
+class Principal:
+    """
+    Request-scoped identity: the authenticated user, their role and their
+    group IDs. Group memberships are loaded at most once per request and
+    reused by every access check and router that needs them.
+    """
+
+    def __init__(self, user: "models.User", db: Session):
+        self.user = user
+        self.db = db
+        self._group_ids = None
+        # Instrumentation: membership queries avoided by reusing the cache
+        self.queries_saved = 0
+
+    @property
+    def id(self) -> int:
+        return self.user.id
+
+    @property
+    def role(self) -> str:
+        return self.user.role
+
+    @property
+    def group_ids(self) -> List[int]:
+        if self._group_ids is None:
+            self._group_ids = [
+                group_id for (group_id,) in self.db.query(models.UserGroupMembership.group_id).filter(
+                    models.UserGroupMembership.user_id == self.user.id
+                )
+            ]
+        else:
+            self.queries_saved += 1
+        return self._group_ids
+
+    def in_group(self, group_id: int) -> bool:
+        return group_id in self.group_ids
+
+
+def get_principal(request: Request, current_user: "models.User" = None, db: Session = None) -> Principal:
+    """
+    Return the request's Principal, creating it on first use.
+    get_current_user attaches it, so routers normally just pass `request`.
+    """
+    principal = getattr(request.state, "principal", None)
+    if principal is None:
+        if current_user is None or db is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="No authentication found"
+            )
+        principal = Principal(current_user, db)
+        request.state.principal = principal
+    return principal
+
 
 def user_in_owner_group(user: "models.User", owner_group_id: int, db: Session, required_level: str = "Read") -> bool:
     """
@@ -69,83 +129,16 @@ def check_business_case_access(user: "models.User", business_case: "models.Busin
     4. Explicit RecordAccess (OVERRIDE): Direct grants for audits/reviews
 
     Role caps: Viewer cannot Write regardless of grants
-    """
-    access_levels = {"Read": 0, "Write": 1, "Full": 2}
-    role_caps = {"Viewer": 0, "User": 1, "Manager": 2, "Admin": 2}
-
-    # CRITICAL: Enforce role caps - Viewer cannot Write regardless of grants
-    if access_levels.get(required_level, 2) > role_caps.get(user.role, 0):
-        return False
-
-    user_group_ids = [
-        m.group_id
-        for m in db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == user.id
-        ).all()
-    ]
-
-    # 1. Creator access (audit only - Read only, not Write)
-    if business_case.created_by == user.id:
-        if required_level == "Read":
-            return True
-        # Creator does NOT get Write access - they must have access via line items or explicit grants
-
-    # 2. lead_group_id enforcement for Write access
-    if required_level in ["Write", "Full"] and business_case.lead_group_id:
-        if required_level == "Write" and user_in_owner_group(user, business_case.lead_group_id, db, required_level):
-            return True
-        # Not a member - check explicit access
-        bc_access = db.query(models.RecordAccess).filter(
-            models.RecordAccess.record_type == "BusinessCase",
-            models.RecordAccess.record_id == business_case.id,
-            (
-                (models.RecordAccess.user_id == user.id) |
-                (models.RecordAccess.group_id.in_(user_group_ids))
-            ),
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        ).first()
-
-        if not bc_access or access_levels.get(bc_access.access_level, 0) < access_levels.get(required_level, 2):
-            return False
-
-    # 3. Line-item based access (PRIMARY - per spec)
-    for line_item in business_case.line_items:
-        budget_item = line_item.budget_item
-        if budget_item and budget_item.owner_group_id:
-            if user_in_owner_group(user, budget_item.owner_group_id, db, required_level):
-                return True
-
-        # Check explicit budget item access
-        budget_access = db.query(models.RecordAccess).filter(
-            models.RecordAccess.record_type == "BudgetItem",
-            models.RecordAccess.record_id == budget_item.id,
-            (
-                (models.RecordAccess.user_id == user.id) |
-                (models.RecordAccess.group_id.in_(user_group_ids))
-            ),
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        ).first()
-
-        if budget_access:
-            if access_levels.get(budget_access.access_level, 0) >= access_levels.get(required_level, 2):
-                return True
-
-    # 4. Explicit BC access (OVERRIDE)
-    bc_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "BusinessCase",
-        models.RecordAccess.record_id == business_case.id,
-        (
-            (models.RecordAccess.user_id == user.id) |
-            (models.RecordAccess.group_id.in_(user_group_ids))
-        ),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).first()
 
-    if bc_access:
-        if access_levels.get(bc_access.access_level, 0) >= access_levels.get(required_level, 2):
-            return True
-
-    return False
+    Evaluated as a single EXISTS query built by acl.business_case_access_clause,
+    so list endpoints can apply the exact same rule set-based.
+    """
+    return db.query(
+        exists().where(
+            models.BusinessCase.id == business_case.id,
+            acl.business_case_access_clause(user, required_level)
+        )
+    ).scalar()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -164,6 +157,11 @@ def get_current_user_from_token(token: str, db: Session):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Process-wide cache: entries never outlive the token's own expiry
+    cached_user = principal_cache.cache.get(token, db)
+    if cached_user is not None:
+        return cached_user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -174,6 +172,7 @@ def get_current_user_from_token(token: str, db: Session):
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
         raise credentials_exception
+    principal_cache.cache.put(token, user, payload.get("exp"))
     return user
 
 def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
@@ -184,7 +183,9 @@ def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="No authentication cookie found"
         )
-    return get_current_user_from_token(token, db)
+    user = get_current_user_from_token(token, db)
+    get_principal(request, user, db)
+    return user
 
 def get_current_user(request: Request, db: Session = Depends(get_db)):
     """Get current user - try cookie first, then Authorization header"""
@@ -203,7 +204,9 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="No authentication found"
         )
     
-    return get_current_user_from_token(token, db)
+    user = get_current_user_from_token(token, db)
+    get_principal(request, user, db)
+    return user
 
 def require_role(required_role: str):
     def role_checker(current_user: models.User = Depends(get_current_user)):
@@ -240,6 +243,8 @@ def check_record_access(record_type: str, record_id_param: str, required_access:
         except ValueError:
             return current_user
 
+        principal = get_principal(request, current_user, db)
+
         # Admin has full access to everything
         if current_user.role == "Admin":
             return current_user
@@ -256,51 +261,42 @@ def check_record_access(record_type: str, record_id_param: str, required_access:
                 detail="Insufficient permissions"
             )
 
-        # Fetch the record to check owner_group_id and creator
-        model_cls = getattr(models, record_type, None)
-        record = None
-        if model_cls:
-            record = db.get(model_cls, record_id)
-
-            # Check if user is creator (has full access)
-            if record and hasattr(record, 'created_by') and record.created_by == current_user.id:
+        if acl.USE_EFFECTIVE_ACCESS and record_type in acl.OWNED_RECORD_TYPES:
+            # Materialized owner-group/creator/grant rules: one indexed lookup
+            if acl.has_effective_access(db, current_user, record_type, record_id, required_access):
                 return current_user
+            model_cls = None
+        else:
+            # Fetch the record to check owner_group_id and creator
+            model_cls = getattr(models, record_type, None)
+            record = None
+            if model_cls:
+                record = db.get(model_cls, record_id)
 
-            # CRITICAL: Check owner_group_id membership (default Read/Write access)
-            if record and hasattr(record, 'owner_group_id') and record.owner_group_id:
-                if user_in_owner_group(current_user, record.owner_group_id, db, required_access):
+                # Check if user is creator (has full access)
+                if record and hasattr(record, 'created_by') and record.created_by == current_user.id:
                     return current_user
 
-        # Check explicit record access grants
-        req_level_val = access_levels.get(required_access, 2)
-        
-        # Check direct user access
-        user_access = db.query(models.RecordAccess).filter(
-            models.RecordAccess.record_type == record_type,
-            models.RecordAccess.record_id == record_id,
-            models.RecordAccess.user_id == current_user.id,
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        ).first()
-        
-        if user_access and access_levels.get(user_access.access_level, 0) >= req_level_val:
-            return current_user
-            
-        # Check group access
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        
-        for membership in user_groups:
-            group_access = db.query(models.RecordAccess).filter(
+                # CRITICAL: Check owner_group_id membership (default Read/Write access)
+                if record and hasattr(record, 'owner_group_id') and record.owner_group_id:
+                    if principal.in_group(record.owner_group_id):
+                        return current_user
+
+            # Check explicit record access grants (direct or via any of the user's groups)
+            grant_filter = models.RecordAccess.user_id == current_user.id
+            if principal.group_ids:
+                grant_filter = grant_filter | models.RecordAccess.group_id.in_(principal.group_ids)
+            grant = db.query(models.RecordAccess.id).filter(
                 models.RecordAccess.record_type == record_type,
                 models.RecordAccess.record_id == record_id,
-                models.RecordAccess.group_id == membership.group_id,
+                grant_filter,
+                models.RecordAccess.access_level.in_(acl.levels_at_least(required_access)),
                 (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
             ).first()
-            
-            if group_access and access_levels.get(group_access.access_level, 0) >= req_level_val:
+
+            if grant:
                 return current_user
-                
+
         # Check department access for User role
         # Requires fetching the record again if not fetched
         if current_user.role == "User":
@@ -319,84 +315,95 @@ def check_record_access(record_type: str, record_id_param: str, required_access:
         
     return access_checker
 
+# Fix class name lookup for snake_case table names (e.g., resource_po_allocation)
+AUDIT_TABLE_MODELS = {
+    "resource_po_allocation": "ResourcePOAllocation",
+    "business_case_line_item": "BusinessCaseLineItem",
+    "user_group_membership": "UserGroupMembership",
+    "goods_receipt": "GoodsReceipt",
+    "purchase_order": "PurchaseOrder",
+    "business_case": "BusinessCase",
+    "budget_item": "BudgetItem",
+    "user_group": "UserGroup",
+    "record_access": "RecordAccess",
+    "audit_log": "AuditLog"
+}
+
+def _audit_model(table_name: str):
+    return getattr(models, AUDIT_TABLE_MODELS.get(table_name, table_name.title().replace('_', '')), None)
+
+def _audit_old_values(action: str, table_name: str, kwargs: dict):
+    """For UPDATE/DELETE: pre-fetch old values BEFORE the operation. Returns (record_id, old_values)."""
+    if action not in ['UPDATE', 'DELETE']:
+        return None, None
+    db = kwargs.get('db')
+    record_id = kwargs.get('id') or kwargs.get(f'{table_name}_id') or kwargs.get('bc_id') or kwargs.get('wbs_id') or kwargs.get('po_id') or kwargs.get('asset_id') or kwargs.get('gr_id') or kwargs.get('resource_id') or kwargs.get('alloc_id')
+    if not record_id or not db:
+        return record_id, None
+    model_cls = _audit_model(table_name)
+    record = db.get(model_cls, record_id) if model_cls else None
+    return record_id, _audit_values(record) if record else None
+
+def _audit_capture(action: str, table_name: str, kwargs: dict, record_id, old_values):
+    """Audit the route's change inside its own transaction (see app.audit_writer)."""
+    current_user = kwargs.get('current_user')
+    db = kwargs.get('db')
+    if not (current_user and db):
+        return contextlib.nullcontext()
+    return audit_writer.capture(db, action, table_name, _audit_model(table_name), current_user.id, record_id, old_values)
+
+def _audit_write(action: str, table_name: str, kwargs: dict, record_id, old_values, result, pending=None):
+    current_user = kwargs.get('current_user')
+    db = kwargs.get('db')
+    if not (current_user and db):
+        return
+    if pending is not None and pending.written:
+        return
+
+    # Nothing was captured at commit: fall back to the returned record
+    if hasattr(result, 'id'):
+        record_id = result.id
+    elif isinstance(result, dict) and 'id' in result:
+        record_id = result['id']
+
+    # Ensure record_id is available for CREATE (requires db.flush() in the route)
+    if not record_id:
+        return
+
+    new_vals = _audit_values(result) if action in ['CREATE', 'UPDATE'] else None
+    audit_writer.add_entry(db, audit_writer.audit_row(table_name, record_id, action, current_user.id, old_values, new_vals))
+
 def audit_log_change(action: str, table_name: str):
     """
     Decorator to log changes.
     Requires the decorated function to return a SQLAlchemy model instance or a dict with 'id'.
     Requires 'current_user', 'db', and optionally 'id' or record_id in kwargs/args.
     For CREATE: ensure db.flush() is called to generate ID before audit log.
+
+    The entry is written in the route's own transaction when it commits (or queued
+    after it, with AUDIT_WRITE_MODE=queue); see app.audit_writer.
+
+    Works on both plain and async route functions. Sync routes stay sync so FastAPI
+    runs them in its threadpool; for async routes the audit queries are run in the
+    threadpool so the sync session never blocks the event loop.
     """
     def audit_decorator(func):
-        async def wrapper(*args, **kwargs):
-            current_user = kwargs.get('current_user')
-            db = kwargs.get('db')
-            request = kwargs.get('request')
-
-            old_values = None
-            record_id = None
-
-            # For UPDATE/DELETE: pre-fetch old values BEFORE the operation
-            if action in ['UPDATE', 'DELETE']:
-                # Try to extract record_id from kwargs
-                record_id = kwargs.get('id') or kwargs.get(f'{table_name}_id') or kwargs.get('bc_id') or kwargs.get('wbs_id') or kwargs.get('po_id') or kwargs.get('asset_id') or kwargs.get('gr_id') or kwargs.get('resource_id') or kwargs.get('alloc_id')
-                if record_id and db:
-                    # Fix class name lookup for snake_case table names (e.g., resource_po_allocation)
-                    table_name_map = {
-                        "resource_po_allocation": "ResourcePOAllocation",
-                        "business_case_line_item": "BusinessCaseLineItem",
-                        "user_group_membership": "UserGroupMembership",
-                        "goods_receipt": "GoodsReceipt",
-                        "purchase_order": "PurchaseOrder",
-                        "business_case": "BusinessCase",
-                        "budget_item": "BudgetItem",
-                        "user_group": "UserGroup",
-                        "record_access": "RecordAccess",
-                        "audit_log": "AuditLog"
-                    }
-                    model_name = table_name_map.get(table_name, table_name.title().replace('_', ''))
-                    model_cls = getattr(models, model_name, None)
-                    if model_cls:
-                        record = db.get(model_cls, record_id)
-                        if record and hasattr(record, '__dict__'):
-                            old_values = {k: v for k, v in record.__dict__.items() if not k.startswith('_')}
-                        elif record and hasattr(record, 'model_dump'):
-                            old_values = record.model_dump()
-
-            result = await func(*args, **kwargs)
-
-            if current_user and db:
-                # Determine record ID from result
-                if hasattr(result, 'id'):
-                    record_id = result.id
-                elif isinstance(result, dict) and 'id' in result:
-                    record_id = result['id']
-
-                # Ensure record_id is available for CREATE (requires db.flush() in the route)
-                if not record_id:
-                    return result
-
-                # Determine new values
-                new_vals = None
-                if action in ['CREATE', 'UPDATE']:
-                    if hasattr(result, 'model_dump'):
-                        new_vals = result.model_dump()
-                    elif hasattr(result, '__dict__'):
-                        new_vals = {k: v for k, v in result.__dict__.items() if not k.startswith('_')}
-
-                # Add audit log entry
-                audit_entry = models.AuditLog(
-                    table_name=table_name,
-                    record_id=record_id,
-                    action=action,
-                    old_values=json.dumps(old_values, default=str) if old_values else None,
-                    new_values=json.dumps(new_vals, default=str) if new_vals else None,
-                    user_id=current_user.id,
-                    timestamp=now_utc(),
-                    ip_address=None
-                )
-                db.add(audit_entry)
-                db.commit()
-
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                record_id, old_values = await run_in_threadpool(_audit_old_values, action, table_name, kwargs)
+                with _audit_capture(action, table_name, kwargs, record_id, old_values) as pending:
+                    result = await func(*args, **kwargs)
+                await run_in_threadpool(_audit_write, action, table_name, kwargs, record_id, old_values, result, pending)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record_id, old_values = _audit_old_values(action, table_name, kwargs)
+            with _audit_capture(action, table_name, kwargs, record_id, old_values) as pending:
+                result = func(*args, **kwargs)
+            _audit_write(action, table_name, kwargs, record_id, old_values, result, pending)
             return result
         return wrapper
     return audit_decorator
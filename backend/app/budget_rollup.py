@@ -0,0 +1,320 @@
+"""
+Budget-to-actuals rollup along BudgetItem -> Line Item -> WBS -> Asset -> PO.
+
+rollup() answers "how much of each budget item, business case, line item and
+WBS is requested, committed (PO totals) and actually received (GR totals)" with
+one SQL statement: PO amounts are summed per WBS in a grouped subquery and
+outer-joined up the chain, together with the caller's access to each row.
+Python only adds the per-WBS rows up to the higher levels. Received amounts
+come from the PO rollups (app.po_rollups), so goods receipts are not scanned.
+
+Rows the user cannot read are left out, and so are the POs they cannot read:
+committed and actual amounts only add up POs visible to the caller, so a
+total never reveals a hidden PO's amounts. Admins and Managers see every PO.
+
+With BUDGET_ROLLUP_CACHE_ENABLED the per-WBS sums are read from the wbs_spend
+table instead of being aggregated over all POs. Writes to WBS, assets, POs and
+goods receipts mark what they touched in wbs_spend_dirty (flush listener, same
+transaction) and the affected WBS rows are recomputed by the scheduler. The cache
+holds totals over all POs, so it only serves Admins and Managers; other users
+get the live aggregate over their readable POs. Run
+`python -m app.budget_rollup rebuild` before enabling.
+
+Usage:
+    python -m app.budget_rollup rebuild
+    python -m app.budget_rollup check
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from sqlalchemy import DateTime, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from . import acl, hierarchy, models
+from .models import now_utc
+
+CACHE_ENABLED = os.getenv("BUDGET_ROLLUP_CACHE_ENABLED", "").lower() in ["true", "1", "yes"]
+
+ZERO = Decimal("0.00")
+
+
+def _spend_by_wbs_select(wbs_ids=None, user: Optional[models.User] = None):
+    """PO sums per WBS; with `user`, only over the POs that user can read."""
+    PO, Asset = models.PurchaseOrder, models.Asset
+    statement = (
+        select(
+            Asset.wbs_id.label("wbs_id"),
+            func.coalesce(func.sum(PO.total_amount), 0).label("committed"),
+            func.coalesce(func.sum(PO.received_amount), 0).label("actual"),
+            func.count(PO.id).label("po_count"),
+        )
+        .join(PO, PO.asset_id == Asset.id)
+        .group_by(Asset.wbs_id)
+    )
+    if wbs_ids is not None:
+        statement = statement.where(Asset.wbs_id.in_(wbs_ids))
+    if user is not None and user.role not in acl.UNRESTRICTED_ROLES:
+        statement = statement.where(acl.record_access_clause(user, PO, "PurchaseOrder"))
+    return statement
+
+
+def _spend_subquery(cached: bool, user: Optional[models.User] = None):
+    if cached:
+        spend = models.WBSSpend
+        return select(
+            spend.wbs_id.label("wbs_id"),
+            spend.committed_amount.label("committed"),
+            spend.actual_amount.label("actual"),
+        ).subquery()
+    return _spend_by_wbs_select(user=user).subquery()
+
+
+# Cache maintenance
+
+def _old_and_new(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return set(history.deleted or ()) | set(history.unchanged or ()) | set(history.added or ())
+
+
+def _changed(obj, attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def mark_spend_dirty(session, flush_context):
+    """Mark the parents whose WBS spend a flush may have changed (old and new parents)."""
+    if not CACHE_ENABLED:
+        return
+    marks = set()
+    for obj in session.new | session.dirty | session.deleted:
+        is_dirty = obj in session.dirty
+        if isinstance(obj, models.GoodsReceipt):
+            if not is_dirty or _changed(obj, ("po_id", "amount")):
+                marks |= {("PurchaseOrder", po_id) for po_id in _old_and_new(obj, "po_id")}
+        elif isinstance(obj, models.PurchaseOrder):
+            if not is_dirty or _changed(obj, ("asset_id", "total_amount")):
+                marks |= {("Asset", asset_id) for asset_id in _old_and_new(obj, "asset_id")}
+        elif isinstance(obj, models.Asset):
+            if not is_dirty or _changed(obj, ("wbs_id",)):
+                marks |= {("WBS", wbs_id) for wbs_id in _old_and_new(obj, "wbs_id")}
+        elif isinstance(obj, models.WBS) and obj in session.deleted:
+            marks.add(("WBS", obj.id))
+
+    marks = {(entity_type, entity_id) for entity_type, entity_id in marks if entity_id is not None}
+    if marks:
+        session.connection().execute(insert(models.WBSSpendDirty), [
+            {"entity_type": entity_type, "entity_id": entity_id, "marked_at": now_utc()}
+            for entity_type, entity_id in marks
+        ])
+
+
+def refresh_wbs(db: Session, wbs_ids) -> int:
+    """Recompute the cached spend of the given WBS. Returns how many were refreshed."""
+    wbs_ids = list(wbs_ids)
+    if not wbs_ids:
+        return 0
+    db.execute(delete(models.WBSSpend).where(models.WBSSpend.wbs_id.in_(wbs_ids)))
+    spend = _spend_by_wbs_select(wbs_ids).subquery()
+    db.execute(insert(models.WBSSpend).from_select(
+        ["wbs_id", "committed_amount", "actual_amount", "po_count", "refreshed_at"],
+        select(spend.c.wbs_id, spend.c.committed, spend.c.actual, spend.c.po_count,
+               literal(now_utc(), DateTime(timezone=True)))
+    ))
+    return len(wbs_ids)
+
+
+def refresh_dirty(db: Session) -> int:
+    """Recompute the WBS affected by pending marks. Returns the number of marks processed."""
+    Dirty = models.WBSSpendDirty
+    marks = db.execute(select(Dirty.id, Dirty.entity_type, Dirty.entity_id)).all()
+    if not marks:
+        return 0
+    ids = defaultdict(set)
+    for row in marks:
+        ids[row.entity_type].add(row.entity_id)
+
+    wbs_ids = set(ids["WBS"])
+    below_wbs = [(entity_type, entity_id) for entity_type in ("Asset", "PurchaseOrder") for entity_id in ids[entity_type]]
+    if below_wbs:
+        wbs_ids |= set(db.execute(hierarchy.ancestors_of_any_select(below_wbs, "WBS")).scalars())
+
+    refresh_wbs(db, wbs_ids)
+    db.execute(delete(Dirty).where(Dirty.id <= max(row.id for row in marks)))
+    return len(marks)
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the whole cache. Returns the number of WBS with spend."""
+    db.execute(delete(models.WBSSpendDirty))
+    db.execute(delete(models.WBSSpend))
+    refresh_wbs(db, db.execute(select(models.WBS.id)).scalars())
+    return db.query(models.WBSSpend).count()
+
+
+def check(db: Session):
+    """Return (wbs_id, cached, expected) for every WBS whose cached spend is wrong."""
+    expected = {row.wbs_id: (row.committed, row.actual) for row in db.execute(_spend_by_wbs_select())}
+    cached = {
+        row.wbs_id: (row.committed_amount, row.actual_amount)
+        for row in db.execute(select(
+            models.WBSSpend.wbs_id, models.WBSSpend.committed_amount, models.WBSSpend.actual_amount
+        ))
+    }
+    mismatches = []
+    for wbs_id in sorted(set(expected) | set(cached)):
+        want = tuple(_amount(v) for v in expected.get(wbs_id, (0, 0)))
+        have = tuple(_amount(v) for v in cached.get(wbs_id, (0, 0)))
+        if want != have:
+            mismatches.append((wbs_id, have, want))
+    return mismatches
+
+
+def bring_up_to_date(db: Session):
+    if refresh_dirty(db):
+        db.commit()
+
+
+# Reading
+
+def _amount(value) -> Decimal:
+    return Decimal(str(value)).quantize(ZERO) if value is not None else ZERO
+
+
+def rollup(
+    db: Session,
+    user: models.User,
+    budget_item_id: Optional[int] = None,
+    business_case_id: Optional[int] = None,
+    fiscal_year: Optional[int] = None,
+    cached: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Budget, requested, committed and actual amounts per budget item, business
+    case, line item and WBS, for the rows the user can read.
+
+    The filters restrict which line items are counted: with business_case_id,
+    budget items show only their contribution to that business case. Amounts
+    only count POs the user can read, so restricted users never use the cache.
+    """
+    restricted = user.role not in acl.UNRESTRICTED_ROLES
+    cached = (CACHE_ENABLED if cached is None else cached) and not restricted
+    # Budget item and line item are aliased so the EXISTS inside
+    # business_case_access_clause keeps its own FROM instead of correlating to them
+    BI, LI = aliased(models.BudgetItem), aliased(models.BusinessCaseLineItem)
+    BC, WBS = models.BusinessCase, models.WBS
+    spend = _spend_subquery(cached, user)
+
+    columns = [
+        BI.id.label("bi_id"), BI.workday_ref, BI.title.label("bi_title"), BI.fiscal_year, BI.budget_amount,
+        LI.id.label("li_id"), LI.title.label("li_title"), LI.requested_amount,
+        BC.id.label("bc_id"), BC.title.label("bc_title"),
+        WBS.id.label("wbs_id"), WBS.wbs_code,
+        spend.c.committed, spend.c.actual,
+    ]
+    if restricted:
+        columns += [
+            acl.record_access_clause(user, BI, "BudgetItem").label("bi_visible"),
+            acl.record_access_clause(user, LI, "BusinessCaseLineItem").label("li_visible"),
+            acl.business_case_access_clause(user).label("bc_visible"),
+            acl.record_access_clause(user, WBS, "WBS").label("wbs_visible"),
+        ]
+
+    statement = (
+        select(*columns)
+        .select_from(BI)
+        .outerjoin(LI, LI.budget_item_id == BI.id)
+        .outerjoin(BC, BC.id == LI.business_case_id)
+        .outerjoin(WBS, WBS.business_case_line_item_id == LI.id)
+        .outerjoin(spend, spend.c.wbs_id == WBS.id)
+        .order_by(BI.id, LI.id, WBS.id)
+    )
+    if budget_item_id is not None:
+        statement = statement.where(BI.id == budget_item_id)
+    if fiscal_year is not None:
+        statement = statement.where(BI.fiscal_year == fiscal_year)
+    if business_case_id is not None:
+        statement = statement.where(LI.business_case_id == business_case_id)
+
+    budget_items, business_cases, line_items, wbs_rows = {}, {}, {}, {}
+    counted_line_items = set()
+    for row in db.execute(statement):
+        def visible(flag):
+            return not restricted or bool(getattr(row, flag))
+
+        committed, actual = _amount(row.committed), _amount(row.actual)
+
+        item = budget_items.setdefault(row.bi_id, {
+            "id": row.bi_id, "workday_ref": row.workday_ref, "title": row.bi_title,
+            "fiscal_year": row.fiscal_year, "budget": _amount(row.budget_amount),
+            "requested": ZERO, "committed": ZERO, "actual": ZERO, "visible": visible("bi_visible"),
+        })
+        if row.li_id is None:
+            continue
+        line_item = line_items.setdefault(row.li_id, {
+            "id": row.li_id, "title": row.li_title, "budget_item_id": row.bi_id, "business_case_id": row.bc_id,
+            "requested": _amount(row.requested_amount), "committed": ZERO, "actual": ZERO,
+            "visible": visible("li_visible"),
+        })
+        totals = [item, line_item]
+        if row.bc_id is not None:
+            totals.append(business_cases.setdefault(row.bc_id, {
+                "id": row.bc_id, "title": row.bc_title,
+                "requested": ZERO, "committed": ZERO, "actual": ZERO, "visible": visible("bc_visible"),
+            }))
+        if row.li_id not in counted_line_items:
+            counted_line_items.add(row.li_id)
+            for total in totals[::2]:  # budget item and business case
+                total["requested"] += line_item["requested"]
+        for total in totals:
+            total["committed"] += committed
+            total["actual"] += actual
+        if row.wbs_id is not None:
+            wbs_rows[row.wbs_id] = {
+                "id": row.wbs_id, "wbs_code": row.wbs_code, "line_item_id": row.li_id,
+                "committed": committed, "actual": actual, "visible": visible("wbs_visible"),
+            }
+
+    def visible_only(rows):
+        return [{k: v for k, v in r.items() if k != "visible"} for r in rows.values() if r["visible"]]
+
+    return {
+        "budget_items": visible_only(budget_items),
+        "business_cases": sorted(visible_only(business_cases), key=lambda r: r["id"]),
+        "line_items": visible_only(line_items),
+        "wbs": visible_only(wbs_rows),
+        "cached": cached,
+    }
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the wbs_spend budget rollup cache")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db)
+            db.commit()
+            print(f"Cached spend of {count} WBS")
+            return 0
+
+        mismatches = check(db)
+        for wbs_id, cached, expected in mismatches[:20]:
+            print(f"WBS {wbs_id}: cached {cached}, expected {expected}")
+        print(f"{len(mismatches)} WBS with wrong cached spend")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
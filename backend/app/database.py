@@ -1,26 +1,126 @@
 import os
-from sqlalchemy import create_engine, event
+import re
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///../ebrose.db")
 
-# Handle SQLite specific configuration
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+# SQLite performance profile (SQLITE_PERFORMANCE_PROFILE=true). Each pragma can
+# also be set on its own, e.g. SQLITE_BUSY_TIMEOUT=10000, with or without the profile.
+SQLITE_PROFILE_PRAGMAS = {
+    "journal_mode": "WAL",       # readers no longer block behind a writer
+    "synchronous": "NORMAL",     # safe with WAL; fsync at checkpoints instead of every commit
+    "busy_timeout": "5000",      # ms to wait for the write lock before "database is locked"
+    "mmap_size": "268435456",    # 256 MiB memory-mapped reads
+    "cache_size": "-65536",      # 64 MiB page cache per connection (negative = KiB)
+    "temp_store": "MEMORY",
+}
+SQLITE_PROFILE_POOL = {"pool_size": 20, "max_overflow": 10, "pool_timeout": 30}
+
+_PRAGMA_VALUE = re.compile(r"^-?[A-Za-z0-9]+$")
+
+
+def _env_flag(env, name: str) -> bool:
+    return env.get(name, "").lower() in ["true", "1", "yes"]
+
+
+def sqlite_pragmas(env=os.environ) -> dict:
+    """Pragmas applied to every new SQLite connection, in order."""
+    profile = _env_flag(env, "SQLITE_PERFORMANCE_PROFILE")
+    pragmas = {"foreign_keys": "ON"}
+    for name, default in SQLITE_PROFILE_PRAGMAS.items():
+        value = env.get(f"SQLITE_{name.upper()}") or (default if profile else None)
+        if value is None:
+            continue
+        if not _PRAGMA_VALUE.match(value):
+            raise ValueError(f"Invalid value for SQLITE_{name.upper()}: {value!r}")
+        pragmas[name] = value
+    return pragmas
+
+
+def sqlite_pool_options(env=os.environ) -> dict:
+    """Connection pool sizing; SQLAlchemy's defaults unless the profile or overrides are set."""
+    profile = _env_flag(env, "SQLITE_PERFORMANCE_PROFILE")
+    options = dict(SQLITE_PROFILE_POOL) if profile else {}
+    for name in SQLITE_PROFILE_POOL:
+        value = env.get(f"SQLITE_{name.upper()}")
+        if value:
+            options[name] = int(value)
+    return options
+
+
+def create_db_engine(url: str, env=os.environ):
+    # Handle SQLite specific configuration
+    if not url.startswith("sqlite"):
+        # For PostgreSQL, MySQL, etc.
+        return create_engine(url)
+
+    pragmas = sqlite_pragmas(env)
+    sqlite_engine = create_engine(
+        url,
         connect_args={"check_same_thread": False},
+        **sqlite_pool_options(env)
     )
-else:
-    # For PostgreSQL, MySQL, etc.
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
-
-@event.listens_for(engine, "connect")
-def enable_sqlite_fk(dbapi_connection, connection_record):
-    # Only enable foreign keys for SQLite
-    if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
         cursor.close()
 
+    return sqlite_engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+def ensure_columns(bind=None) -> list:
+    """
+    Add columns declared on the models that are missing from existing tables
+    (create_all() does not alter tables). Added columns are nullable and start
+    out NULL; callers backfill them. Returns the added "table.column" names.
+    """
+    bind = bind or engine
+    existing_tables = set(inspect(bind).get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def ensure_indexes():
+    """
+    Create any indexes declared on the models that are missing from an
+    existing database. create_all() only creates indexes for new tables.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def settings_report(bind=None) -> dict:
+    """Effective database settings, read back from a live connection."""
+    bind = bind or engine
+    report = {"dialect": bind.dialect.name, "pool": bind.pool.status()}
+    if bind.dialect.name != "sqlite":
+        return report
+
+    pragmas = {}
+    with bind.connect() as conn:
+        for name in ["foreign_keys", *SQLITE_PROFILE_PRAGMAS]:
+            pragmas[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    report["pragmas"] = pragmas
+    return report
@@ -0,0 +1,225 @@
+"""
+Materialized effective permissions.
+
+The effective_access table holds the outcome of the access rules per user and
+record: owner-group members and creators get "Full" on owned records (role caps
+are applied at lookup time), and RecordAccess grants are expanded to every
+member of a granted group. It is kept up to date incrementally from session
+flush events whenever memberships, grants, record ownership or creators change,
+so acl.record_access_clause and check_record_access become a single indexed
+lookup when EFFECTIVE_ACCESS_ENABLED is set.
+
+Usage:
+    python -m app.effective_access rebuild
+    python -m app.effective_access check
+"""
+import argparse
+import sys
+
+from sqlalchemy import delete, event, insert, inspect, or_, select, union
+from sqlalchemy.orm import Session
+
+from . import acl, models
+from .models import now_utc
+
+OWNER_LEVEL = "Full"
+
+# Attributes whose change affects derived permissions
+RECORD_ATTRS = ("owner_group_id", "created_by")
+MEMBERSHIP_ATTRS = ("user_id", "group_id")
+GRANT_ATTRS = ("record_type", "record_id", "user_id", "group_id", "access_level", "expires_at")
+
+
+def owned_models():
+    return {name: getattr(models, name) for name in acl.OWNED_RECORD_TYPES}
+
+
+def derive_rows(conn, user_ids=None, record_type=None, record_id=None):
+    """
+    Evaluate the access rules set-based and return the effective rows as a set
+    of (user_id, record_type, record_id, level, expires_at) tuples.
+
+    Optionally restricted to some users or to a single record.
+    """
+    membership = models.UserGroupMembership
+    grant = models.RecordAccess
+    rows = set()
+
+    for name, model in owned_models().items():
+        if record_type is not None and name != record_type:
+            continue
+
+        via_owner = select(membership.user_id, model.id).join(
+            membership, membership.group_id == model.owner_group_id
+        )
+        via_creator = select(model.created_by, model.id).where(model.created_by.isnot(None))
+        if user_ids is not None:
+            via_owner = via_owner.where(membership.user_id.in_(user_ids))
+            via_creator = via_creator.where(model.created_by.in_(user_ids))
+        if record_id is not None:
+            via_owner = via_owner.where(model.id == record_id)
+            via_creator = via_creator.where(model.id == record_id)
+
+        for user_id, rid in conn.execute(union(via_owner, via_creator)):
+            rows.add((user_id, name, rid, OWNER_LEVEL, None))
+
+    direct = select(
+        grant.user_id, grant.record_type, grant.record_id, grant.access_level, grant.expires_at
+    ).where(grant.user_id.isnot(None), acl.active_grant_filter())
+    via_group = select(
+        membership.user_id, grant.record_type, grant.record_id, grant.access_level, grant.expires_at
+    ).join(membership, membership.group_id == grant.group_id).where(acl.active_grant_filter())
+    if user_ids is not None:
+        direct = direct.where(grant.user_id.in_(user_ids))
+        via_group = via_group.where(membership.user_id.in_(user_ids))
+    if record_type is not None:
+        direct = direct.where(grant.record_type == record_type, grant.record_id == record_id)
+        via_group = via_group.where(grant.record_type == record_type, grant.record_id == record_id)
+
+    for statement in (direct, via_group):
+        for user_id, rtype, rid, level, expires_at in conn.execute(statement):
+            rows.add((user_id, rtype, rid, level, expires_at))
+
+    return rows
+
+
+def stored_rows(conn, user_ids=None):
+    """Current contents of effective_access (unexpired rows only)."""
+    ea = models.EffectiveAccess
+    statement = select(ea.user_id, ea.record_type, ea.record_id, ea.level, ea.expires_at).where(
+        or_(ea.expires_at.is_(None), ea.expires_at > now_utc())
+    )
+    if user_ids is not None:
+        statement = statement.where(ea.user_id.in_(user_ids))
+    return set(conn.execute(statement).all())
+
+
+def _insert_rows(conn, rows):
+    if not rows:
+        return
+    conn.execute(insert(models.EffectiveAccess), [
+        {"user_id": u, "record_type": t, "record_id": r, "level": lvl, "expires_at": exp}
+        for u, t, r, lvl, exp in rows
+    ])
+
+
+def refresh_users(conn, user_ids):
+    """Recompute every effective row of the given users."""
+    user_ids = list(user_ids)
+    conn.execute(delete(models.EffectiveAccess).where(models.EffectiveAccess.user_id.in_(user_ids)))
+    _insert_rows(conn, derive_rows(conn, user_ids=user_ids))
+
+
+def refresh_record(conn, record_type: str, record_id: int):
+    """Recompute every effective row of one record."""
+    conn.execute(delete(models.EffectiveAccess).where(
+        models.EffectiveAccess.record_type == record_type,
+        models.EffectiveAccess.record_id == record_id
+    ))
+    _insert_rows(conn, derive_rows(conn, record_type=record_type, record_id=record_id))
+
+
+def rebuild(conn) -> int:
+    """Drop and recompute the whole table. Returns the number of rows written."""
+    conn.execute(delete(models.EffectiveAccess))
+    rows = derive_rows(conn)
+    _insert_rows(conn, rows)
+    return len(rows)
+
+
+def check(conn):
+    """
+    Compare effective_access with the current rule set.
+    Returns (missing, unexpected): rows the rules grant but the table lacks,
+    and rows in the table the rules no longer grant.
+    """
+    expected = derive_rows(conn)
+    actual = stored_rows(conn)
+    return expected - actual, actual - expected
+
+
+def _old_and_new(obj, attr):
+    """Values an attribute had before and after the flush (for re-parenting)."""
+    history = inspect(obj).attrs[attr].history
+    return set(history.deleted or ()) | set(history.unchanged or ()) | set(history.added or ())
+
+
+def _changed(obj, attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_effective_access(session, flush_context):
+    """Incrementally refresh effective_access for the scopes touched by this flush."""
+    if not acl.USE_EFFECTIVE_ACCESS:
+        return
+
+    owned = tuple(owned_models().values())
+    users = set()
+    records = set()
+
+    for obj in session.new | session.dirty | session.deleted:
+        is_dirty = obj in session.dirty
+        if isinstance(obj, models.UserGroupMembership):
+            if is_dirty and not _changed(obj, MEMBERSHIP_ATTRS):
+                continue
+            users |= _old_and_new(obj, "user_id")
+        elif isinstance(obj, models.RecordAccess):
+            if is_dirty and not _changed(obj, GRANT_ATTRS):
+                continue
+            for record_type in _old_and_new(obj, "record_type"):
+                for record_id in _old_and_new(obj, "record_id"):
+                    records.add((record_type, record_id))
+        elif isinstance(obj, owned):
+            if is_dirty and not _changed(obj, RECORD_ATTRS):
+                continue
+            records.add((type(obj).__name__, obj.id))
+        elif isinstance(obj, models.User) and obj in session.deleted:
+            users.add(obj.id)
+
+    users.discard(None)
+    if not users and not records:
+        return
+
+    conn = session.connection()
+    if users:
+        refresh_users(conn, users)
+    for record_type, record_id in records:
+        if record_type and record_id is not None:
+            refresh_record(conn, record_type, record_id)
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the effective_access table")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        if args.command == "rebuild":
+            count = rebuild(conn)
+            db.commit()
+            print(f"✓ Rebuilt effective_access: {count} rows")
+            return 0
+
+        missing, unexpected = check(conn)
+        for row in sorted(missing, key=str):
+            print(f"missing:    {row}")
+        for row in sorted(unexpected, key=str):
+            print(f"unexpected: {row}")
+        if missing or unexpected:
+            print(f"✗ effective_access is inconsistent: {len(missing)} missing, {len(unexpected)} unexpected")
+            return 1
+        print("✓ effective_access is consistent with the access rules")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
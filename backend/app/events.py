@@ -0,0 +1,363 @@
+"""
+Live record changes and alert deltas over Server-Sent Events.
+
+- A session flush listener writes a change_event row for every created,
+  updated or deleted business record, in the same transaction as the write,
+  so only committed changes are ever streamed. alert_store adds "alerts" rows
+  when the alerts of a PO or resource change.
+- One EventHub per process polls change_event for new rows (a single query
+  per poll no matter how many clients are connected) and fans them out to
+  the connected streams. Because the log is in the database, events written
+  by any replica reach clients on every replica.
+- Each stream has a bounded queue. A client that falls behind is not
+  buffered without limit: its queue is dropped and it catches up from the
+  table instead. Clients resume after a reconnect with Last-Event-ID; when
+  those events have been pruned already they get a "reset" event and should
+  reload.
+- Events are filtered per client with the usual access rules before sending.
+
+Event IDs follow commit order because SQLite serializes write transactions.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from . import acl, models
+from .models import now_utc
+
+logger = logging.getLogger(__name__)
+
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "1"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "500"))
+EVENTS_RETENTION_HOURS = float(os.getenv("EVENTS_RETENTION_HOURS", "24"))
+EVENTS_BATCH_SIZE = 500
+RECONNECT_MILLISECONDS = 3000
+
+# Records whose changes are streamed
+STREAMED_TYPES = (
+    models.BudgetItem, models.BusinessCase, models.BusinessCaseLineItem, models.WBS, models.Asset,
+    models.PurchaseOrder, models.GoodsReceipt, models.Resource, models.ResourcePOAllocation,
+)
+
+
+def _changed_fields(obj, action: str) -> List[str]:
+    if action == "delete":
+        return []
+    state = inspect(obj)
+    if action == "create":
+        return [attr.key for attr in state.mapper.column_attrs if state.dict.get(attr.key) is not None]
+    return [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+
+
+@event.listens_for(Session, "after_flush")
+def record_changes(session, flush_context):
+    rows = []
+    for objects, action in ((session.new, "create"), (session.dirty, "update"), (session.deleted, "delete")):
+        for obj in objects:
+            if not isinstance(obj, STREAMED_TYPES):
+                continue
+            fields = _changed_fields(obj, action)
+            if action == "update" and not fields:
+                continue
+            rows.append({
+                "event": "change",
+                "entity_type": type(obj).__name__,
+                "entity_id": obj.id,
+                "action": action,
+                "changed_fields": json.dumps(fields),
+                "owner_group_id": getattr(obj, "owner_group_id", None) or getattr(obj, "lead_group_id", None),
+                "created_by": getattr(obj, "created_by", None),
+                "created_at": now_utc(),
+            })
+    if rows:
+        session.connection().execute(insert(models.ChangeEvent), rows)
+
+
+def record_alert_deltas(db: Session, deltas: Dict[tuple, list]):
+    """Log the new alerts of each (source_type, source_id) whose alerts changed."""
+    if not deltas:
+        return
+    db.execute(insert(models.ChangeEvent), [
+        {
+            "event": "alerts",
+            "entity_type": source_type,
+            "entity_id": source_id,
+            "payload": json.dumps(alerts, default=str),
+            "created_at": now_utc(),
+        }
+        for (source_type, source_id), alerts in deltas.items()
+    ])
+
+
+def record_alerts_reset(db: Session):
+    """Tell clients to reload /alerts (after a full recomputation)."""
+    db.execute(insert(models.ChangeEvent).values(event="alerts_reset", created_at=now_utc()))
+
+
+def prune(db: Session, retention_hours: float = EVENTS_RETENTION_HOURS) -> int:
+    """Delete events older than the retention window. Returns the number deleted."""
+    cutoff = now_utc() - timedelta(hours=retention_hours)
+    return db.execute(delete(models.ChangeEvent).where(models.ChangeEvent.created_at < cutoff)).rowcount
+
+
+def _as_dict(row: models.ChangeEvent) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "event": row.event,
+        "entity_type": row.entity_type,
+        "entity_id": row.entity_id,
+        "action": row.action,
+        "changed_fields": json.loads(row.changed_fields) if row.changed_fields else [],
+        "owner_group_id": row.owner_group_id,
+        "created_by": row.created_by,
+        "payload": json.loads(row.payload) if row.payload else None,
+    }
+
+
+def events_after(db: Session, after_id: int, limit: int = EVENTS_BATCH_SIZE) -> List[Dict[str, Any]]:
+    statement = (
+        select(models.ChangeEvent)
+        .where(models.ChangeEvent.id > after_id)
+        .order_by(models.ChangeEvent.id)
+        .limit(limit)
+    )
+    return [_as_dict(row) for row in db.execute(statement).scalars()]
+
+
+def latest_event_id(db: Session) -> int:
+    return db.execute(select(func.max(models.ChangeEvent.id))).scalar() or 0
+
+
+def events_pruned_after(db: Session, after_id: int) -> bool:
+    """Whether events following after_id are no longer in the log."""
+    oldest = db.execute(select(func.min(models.ChangeEvent.id))).scalar()
+    if oldest is None:
+        return latest_event_id(db) > after_id
+    return oldest > after_id + 1
+
+
+def visible_events(db: Session, user: models.User, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The events the user may see: one access query per record type in the
+    batch. Deleted records cannot be checked against the table any more, so
+    their events go to the creator and the owner group's members.
+    """
+    if user.role in acl.UNRESTRICTED_ROLES:
+        return events
+
+    ids_by_type = {}
+    for item in events:
+        if item["event"] == "alerts" or (item["event"] == "change" and item["action"] != "delete"):
+            ids_by_type.setdefault(item["entity_type"], set()).add(item["entity_id"])
+    allowed = {
+        record_type: acl.accessible_ids(db, user, record_type, ids)
+        for record_type, ids in ids_by_type.items()
+    }
+    group_ids = None
+
+    visible = []
+    for item in events:
+        if item["event"] == "alerts_reset":
+            visible.append(item)
+        elif item["event"] == "change" and item["action"] == "delete":
+            if group_ids is None:
+                group_ids = set(db.execute(acl.user_group_ids_select(user.id)).scalars())
+            if item["created_by"] == user.id or item["owner_group_id"] in group_ids:
+                visible.append(item)
+        elif item["entity_id"] in allowed.get(item["entity_type"], ()):
+            visible.append(item)
+    return visible
+
+
+def format_event(item: Dict[str, Any]) -> str:
+    """Encode one event in the text/event-stream format."""
+    if item["event"] == "change":
+        data = {
+            "entity_type": item["entity_type"],
+            "entity_id": item["entity_id"],
+            "action": item["action"],
+            "changed_fields": item["changed_fields"],
+        }
+    elif item["event"] == "alerts":
+        data = {"source_type": item["entity_type"], "source_id": item["entity_id"], "alerts": item["payload"]}
+    else:
+        data = {}
+    return f"id: {item['id']}\nevent: {item['event']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, events: List[Dict[str, Any]]):
+        if self.overflowed:
+            return
+        for item in events:
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Slow client: stop buffering, it will catch up from the table
+                self.overflowed = True
+                return
+
+
+class EventHub:
+    """Polls change_event once per interval and fans new events out to every subscription."""
+
+    def __init__(self, session_factory, poll_seconds: float = EVENTS_POLL_SECONDS,
+                 queue_size: int = EVENTS_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.queue_size = queue_size
+        self.subscriptions = set()
+        self.last_id = 0
+        self.polls = 0
+        self._task = None
+
+    def _read(self, func, *args):
+        db = self.session_factory()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
+
+    async def read(self, func, *args):
+        """Run func(db, *args) with a short-lived session in the threadpool."""
+        return await run_in_threadpool(self._read, func, *args)
+
+    async def subscribe(self) -> Subscription:
+        if self._task is None:
+            self.last_id = await self.read(latest_event_id)
+            self._task = asyncio.create_task(self._poll_loop())
+        subscription = Subscription(self.queue_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions:
+            await self.stop()
+
+    async def poll_once(self):
+        events = await self.read(events_after, self.last_id)
+        self.polls += 1
+        if not events:
+            return
+        self.last_id = events[-1]["id"]
+        for subscription in list(self.subscriptions):
+            subscription.offer(events)
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event hub poll failed")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.subscriptions),
+            "last_event_id": self.last_id,
+            "polls": self.polls,
+            "lagging_connections": sum(1 for s in self.subscriptions if s.overflowed),
+        }
+
+
+async def stream(hub: EventHub, user_id: int, last_event_id: Optional[int], is_disconnected,
+                 heartbeat_seconds: float = EVENTS_HEARTBEAT_SECONDS):
+    """
+    Async generator of SSE text for one client: catch-up from last_event_id (if
+    given), then live events from the hub, with a heartbeat comment while idle.
+    Ends when the client disconnects or the user is deactivated.
+    """
+    subscription = await hub.subscribe()
+    # Everything after this position reaches the queue (or sets overflowed)
+    position = hub.last_id
+    loop = asyncio.get_running_loop()
+    try:
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        last_write = loop.time()
+        if last_event_id is not None and last_event_id < position:
+            if await hub.read(events_pruned_after, last_event_id):
+                yield f"id: {position}\nevent: reset\ndata: {{}}\n\n"
+            else:
+                position = last_event_id
+                subscription.overflowed = True  # catch up from the table first
+
+        while True:
+            if subscription.overflowed:
+                # Clear before reading so nothing offered afterwards is lost
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                events = await hub.read(events_after, position)
+                if len(events) == EVENTS_BATCH_SIZE:
+                    subscription.overflowed = True
+            else:
+                try:
+                    first = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    last_write = loop.time()
+                    continue
+                events = [first]
+                while not subscription.queue.empty():
+                    events.append(subscription.queue.get_nowait())
+
+            events = [item for item in events if item["id"] > position]
+            if not events:
+                continue
+            position = events[-1]["id"]
+
+            def _visible(db):
+                user = db.get(models.User, user_id)
+                if user is None or not user.is_active:
+                    return None
+                return visible_events(db, user, events)
+
+            visible = await hub.read(_visible)
+            if visible is None:
+                return
+            for item in visible:
+                yield format_event(item)
+            if visible:
+                last_write = loop.time()
+            elif loop.time() - last_write >= heartbeat_seconds:
+                # Busy with events this client may not see; keep the connection alive
+                yield ": heartbeat\n\n"
+                last_write = loop.time()
+            if await is_disconnected():
+                return
+    finally:
+        await hub.unsubscribe(subscription)
+
+
+def _default_session_factory():
+    from .database import SessionLocal
+    return SessionLocal()
+
+
+hub = EventHub(_default_session_factory)
@@ -0,0 +1,274 @@
+"""
+Closure table for the ownership chain.
+
+    BudgetItem ─┐
+                ├─ BusinessCaseLineItem ─ WBS ─ Asset ─ PurchaseOrder ─ GoodsReceipt
+    BusinessCase┘
+
+hierarchy_closure holds one row per (ancestor, descendant) pair, plus every
+node paired with itself at depth 0, so "all POs under business case X" and
+"budget item of GR Y" are single indexed lookups instead of four joins.
+
+The chain has a fixed shape, so all ancestors of a set of nodes of one type
+come from one outer-joined SELECT up the parent columns (derive_rows). A
+session flush listener keeps the table current in the same transaction:
+when nodes are created, deleted or re-parented, the rows of those nodes and
+of everything below them (found through the table itself) are re-derived.
+
+Usage:
+    python -m app.hierarchy rebuild
+    python -m app.hierarchy check
+"""
+import argparse
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, exists, insert, inspect, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+
+# node type -> [(parent column, parent type)]
+PARENTS: Dict[str, List[Tuple[str, str]]] = {
+    "BudgetItem": [],
+    "BusinessCase": [],
+    "BusinessCaseLineItem": [("budget_item_id", "BudgetItem"), ("business_case_id", "BusinessCase")],
+    "WBS": [("business_case_line_item_id", "BusinessCaseLineItem")],
+    "Asset": [("wbs_id", "WBS")],
+    "PurchaseOrder": [("asset_id", "Asset")],
+    "GoodsReceipt": [("po_id", "PurchaseOrder")],
+}
+NODE_TYPES = list(PARENTS)
+
+# Keep each IN (...) well under SQLite's bound-parameter limit
+ID_BATCH_SIZE = 500
+
+
+def _model(node_type: str):
+    return getattr(models, node_type)
+
+
+def _ancestor_select(node_type: str):
+    """SELECT of (node id, ancestor ids...) and the matching [(ancestor type, depth)]."""
+    base = aliased(_model(node_type))
+    columns, ancestors, joins = [base.id], [], []
+    frontier = [(node_type, base, 0)]
+    while frontier:
+        child_type, child, depth = frontier.pop(0)
+        for attr, parent_type in PARENTS[child_type]:
+            parent = aliased(_model(parent_type))
+            joins.append((parent, parent.id == getattr(child, attr)))
+            # The child's column rather than parent.id: a dangling reference (FKs are not
+            # enforced on SQLite) stays visible, like the parent columns themselves
+            columns.append(getattr(child, attr))
+            ancestors.append((parent_type, depth + 1))
+            frontier.append((parent_type, parent, depth + 1))
+
+    statement = select(*columns).select_from(base)
+    for parent, on in joins:
+        statement = statement.outerjoin(parent, on)
+    return statement, base, ancestors
+
+
+def derive_rows(conn, node_type: str, node_ids: Optional[Iterable[int]] = None) -> set:
+    """
+    Closure rows of nodes of one type (all of them when node_ids is None), as
+    (ancestor_type, ancestor_id, descendant_type, descendant_id, depth) tuples.
+    """
+    statement, base, ancestors = _ancestor_select(node_type)
+    if node_ids is None:
+        batches = [statement]
+    else:
+        node_ids = list(node_ids)
+        batches = [
+            statement.where(base.id.in_(node_ids[start:start + ID_BATCH_SIZE]))
+            for start in range(0, len(node_ids), ID_BATCH_SIZE)
+        ]
+
+    rows = set()
+    for batch in batches:
+        for node_id, *ancestor_ids in conn.execute(batch):
+            rows.add((node_type, node_id, node_type, node_id, 0))
+            for (ancestor_type, depth), ancestor_id in zip(ancestors, ancestor_ids):
+                if ancestor_id is not None:
+                    rows.add((ancestor_type, ancestor_id, node_type, node_id, depth))
+    return rows
+
+
+def _insert_rows(conn, rows):
+    if not rows:
+        return
+    conn.execute(insert(models.HierarchyClosure), [
+        {"ancestor_type": a_type, "ancestor_id": a_id, "descendant_type": d_type, "descendant_id": d_id, "depth": depth}
+        for a_type, a_id, d_type, d_id, depth in rows
+    ])
+
+
+def stored_rows(conn) -> set:
+    hc = models.HierarchyClosure
+    statement = select(hc.ancestor_type, hc.ancestor_id, hc.descendant_type, hc.descendant_id, hc.depth)
+    return {tuple(row) for row in conn.execute(statement)}
+
+
+def rebuild(conn) -> int:
+    """Drop and recompute the whole table. Returns the number of rows written."""
+    conn.execute(delete(models.HierarchyClosure))
+    count = 0
+    for node_type in NODE_TYPES:
+        rows = derive_rows(conn, node_type)
+        _insert_rows(conn, rows)
+        count += len(rows)
+    return count
+
+
+def needs_rebuild(conn) -> bool:
+    """True when the table is empty but chain records exist (first start after an upgrade)."""
+    if conn.execute(select(models.HierarchyClosure.depth).limit(1)).first() is not None:
+        return False
+    return any(
+        conn.execute(select(_model(node_type).id).limit(1)).first() is not None
+        for node_type in NODE_TYPES
+    )
+
+
+def check(conn):
+    """Return (missing, unexpected) rows compared with the current parent columns."""
+    expected = set()
+    for node_type in NODE_TYPES:
+        expected |= derive_rows(conn, node_type)
+    actual = stored_rows(conn)
+    return expected - actual, actual - expected
+
+
+def refresh_subtrees(conn, nodes: Iterable[Tuple[str, int]]):
+    """Re-derive the rows of the given nodes and of all their current descendants."""
+    nodes = set(nodes)
+    if not nodes:
+        return
+    hc = models.HierarchyClosure
+    affected = set(nodes)
+    node_list = list(nodes)
+    for start in range(0, len(node_list), ID_BATCH_SIZE):
+        batch = node_list[start:start + ID_BATCH_SIZE]
+        affected |= {
+            tuple(row) for row in conn.execute(
+                select(hc.descendant_type, hc.descendant_id)
+                .where(tuple_(hc.ancestor_type, hc.ancestor_id).in_(batch))
+            )
+        }
+
+    by_type = defaultdict(set)
+    for node_type, node_id in affected:
+        by_type[node_type].add(node_id)
+    for node_type, node_ids in by_type.items():
+        node_ids = list(node_ids)
+        for start in range(0, len(node_ids), ID_BATCH_SIZE):
+            conn.execute(delete(hc).where(
+                hc.descendant_type == node_type, hc.descendant_id.in_(node_ids[start:start + ID_BATCH_SIZE])
+            ))
+        _insert_rows(conn, derive_rows(conn, node_type, node_ids))
+
+
+def _parent_changed(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr, _ in PARENTS[type(obj).__name__])
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_hierarchy(session, flush_context):
+    node_classes = tuple(_model(node_type) for node_type in NODE_TYPES)
+    nodes = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if not isinstance(obj, node_classes):
+            continue
+        if obj in session.dirty and not _parent_changed(obj):
+            continue
+        if obj.id is not None:
+            nodes.add((type(obj).__name__, obj.id))
+    refresh_subtrees(session.connection(), nodes)
+
+
+# Lookups
+
+def descendant_ids_select(ancestor_type: str, ancestor_id: int, descendant_type: str):
+    """SELECT of the IDs of all descendant_type nodes under a node (usable as a subquery)."""
+    hc = models.HierarchyClosure
+    return select(hc.descendant_id).where(
+        hc.ancestor_type == ancestor_type,
+        hc.ancestor_id == ancestor_id,
+        hc.descendant_type == descendant_type,
+    )
+
+
+def descendants_of_any_select(ancestors: Iterable[Tuple[str, int]], descendant_type: str):
+    """SELECT of the IDs of descendant_type nodes under any of the given nodes."""
+    hc = models.HierarchyClosure
+    return select(hc.descendant_id).where(
+        tuple_(hc.ancestor_type, hc.ancestor_id).in_(list(ancestors)),
+        hc.descendant_type == descendant_type,
+    ).distinct()
+
+
+def ancestors_of_any_select(descendants: Iterable[Tuple[str, int]], ancestor_type: str):
+    """SELECT of the IDs of ancestor_type nodes above any of the given nodes."""
+    hc = models.HierarchyClosure
+    return select(hc.ancestor_id).where(
+        tuple_(hc.descendant_type, hc.descendant_id).in_(list(descendants)),
+        hc.ancestor_type == ancestor_type,
+    ).distinct()
+
+
+def ancestor_ids(db: Session, node_type: str, node_id: int, ancestor_type: str) -> List[int]:
+    """IDs of the ancestor_type nodes above a node, e.g. the business case of a GR."""
+    hc = models.HierarchyClosure
+    return list(db.execute(select(hc.ancestor_id).where(
+        hc.descendant_type == node_type,
+        hc.descendant_id == node_id,
+        hc.ancestor_type == ancestor_type,
+    ).order_by(hc.ancestor_id)).scalars())
+
+
+def has_ancestor_clause(model, node_type: str, ancestor_type: str):
+    """WHERE clause: rows of `model` with at least one ancestor_type ancestor (chain is complete)."""
+    hc = models.HierarchyClosure
+    return exists().where(
+        hc.descendant_type == node_type,
+        hc.descendant_id == model.id,
+        hc.ancestor_type == ancestor_type,
+    )
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the hierarchy_closure table")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        if args.command == "rebuild":
+            count = rebuild(conn)
+            db.commit()
+            print(f"✓ Rebuilt hierarchy_closure: {count} rows")
+            return 0
+
+        missing, unexpected = check(conn)
+        for row in sorted(missing, key=str):
+            print(f"missing:    {row}")
+        for row in sorted(unexpected, key=str):
+            print(f"unexpected: {row}")
+        if missing or unexpected:
+            print(f"✗ hierarchy_closure is inconsistent: {len(missing)} missing, {len(unexpected)} unexpected")
+            return 1
+        print("✓ hierarchy_closure matches the parent columns")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Periodic jobs run by app.scheduler (registered on import, from main).
+
+Each job takes a Session; the scheduler commits after it returns. Jobs that
+work through a backlog of unbounded size (expired grants, audit snapshots,
+audit archival) commit once per batch on purpose, so no single write
+transaction holds SQLite's write lock for the whole backlog and a failure
+keeps the batches already done.
+"""
+import json
+import logging
+import os
+
+from sqlalchemy.orm import Session
+
+from . import alert_store, audit_archive, audit_history, budget_rollup, events, models
+from .audit_writer import audit_values
+from .models import now_utc
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+ALERTS_REFRESH_SECONDS = float(os.getenv("ALERTS_REFRESH_SECONDS", "60"))
+RECORD_ACCESS_CLEANUP_SECONDS = float(os.getenv("RECORD_ACCESS_CLEANUP_SECONDS", "3600"))
+CHANGE_EVENT_PRUNE_SECONDS = 3600
+AUDIT_SNAPSHOT_SECONDS = 600
+AUDIT_ARCHIVE_SECONDS = 86400
+CLEANUP_BATCH_SIZE = 500
+
+
+def refresh_alerts(db: Session):
+    """Keep the alert table current so /alerts rarely has anything left to recompute."""
+    alert_store.bring_up_to_date(db)
+
+
+def delete_expired_record_access(db: Session) -> int:
+    """
+    Delete RecordAccess grants past their expiry, committing each batch. Deletes
+    go through the ORM so effective_access follows, and each one is audited.
+    Returns the count.
+    """
+    deleted = 0
+    while True:
+        grants = (
+            db.query(models.RecordAccess)
+            .filter(models.RecordAccess.expires_at.isnot(None), models.RecordAccess.expires_at <= now_utc())
+            .order_by(models.RecordAccess.id)
+            .limit(CLEANUP_BATCH_SIZE)
+            .all()
+        )
+        if not grants:
+            break
+        for grant in grants:
+            db.add(models.AuditLog(
+                table_name="record_access",
+                record_id=grant.id,
+                action="DELETE",
+                old_values=json.dumps(audit_values(grant), default=str),
+                user_id=None,
+                timestamp=now_utc()
+            ))
+            db.delete(grant)
+        db.commit()
+        deleted += len(grants)
+    if deleted:
+        logger.info(f"Deleted {deleted} expired record access grants")
+    return deleted
+
+
+def refresh_budget_rollup(db: Session):
+    """Recompute cached WBS spend marked dirty since the last run."""
+    if budget_rollup.CACHE_ENABLED:
+        budget_rollup.bring_up_to_date(db)
+
+
+def prune_change_events(db: Session) -> int:
+    """Drop streamed change events older than EVENTS_RETENTION_HOURS."""
+    return events.prune(db)
+
+
+def snapshot_audit_history(db: Session) -> int:
+    """Store full states of records changed AUDIT_SNAPSHOT_EVERY times since their last snapshot."""
+    return audit_history.take_snapshots(db)
+
+
+def archive_audit_log(db: Session) -> int:
+    """Move complete months older than AUDIT_RETENTION_DAYS to compressed archive segments."""
+    if not audit_archive.AUDIT_ARCHIVE_ENABLED:
+        return 0
+    return len(audit_archive.archive(db))
+
+
+scheduler.register("refresh_alerts", refresh_alerts, ALERTS_REFRESH_SECONDS, jitter_seconds=5, timeout_seconds=120)
+scheduler.register(
+    "delete_expired_record_access", delete_expired_record_access, RECORD_ACCESS_CLEANUP_SECONDS,
+    jitter_seconds=60, timeout_seconds=600, align=True
+)
+scheduler.register("prune_change_events", prune_change_events, CHANGE_EVENT_PRUNE_SECONDS,
+                   jitter_seconds=60, timeout_seconds=300, align=True)
+scheduler.register("refresh_budget_rollup", refresh_budget_rollup, ALERTS_REFRESH_SECONDS,
+                   jitter_seconds=5, timeout_seconds=120)
+scheduler.register("snapshot_audit_history", snapshot_audit_history, AUDIT_SNAPSHOT_SECONDS,
+                   jitter_seconds=60, timeout_seconds=600)
+scheduler.register("archive_audit_log", archive_audit_log, AUDIT_ARCHIVE_SECONDS,
+                   jitter_seconds=600, timeout_seconds=3600, align=True)
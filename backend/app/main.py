@@ -1,13 +1,20 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import os
 import logging
 
-from .database import Base, engine, SessionLocal
-from . import models, schemas, auth
+from .database import Base, engine, SessionLocal, ensure_columns, ensure_indexes, settings_report
+from . import models, schemas, auth, effective_access, hierarchy, alert_store, po_rollups, budget_rollup  # noqa: F401 - registers flush listeners
+from . import jobs  # noqa: F401 - registers scheduled jobs
 from .auth import now_utc
+from .password_hashing import hasher, PasswordHashingBusy, PASSWORD_HASH_RETRY_AFTER_SECONDS
+from .scheduler import scheduler, SCHEDULER_ENABLED
+from . import audit_writer, slow_queries, sql_metrics
+from .events import hub as event_hub
 from .routers import (
     auth as auth_router,
     users,
@@ -23,7 +30,10 @@ from .routers import (
     goods_receipts,
     resources,
     allocations,
-    alerts
+    alerts,
+    events,
+    rollups,
+    admin
 )
 
 logger = logging.getLogger(__name__)
@@ -32,6 +42,17 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup: Initialize database and create admin user
     Base.metadata.create_all(bind=engine)
+    added_columns = ensure_columns()
+    if added_columns:
+        logger.info(f"Added columns: {', '.join(added_columns)}")
+    if any(column.startswith("purchase_order.") for column in added_columns):
+        with engine.begin() as conn:
+            po_rollups.rebuild(conn)
+    with engine.begin() as conn:
+        if hierarchy.needs_rebuild(conn):
+            logger.info(f"Built hierarchy_closure: {hierarchy.rebuild(conn)} rows")
+    ensure_indexes()
+    logger.info(f"Database settings: {settings_report()}")
     
     # Initialize admin user from environment variables if no users exist
     if os.getenv("CREATE_ADMIN_USER", "").lower() in ["true", "1", "yes"]:
@@ -68,9 +89,15 @@ async def lifespan(app: FastAPI):
         finally:
             db.close()
     
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
     yield
-    # Shutdown: Cleanup if needed
-    pass
+    # Shutdown: stop background jobs, write queued audit entries, stop the event hub and the password hashing processes
+    await run_in_threadpool(scheduler.stop)
+    audit_writer.writer.stop()
+    await event_hub.stop()
+    hasher.shutdown()
 
 app = FastAPI(title="Ebrose API", debug=True, lifespan=lifespan)
 
@@ -88,8 +115,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    """Shed load instead of queueing logins behind a saturated hashing pool."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service is busy, please retry shortly"},
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+    )
+
+if sql_metrics.SQL_INSTRUMENTATION_ENABLED:
+    sql_metrics.instrument(engine)
+if slow_queries.SLOW_QUERY_LOG_ENABLED:
+    slow_queries.instrument(engine)
+
+@app.middleware("http")
+async def sql_instrumentation(request: Request, call_next):
+    """
+    Count the request's SQL statements and DB time; flag N+1 patterns and budget
+    overruns. With DEBUG logging, also log the membership queries the
+    request-scoped Principal saved.
+    """
+    if not sql_metrics.SQL_INSTRUMENTATION_ENABLED:
+        return await call_next(request)
+    with sql_metrics.track(f"{request.method} {request.url.path}") as stats:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = stats.server_timing()
+    sql_metrics.report(request.method, request.url.path, stats)
+    principal = getattr(request.state, "principal", None)
+    if principal is not None and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"{request.method} {request.url.path}: principal cache saved {principal.queries_saved} membership queries"
+        )
+    return response
+
 def get_db():
     db = SessionLocal()
     try:
@@ -116,3 +178,6 @@ app.include_router(goods_receipts.router)
 app.include_router(resources.router)
 app.include_router(allocations.router)
 app.include_router(alerts.router)
+app.include_router(events.router)
+app.include_router(rollups.router)
+app.include_router(admin.router)
@@ -1,6 +1,6 @@
 from decimal import Decimal
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, Boolean, Numeric, DateTime
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, Boolean, Numeric, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, column_property
 from .database import Base
 
@@ -10,6 +10,11 @@ def now_utc():
     return datetime.now(timezone.utc)
 
 
+def as_utc(value: datetime) -> datetime:
+    """Timezone-aware UTC datetime; naive values (as SQLite returns them) are taken as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "user"
 
@@ -28,6 +33,20 @@ class User(Base):
     # Note: We are not adding back_populates on the User side for every single entity 
     # to avoid cluttering the User model, unless necessary.
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_user_created_at_id", "created_at", "id"),
+    )
+
+
+class PrincipalCacheVersion(Base):
+    """Single-row version stamp; bumped whenever cached principals become stale."""
+    __tablename__ = "principal_cache_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True))
+
 
 class UserGroup(Base):
     __tablename__ = "user_group"
@@ -48,6 +67,10 @@ class UserGroupMembership(Base):
     added_by = Column(Integer, ForeignKey("user.id"))
     added_at = Column(DateTime(timezone=True))
 
+    __table_args__ = (
+        Index("ix_user_group_membership_user_group", "user_id", "group_id"),
+    )
+
 
 class RecordAccess(Base):
     __tablename__ = "record_access"
@@ -64,6 +87,33 @@ class RecordAccess(Base):
     updated_by = Column(Integer, ForeignKey("user.id"), nullable=True)
     updated_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Supports the ACL subqueries in app.acl (per-record, per-user and per-group lookups)
+    __table_args__ = (
+        Index("ix_record_access_record", "record_type", "record_id"),
+        Index("ix_record_access_user", "user_id", "record_type"),
+        Index("ix_record_access_group", "group_id", "record_type"),
+    )
+
+
+class EffectiveAccess(Base):
+    """
+    Materialized result of the access rules (owner group, creator, RecordAccess
+    grants) per user and record. Maintained by app.effective_access.
+    """
+    __tablename__ = "effective_access"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    record_type = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    level = Column(String(20), nullable=False)  # Read, Write, Full
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_effective_access_lookup", "user_id", "record_type", "record_id"),
+        Index("ix_effective_access_record", "record_type", "record_id"),
+    )
+
 
 class AuditLog(Base):
     __tablename__ = "audit_log"
@@ -74,11 +124,57 @@ class AuditLog(Base):
     action = Column(String(20), nullable=False)  # CREATE, UPDATE, DELETE
     old_values = Column(Text, nullable=True)
     new_values = Column(Text, nullable=True)
+    # UPDATE: JSON-patch ops of the changed fields instead of both snapshots (see app.audit_history)
+    changes = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey("user.id"))
     timestamp = Column(DateTime(timezone=True), nullable=False)
     ip_address = Column(String(50), nullable=True)
     user_agent = Column(Text, nullable=True)
 
+    # Keyset pagination order (timestamp desc, id desc), alone and after each equality filter
+    __table_args__ = (
+        Index("ix_audit_log_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_log_record_timestamp", "table_name", "record_id", "timestamp"),
+        Index("ix_audit_log_table_timestamp", "table_name", "timestamp"),
+        Index("ix_audit_log_user_timestamp", "user_id", "timestamp"),
+    )
+
+
+class AuditArchiveSegment(Base):
+    """A compressed file of archived audit entries under AUDIT_ARCHIVE_DIR (see app.audit_archive)."""
+    __tablename__ = "audit_archive_segment"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)
+    month = Column(String(7), nullable=False, index=True)  # YYYY-MM
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    entries = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class AuditSnapshot(Base):
+    """
+    Full state of an audited record after one of its audit entries, taken every
+    AUDIT_SNAPSHOT_EVERY changes and at the end of each archived month ("null"
+    for a record deleted by then).
+    """
+    __tablename__ = "audit_snapshot"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    audit_log_id = Column(Integer, nullable=False)  # No FK: old audit entries get archived
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    state = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_audit_snapshot_record", "table_name", "record_id", "audit_log_id", unique=True),
+    )
+
 
 class BudgetItem(Base):
     __tablename__ = "budget_item"
@@ -100,6 +196,11 @@ class BudgetItem(Base):
 
     line_items = relationship("BusinessCaseLineItem", back_populates="budget_item")
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_budget_item_created_at_id", "created_at", "id"),
+    )
+
 
 class BusinessCase(Base):
     __tablename__ = "business_case"
@@ -121,13 +222,18 @@ class BusinessCase(Base):
 
     line_items = relationship("BusinessCaseLineItem", back_populates="business_case")
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_business_case_created_at_id", "created_at", "id"),
+    )
+
 
 class BusinessCaseLineItem(Base):
     __tablename__ = "business_case_line_item"
 
     id = Column(Integer, primary_key=True, index=True)
-    business_case_id = Column(Integer, ForeignKey("business_case.id"), nullable=False)
-    budget_item_id = Column(Integer, ForeignKey("budget_item.id"), nullable=False)
+    business_case_id = Column(Integer, ForeignKey("business_case.id"), nullable=False, index=True)
+    budget_item_id = Column(Integer, ForeignKey("budget_item.id"), nullable=False, index=True)
     owner_group_id = Column(Integer, ForeignKey("user_group.id"), nullable=False, index=True)
     title = Column(Text, nullable=False)
     description = Column(Text)
@@ -147,12 +253,17 @@ class BusinessCaseLineItem(Base):
     budget_item = relationship("BudgetItem", back_populates="line_items")
     wbs_items = relationship("WBS", back_populates="line_item")
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_business_case_line_item_created_at_id", "created_at", "id"),
+    )
+
 
 class WBS(Base):
     __tablename__ = "wbs"
 
     id = Column(Integer, primary_key=True, index=True)
-    business_case_line_item_id = Column(Integer, ForeignKey("business_case_line_item.id"), nullable=False)
+    business_case_line_item_id = Column(Integer, ForeignKey("business_case_line_item.id"), nullable=False, index=True)
     wbs_code = Column(String(255), unique=True, index=True)
     description = Column(Text)
     owner_group_id = Column(Integer, ForeignKey("user_group.id"), nullable=False, index=True)
@@ -173,12 +284,17 @@ class WBS(Base):
         viewonly=True,
         uselist=False)
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_wbs_created_at_id", "created_at", "id"),
+    )
+
 
 class Asset(Base):
     __tablename__ = "asset"
 
     id = Column(Integer, primary_key=True, index=True)
-    wbs_id = Column(Integer, ForeignKey("wbs.id"), nullable=False)
+    wbs_id = Column(Integer, ForeignKey("wbs.id"), nullable=False, index=True)
     asset_code = Column(String(255), unique=True, index=True)
     asset_type = Column(String(50))
     description = Column(Text)
@@ -194,12 +310,17 @@ class Asset(Base):
     wbs = relationship("WBS", back_populates="assets")
     purchase_orders = relationship("PurchaseOrder", back_populates="asset")
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_asset_created_at_id", "created_at", "id"),
+    )
+
 
 class PurchaseOrder(Base):
     __tablename__ = "purchase_order"
 
     id = Column(Integer, primary_key=True, index=True)
-    asset_id = Column(Integer, ForeignKey("asset.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("asset.id"), nullable=False, index=True)
     po_number = Column(String(255), unique=True, index=True)
     ariba_pr_number = Column(String(255))
     supplier = Column(String(255))
@@ -214,6 +335,11 @@ class PurchaseOrder(Base):
     owner_group_id = Column(Integer, ForeignKey("user_group.id"), nullable=False, index=True)
     status = Column(String(50), index=True)
 
+    # Goods receipt rollups, maintained by app.po_rollups
+    received_amount = Column(Numeric(10, 2), default=0)
+    remaining_amount = Column(Numeric(10, 2))
+    gr_count = Column(Integer, default=0)
+
     # Audit
     created_by = Column(Integer, ForeignKey("user.id"), index=True)
     updated_by = Column(Integer, ForeignKey("user.id"))
@@ -224,12 +350,19 @@ class PurchaseOrder(Base):
     goods_receipts = relationship("GoodsReceipt", back_populates="po")
     allocations = relationship("ResourcePOAllocation", back_populates="po")
 
+    # Keyset pagination orders: (created_at desc, id desc) and by balance
+    __table_args__ = (
+        Index("ix_purchase_order_created_at_id", "created_at", "id"),
+        Index("ix_purchase_order_remaining_amount_id", "remaining_amount", "id"),
+        Index("ix_purchase_order_received_amount_id", "received_amount", "id"),
+    )
+
 
 class GoodsReceipt(Base):
     __tablename__ = "goods_receipt"
 
     id = Column(Integer, primary_key=True, index=True)
-    po_id = Column(Integer, ForeignKey("purchase_order.id"), nullable=False)
+    po_id = Column(Integer, ForeignKey("purchase_order.id"), nullable=False, index=True)
     gr_number = Column(String(255), unique=True, index=True)
     gr_date = Column(DateTime(timezone=True))
     amount = Column(Numeric(10, 2))
@@ -244,6 +377,11 @@ class GoodsReceipt(Base):
 
     po = relationship("PurchaseOrder", back_populates="goods_receipts")
 
+    # Keyset pagination order: (gr_date desc, id desc)
+    __table_args__ = (
+        Index("ix_goods_receipt_gr_date_id", "gr_date", "id"),
+    )
+
 
 class Resource(Base):
     __tablename__ = "resource"
@@ -266,6 +404,11 @@ class Resource(Base):
 
     allocations = relationship("ResourcePOAllocation", back_populates="resource")
 
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_resource_created_at_id", "created_at", "id"),
+    )
+
 
 class ResourcePOAllocation(Base):
     __tablename__ = "resource_po_allocation"
@@ -285,4 +428,138 @@ class ResourcePOAllocation(Base):
     updated_at = Column(DateTime(timezone=True), nullable=True)
 
     resource = relationship("Resource", back_populates="allocations")
-    po = relationship("PurchaseOrder", back_populates="allocations")
\ No newline at end of file
+    po = relationship("PurchaseOrder", back_populates="allocations")
+
+    # Keyset pagination order: (created_at desc, id desc)
+    __table_args__ = (
+        Index("ix_resource_po_allocation_created_at_id", "created_at", "id"),
+    )
+
+class Alert(Base):
+    """
+    Persisted alert, computed for one PO or resource (the source) by
+    app.alert_rules and kept current by app.alert_store.
+    """
+    __tablename__ = "alert"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_type = Column(String(50), nullable=False)  # PurchaseOrder, Resource
+    source_id = Column(Integer, nullable=False)
+    rule = Column(String(50), nullable=False)
+    entity_type = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    severity = Column(String(20), nullable=False)
+    message = Column(Text, nullable=False)
+    computed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_alert_source", "source_type", "source_id"),
+        Index("ix_alert_rule_entity", "rule", "entity_type", "entity_id"),
+        # One row per source, rule and entity: overlapping refreshes fail instead of duplicating alerts
+        UniqueConstraint("source_type", "source_id", "rule", "entity_type", "entity_id", name="uq_alert_source_rule_entity"),
+    )
+
+
+class AlertDirty(Base):
+    """Records changed since their alerts were last computed."""
+    __tablename__ = "alert_dirty"
+
+    id = Column(Integer, primary_key=True)
+    entity_type = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    marked_at = Column(DateTime(timezone=True))
+
+
+class AlertSweep(Base):
+    """Single row: the day of the last full alert recomputation (for time-based rules)."""
+    __tablename__ = "alert_sweep"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(String(10), nullable=False)  # YYYY-MM-DD
+    swept_at = Column(DateTime(timezone=True))
+
+
+class SchedulerLease(Base):
+    """Leader lease for the background scheduler; one row per lease name."""
+    __tablename__ = "scheduler_lease"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class SchedulerJob(Base):
+    """Last run of each scheduled job, written by whichever replica ran it."""
+    __tablename__ = "scheduler_job"
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(200))
+    last_started_at = Column(DateTime(timezone=True))
+    last_finished_at = Column(DateTime(timezone=True))
+    last_duration_ms = Column(Integer)
+    last_status = Column(String(20))  # running, ok, error, timeout
+    last_error = Column(Text)
+    run_count = Column(Integer, default=0)
+    failure_count = Column(Integer, default=0)
+
+
+class ChangeEvent(Base):
+    """
+    Committed record changes and alert deltas, in commit order; the ID is the
+    Server-Sent Events id clients resume from (see app.events).
+    """
+    __tablename__ = "change_event"
+
+    id = Column(Integer, primary_key=True)
+    event = Column(String(20), nullable=False)  # change, alerts, alerts_reset
+    entity_type = Column(String(50))
+    entity_id = Column(Integer)
+    action = Column(String(20))  # create, update, delete
+    changed_fields = Column(Text)  # JSON list of attribute names
+    owner_group_id = Column(Integer)  # at change time; filters delete events
+    created_by = Column(Integer)
+    payload = Column(Text)  # JSON; the current alerts of a source for "alerts"
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    # Never reuse IDs after pruning, or resuming clients would skip new events
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+class WBSSpend(Base):
+    """Cached PO totals per WBS for the budget rollup (see app.budget_rollup)."""
+    __tablename__ = "wbs_spend"
+
+    wbs_id = Column(Integer, primary_key=True)
+    committed_amount = Column(Numeric(10, 2), nullable=False)
+    actual_amount = Column(Numeric(10, 2), nullable=False)
+    po_count = Column(Integer, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True))
+
+
+class WBSSpendDirty(Base):
+    """Records whose change may alter a WBS's cached spend; processed by budget_rollup.refresh_dirty."""
+    __tablename__ = "wbs_spend_dirty"
+
+    id = Column(Integer, primary_key=True)
+    entity_type = Column(String(50), nullable=False)  # WBS, Asset, PurchaseOrder
+    entity_id = Column(Integer, nullable=False)
+    marked_at = Column(DateTime(timezone=True))
+
+
+class HierarchyClosure(Base):
+    """
+    Ancestor/descendant pairs of the ownership chain, including each node with
+    itself at depth 0 (maintained by app.hierarchy).
+    """
+    __tablename__ = "hierarchy_closure"
+
+    ancestor_type = Column(String(50), primary_key=True)
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_type = Column(String(50), primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    # The primary key serves "descendants of X"; this index serves "ancestors of Y"
+    __table_args__ = (
+        Index("ix_hierarchy_closure_descendant", "descendant_type", "descendant_id", "ancestor_type"),
+    )
@@ -0,0 +1,87 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Lists are ordered by (sort column desc, id desc), NULL sort values last. Instead of
+OFFSET, the client passes back the opaque cursor from the X-Next-Cursor response
+header and the next page starts right after that row with an index seek on the
+composite (sort column, id) index, so page N costs the same as page 1.
+
+skip/limit keep working for existing clients; when a cursor is given, skip is ignored.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value, record_id: int) -> str:
+    if isinstance(sort_value, Decimal):
+        key = [str(sort_value), record_id, "decimal"]
+    else:
+        key = [sort_value.isoformat() if isinstance(sort_value, datetime) else sort_value, record_id]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return (sort_value, id); raises 400 for anything that is not one of our cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, record_id, *kind = json.loads(raw)
+        if not isinstance(record_id, int) or kind not in ([], ["decimal"]):
+            raise ValueError
+        if value is None:
+            return None, record_id
+        return (Decimal(value) if kind else datetime.fromisoformat(value)), record_id
+    except (ValueError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    query: Query,
+    sort_column,
+    id_column,
+    response: Response,
+    limit: Optional[int],
+    skip: int = 0,
+    cursor: Optional[str] = None,
+) -> list:
+    """
+    Apply the keyset order and page to `query`, set X-Next-Cursor when more rows
+    follow, and return the page. limit=None returns everything after the cursor/skip.
+    """
+    order = (sort_column.desc().nulls_last(), id_column.desc())
+    fetch = limit + 1 if limit is not None else None
+
+    if cursor is None:
+        rows = query.order_by(*order).offset(skip).limit(fetch).all()
+    else:
+        sort_value, last_id = decode_cursor(cursor)
+        if sort_value is None:
+            # Already inside the NULL tail
+            rows = query.filter(sort_column.is_(None), id_column < last_id).order_by(id_column.desc()).limit(fetch).all()
+        else:
+            rows = query.filter(
+                sort_column.isnot(None),
+                tuple_(sort_column, id_column) < tuple_(sort_value, last_id)
+            ).order_by(*order).limit(fetch).all()
+            # Continue into the rows without a sort value once the others are exhausted
+            if fetch is None or len(rows) < fetch:
+                remaining = None if fetch is None else fetch - len(rows)
+                rows += query.filter(sort_column.is_(None)).order_by(id_column.desc()).limit(remaining).all()
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            last = rows[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                getattr(last, sort_column.key), getattr(last, id_column.key)
+            )
+    return rows
@@ -0,0 +1,131 @@
+"""
+Purchase order balance rollups.
+
+purchase_order.received_amount, remaining_amount and gr_count are kept in step
+with the goods receipts from a session flush listener, in the same transaction
+as the write: whenever a GR is created, changed, moved to another PO or
+deleted, or a PO's total changes, the affected POs are recomputed from their
+GRs with one UPDATE. Recomputing (instead of adding deltas) keeps the values
+exact even if a previous write bypassed the ORM; `rebuild` repairs everything.
+
+Usage:
+    python -m app.po_rollups rebuild
+    python -m app.po_rollups check
+"""
+import argparse
+import sys
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+ROLLUP_ATTRS = ("received_amount", "remaining_amount", "gr_count")
+
+
+def _rollup_values():
+    PO, GR = models.PurchaseOrder, models.GoodsReceipt
+    received = (
+        select(func.coalesce(func.sum(GR.amount), 0))
+        .where(GR.po_id == PO.id)
+        .scalar_subquery()
+    )
+    gr_count = select(func.count(GR.id)).where(GR.po_id == PO.id).scalar_subquery()
+    return {
+        "received_amount": received,
+        "remaining_amount": PO.total_amount - received,
+        "gr_count": gr_count,
+    }
+
+
+def refresh(conn, po_ids=None) -> int:
+    """Recompute the rollups of the given POs (all when None). Returns rows updated."""
+    statement = update(models.PurchaseOrder).values(**_rollup_values())
+    if po_ids is not None:
+        po_ids = list(po_ids)
+        if not po_ids:
+            return 0
+        statement = statement.where(models.PurchaseOrder.id.in_(po_ids))
+    return conn.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def rebuild(conn) -> int:
+    return refresh(conn)
+
+
+def check(conn):
+    """Return (po_id, stored, expected) for every PO whose rollups are wrong."""
+    PO = models.PurchaseOrder
+    values = _rollup_values()
+    statement = select(
+        PO.id, PO.received_amount, PO.remaining_amount, PO.gr_count,
+        values["received_amount"], values["remaining_amount"], values["gr_count"]
+    ).order_by(PO.id)
+    mismatches = []
+    for row in conn.execute(statement):
+        stored, expected = tuple(row[1:4]), tuple(row[4:7])
+        if [None if v is None else float(v) for v in stored] != [None if v is None else float(v) for v in expected]:
+            mismatches.append((row[0], stored, expected))
+    return mismatches
+
+
+def _old_and_new(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return set(history.deleted or ()) | set(history.unchanged or ()) | set(history.added or ())
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_po_rollups(session, flush_context):
+    po_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, models.GoodsReceipt):
+            if obj in session.dirty and not any(
+                inspect(obj).attrs[attr].history.has_changes() for attr in ("po_id", "amount")
+            ):
+                continue
+            po_ids |= _old_and_new(obj, "po_id")
+        elif isinstance(obj, models.PurchaseOrder) and obj not in session.deleted:
+            if obj in session.new or inspect(obj).attrs["total_amount"].history.has_changes():
+                po_ids.add(obj.id)
+
+    po_ids.discard(None)
+    if not po_ids:
+        return
+    refresh(session.connection(), po_ids)
+
+    # The UPDATE bypassed the ORM; reload the rollups of loaded POs on next access
+    for po_id in po_ids:
+        po = session.identity_map.get(inspect(models.PurchaseOrder).identity_key_from_primary_key((po_id,)))
+        if po is not None and po not in session.deleted:
+            session.expire(po, list(ROLLUP_ATTRS))
+
+
+def main(argv=None):
+    from .database import Base, SessionLocal, engine, ensure_columns
+
+    parser = argparse.ArgumentParser(description="Maintain purchase order balance rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_columns()
+    db = SessionLocal()
+    try:
+        conn = db.connection()
+        if args.command == "rebuild":
+            count = rebuild(conn)
+            db.commit()
+            print(f"Recomputed rollups of {count} purchase orders")
+            return 0
+
+        mismatches = check(conn)
+        for po_id, stored, expected in mismatches[:20]:
+            print(f"PO {po_id}: stored {stored}, expected {expected}")
+        print(f"{len(mismatches)} purchase orders with wrong rollups")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
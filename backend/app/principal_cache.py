@@ -0,0 +1,154 @@
+"""
+Process-wide cache of authenticated principals.
+
+get_current_user_from_token resolves the same token to the same user on every
+request; this cache keeps a detached snapshot of the user per token for at
+most min(PRINCIPAL_CACHE_TTL_SECONDS, token expiry) and merges it into the
+request session without a SELECT.
+
+Invalidation:
+- invalidate_user() drops the user's entries in this process and bumps the
+  version stamp in principal_cache_version inside the caller's transaction.
+- Every worker re-reads the version stamp at most every
+  PRINCIPAL_CACHE_MAX_STALENESS_SECONDS and clears its cache when it moved,
+  which bounds how long another worker can serve a stale role.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+from .models import now_utc
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_STALENESS_SECONDS = float(os.getenv("PRINCIPAL_CACHE_MAX_STALENESS_SECONDS", "5"))
+
+
+def _snapshot(user: models.User) -> models.User:
+    """Detached copy of the user's column attributes, safe to share across sessions."""
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+    copy = models.User(**values)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def read_version(db: Session) -> int:
+    version = db.query(models.PrincipalCacheVersion.version).filter(
+        models.PrincipalCacheVersion.id == 1
+    ).scalar()
+    return version or 0
+
+
+def bump_version(db: Session):
+    """Advance the shared version stamp (committed with the caller's transaction)."""
+    updated = db.execute(
+        update(models.PrincipalCacheVersion)
+        .where(models.PrincipalCacheVersion.id == 1)
+        .values(version=models.PrincipalCacheVersion.version + 1, updated_at=now_utc())
+    ).rowcount
+    if not updated:
+        db.add(models.PrincipalCacheVersion(id=1, version=1, updated_at=now_utc()))
+
+
+class PrincipalCache:
+    """Bounded LRU of token -> user snapshot with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_staleness_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self._entries = OrderedDict()  # token -> (user snapshot, expires_at epoch seconds)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._version_checked_at = 0.0
+
+    def _check_version(self, db: Session):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.max_staleness_seconds:
+            return
+        version = read_version(db)
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+            self._version = version
+            self._version_checked_at = now
+
+    def get(self, token: str, db: Session) -> Optional[models.User]:
+        """Return the cached user merged into `db`, or None on a miss."""
+        if not self.enabled:
+            return None
+        self._check_version(db)
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            snapshot = entry[0]
+        return db.merge(snapshot, load=False)
+
+    def put(self, token: str, user: models.User, token_expires_at: Optional[float]):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, float(token_expires_at))
+        snapshot = _snapshot(user)
+        with self._lock:
+            self._entries[token] = (snapshot, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop_user(self, user_id: int):
+        """Forget every cached token of a user in this process."""
+        with self._lock:
+            for token in [t for t, (user, _) in self._entries.items() if user.id == user_id]:
+                del self._entries[token]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "version": self._version,
+            }
+
+
+cache = PrincipalCache(
+    PRINCIPAL_CACHE_SIZE,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    PRINCIPAL_CACHE_MAX_STALENESS_SECONDS,
+)
+
+
+def invalidate_user(db: Session, user_id: int):
+    """
+    Call from any write that changes a user's identity, role or existence.
+    Other workers observe the bumped version within the staleness bound.
+    """
+    cache.drop_user(user_id)
+    bump_version(db)
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import audit_writer, models
+from ..auth import get_db, require_role
+from ..database import settings_report
+from ..events import hub
+from ..password_hashing import hasher
+from ..scheduler import scheduler
+from ..slow_queries import log as slow_query_log
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/password-hashing")
+def password_hashing_stats(
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Queue depth, rejections and latency of the password hashing pool."""
+    return hasher.stats()
+
+@router.get("/database")
+def database_settings(
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Effective connection pragmas and pool state."""
+    return settings_report()
+
+@router.get("/events")
+def event_stream_stats(
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Connected event streams on this instance and the hub's position in the change log."""
+    return hub.stats()
+
+@router.get("/audit-writer")
+def audit_writer_stats(
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Audit write mode, queue depth and lag, and write counters of this instance."""
+    return audit_writer.writer.stats()
+
+@router.get("/slow-queries")
+def slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Latest slow statements on this instance and the top fingerprints by total time, with plans."""
+    return slow_query_log.report(limit)
+
+@router.delete("/slow-queries")
+def clear_slow_queries(
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Reset this instance's slow-query log."""
+    slow_query_log.clear()
+    return {"cleared": True}
+
+@router.get("/jobs")
+def scheduled_jobs(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Scheduler leader and the last run (status, duration, error) of each job."""
+    return scheduler.status(db)
+
+@router.post("/jobs/{name}/run")
+def run_job(
+    name: str,
+    current_user: models.User = Depends(require_role("Admin"))
+):
+    """Make a job due now; it runs on the next tick if this instance is the leader."""
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    scheduler.trigger(name)
+    return {"name": name, "triggered": True, "is_leader": scheduler.is_leader}
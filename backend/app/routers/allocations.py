@@ -1,57 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
-from ..auth import get_db, get_current_user, check_record_access, audit_log_change, now_utc
+from .. import models, schemas, acl
+from ..auth import get_db, get_current_user, check_record_access, audit_log_change, get_principal, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/allocations", tags=["allocations"])
 
-def get_user_group_ids(db: Session, user_id: int) -> List[int]:
-    memberships = db.query(models.UserGroupMembership).filter(
-        models.UserGroupMembership.user_id == user_id
-    ).all()
-    return [m.group_id for m in memberships]
-
-def get_accessible_allocation_ids(db: Session, user: models.User) -> List[int]:
-    if user.role in ["Admin", "Manager"]:
-        all_allocs = db.query(models.ResourcePOAllocation.id).all()
-        return [a[0] for a in all_allocs]
-    
-    user_group_ids = get_user_group_ids(db, user.id)
-    
-    owned_allocs = db.query(models.ResourcePOAllocation.id).filter(
-        models.ResourcePOAllocation.owner_group_id.in_(user_group_ids)
-    ).all()
-    owned_ids = [a[0] for a in owned_allocs]
-    
-    created_allocs = db.query(models.ResourcePOAllocation.id).filter(
-        models.ResourcePOAllocation.created_by == user.id
-    ).all()
-    created_ids = [a[0] for a in created_allocs]
-    
-    user_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "ResourcePOAllocation",
-        models.RecordAccess.user_id == user.id,
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    group_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "ResourcePOAllocation",
-        models.RecordAccess.group_id.in_(user_group_ids),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    accessible_ids = set(owned_ids + created_ids)
-    for access in user_access + group_access:
-        accessible_ids.add(access.record_id)
-    
-    return list(accessible_ids)
-
 @router.get("/", response_model=List[schemas.ResourcePOAllocation])
 def list_allocations(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     resource_id: Optional[int] = None,
     po_id: Optional[int] = None,
     owner_group_id: Optional[int] = None,
@@ -65,11 +27,7 @@ def list_allocations(
     - Explicit RecordAccess grants
     - Records they created
     """
-    accessible_ids = get_accessible_allocation_ids(db, current_user)
-    
-    query = db.query(models.ResourcePOAllocation).filter(
-        models.ResourcePOAllocation.id.in_(accessible_ids)
-    )
+    query = acl.filter_accessible(db.query(models.ResourcePOAllocation), current_user, models.ResourcePOAllocation)
 
     if resource_id is not None:
         query = query.filter(models.ResourcePOAllocation.resource_id == resource_id)
@@ -78,9 +36,7 @@ def list_allocations(
     if owner_group_id is not None:
         query = query.filter(models.ResourcePOAllocation.owner_group_id == owner_group_id)
 
-    query = query.order_by(models.ResourcePOAllocation.created_at.desc())
-
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, models.ResourcePOAllocation.created_at, models.ResourcePOAllocation.id, response, limit, skip, cursor)
 
 @router.get("/{alloc_id}", response_model=schemas.ResourcePOAllocation)
 def get_allocation(
@@ -95,7 +51,7 @@ def get_allocation(
 
 @router.post("/", response_model=schemas.ResourcePOAllocation)
 @audit_log_change(action="CREATE", table_name="resource_po_allocation")
-async def create_allocation(
+def create_allocation(
     alloc: schemas.ResourcePOAllocationCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -113,10 +69,7 @@ async def create_allocation(
         raise HTTPException(status_code=403, detail="Viewers cannot create allocations")
 
     if current_user.role not in ["Admin", "Manager"]:
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [m.group_id for m in user_groups]
+        group_ids = get_principal(request).group_ids
 
         resource_access = None
         po_access = None
@@ -169,7 +122,7 @@ async def create_allocation(
 
 @router.put("/{alloc_id}", response_model=schemas.ResourcePOAllocation)
 @audit_log_change(action="UPDATE", table_name="resource_po_allocation")
-async def update_allocation(
+def update_allocation(
     alloc_id: int,
     alloc_update: schemas.ResourcePOAllocationUpdate,
     request: Request,
@@ -192,7 +145,7 @@ async def update_allocation(
 
 @router.delete("/{alloc_id}")
 @audit_log_change(action="DELETE", table_name="resource_po_allocation")
-async def delete_allocation(
+def delete_allocation(
     alloc_id: int,
     request: Request,
     db: Session = Depends(get_db),
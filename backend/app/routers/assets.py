@@ -1,71 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
-from ..auth import get_db, get_current_user, check_record_access, audit_log_change, user_in_owner_group, now_utc
+from .. import models, schemas, acl
+from ..auth import get_db, get_current_user, check_record_access, audit_log_change, user_in_owner_group, get_principal, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
-def get_user_group_ids(db: Session, user_id: int) -> List[int]:
-    """Get all group IDs the user belongs to."""
-    memberships = db.query(models.UserGroupMembership).filter(
-        models.UserGroupMembership.user_id == user_id
-    ).all()
-    return [m.group_id for m in memberships]
-
-def get_accessible_asset_ids(db: Session, user: models.User) -> List[int]:
-    """
-    Get all asset IDs the user can access based on:
-    1. Owner-group membership
-    2. Explicit RecordAccess grants (user or group)
-    3. Records the user created
-    """
-    if user.role in ["Admin", "Manager"]:
-        # Admins/Managers see all
-        all_assets = db.query(models.Asset.id).all()
-        return [a[0] for a in all_assets]
-    
-    # Get user's group IDs
-    user_group_ids = get_user_group_ids(db, user.id)
-    
-    # Get assets where user is in owner_group
-    owned_assets = db.query(models.Asset.id).filter(
-        models.Asset.owner_group_id.in_(user_group_ids)
-    ).all()
-    owned_ids = [a[0] for a in owned_assets]
-    
-    # Get assets user created
-    created_assets = db.query(models.Asset.id).filter(
-        models.Asset.created_by == user.id
-    ).all()
-    created_ids = [a[0] for a in created_assets]
-    
-    # Get explicit user RecordAccess grants
-    user_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "Asset",
-        models.RecordAccess.user_id == user.id,
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    # Get group RecordAccess grants
-    group_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "Asset",
-        models.RecordAccess.group_id.in_(user_group_ids),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    # Combine all accessible IDs
-    accessible_ids = set(owned_ids + created_ids)
-    for access in user_access + group_access:
-        accessible_ids.add(access.record_id)
-    
-    return list(accessible_ids)
-
 @router.get("/", response_model=List[schemas.Asset])
 def list_assets(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     wbs_id: Optional[int] = None,
     owner_group_id: Optional[int] = None,
     status: Optional[str] = None,
@@ -79,11 +27,7 @@ def list_assets(
     - Explicit RecordAccess grants
     - Records they created
     """
-    # Get accessible asset IDs
-    accessible_ids = get_accessible_asset_ids(db, current_user)
-    
-    # Start query with access filter
-    query = db.query(models.Asset).filter(models.Asset.id.in_(accessible_ids))
+    query = acl.filter_accessible(db.query(models.Asset), current_user, models.Asset)
     
     # Apply additional filters
     if wbs_id is not None:
@@ -92,12 +36,9 @@ def list_assets(
         query = query.filter(models.Asset.owner_group_id == owner_group_id)
     if status is not None:
         query = query.filter(models.Asset.status == status)
-    
-    # Order by created_at descending
-    query = query.order_by(models.Asset.created_at.desc())
-    
+
     # Apply pagination
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, models.Asset.created_at, models.Asset.id, response, limit, skip, cursor)
 
 @router.get("/{asset_id}", response_model=schemas.Asset)
 def get_asset(
@@ -112,7 +53,7 @@ def get_asset(
 
 @router.post("/", response_model=schemas.Asset)
 @audit_log_change(action="CREATE", table_name="asset")
-async def create_asset(
+def create_asset(
     asset: schemas.AssetCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -127,10 +68,7 @@ async def create_asset(
         raise HTTPException(status_code=403, detail="Viewers cannot create assets")
 
     if current_user.role not in ["Admin", "Manager"]:
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [m.group_id for m in user_groups]
+        group_ids = get_principal(request).group_ids
 
         if wbs.owner_group_id not in group_ids:
             wbs_access = db.query(models.RecordAccess).filter(
@@ -164,7 +102,7 @@ async def create_asset(
 
 @router.put("/{asset_id}", response_model=schemas.Asset)
 @audit_log_change(action="UPDATE", table_name="asset")
-async def update_asset(
+def update_asset(
     asset_id: int,
     asset_update: schemas.AssetUpdate,
     request: Request,
@@ -189,7 +127,7 @@ async def update_asset(
 
 @router.delete("/{asset_id}")
 @audit_log_change(action="DELETE", table_name="asset")
-async def delete_asset(
+def delete_asset(
     asset_id: int,
     request: Request,
     db: Session = Depends(get_db),
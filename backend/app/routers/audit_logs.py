@@ -1,30 +1,181 @@
-from fastapi import APIRouter, Depends
+import json
+from datetime import datetime
+from itertools import islice
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, acl, audit_archive, audit_history
 from ..auth import get_db, require_role, now_utc
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
 
 router = APIRouter(prefix="/audit-logs", tags=["audit-logs"])
 
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _with_archive(db: Session, entries: list, query, response: Response, limit: int, skip: int,
+                  cursor: Optional[str], **filters) -> list:
+    """Continue a page of the audit_log table into the archived entries once the table has no more."""
+    if not limit or NEXT_CURSOR_HEADER in response.headers or audit_archive.horizon(db) is None:
+        return entries
+    offset = 0
+    if entries:
+        before = (entries[-1].timestamp, entries[-1].id)
+    elif cursor is not None:
+        before = decode_cursor(cursor)
+        if before[0] is None:
+            return entries
+    else:
+        before = None
+        if skip:
+            offset = max(skip - query.count(), 0)
+    wanted = limit - len(entries)
+    archived = list(islice(audit_archive.read_entries(db, before=before, **filters), offset, offset + wanted + 1))
+    if len(archived) > wanted:
+        archived = archived[:wanted]
+        last = archived[-1] if archived else entries[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.timestamp, last.id)
+    return entries + archived
+
 @router.get("/", response_model=List[schemas.AuditLog])
 def list_audit_logs(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    table_name: Optional[str] = None,
+    action: Optional[str] = None,
+    record_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    q: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_role("Manager"))
 ):
+    """
+    Newest first, keyset-paginated. Equality filters are served by the
+    (table_name, record_id, timestamp), (table_name, timestamp) and
+    (user_id, timestamp) indexes; `q` matches text in the stored values.
+    Pages continue into the archived entries past the retention window.
+    """
+    AuditLog = models.AuditLog
+    action = action.upper() if action else None
+    query = db.query(AuditLog)
+    if user_id is not None:
+        query = query.filter(AuditLog.user_id == user_id)
+    if table_name:
+        query = query.filter(AuditLog.table_name == table_name)
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if record_id is not None:
+        query = query.filter(AuditLog.record_id == record_id)
+    if start_date is not None:
+        query = query.filter(AuditLog.timestamp >= models.as_utc(start_date))
+    if end_date is not None:
+        query = query.filter(AuditLog.timestamp <= models.as_utc(end_date))
+    if q:
+        # Values are stored as ASCII JSON, so look for the text as it is encoded there
+        pattern = f"%{_like_escape(json.dumps(q)[1:-1])}%"
+        query = query.filter(or_(
+            AuditLog.old_values.like(pattern, escape="\\"),
+            AuditLog.new_values.like(pattern, escape="\\"),
+            AuditLog.changes.like(pattern, escape="\\"),
+        ))
     # By default limit to last 100 to avoid performance hit
-    return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).limit(100).all()
+    entries = paginate(query, AuditLog.timestamp, AuditLog.id, response, limit, skip, cursor)
+    entries = _with_archive(db, entries, query, response, limit, skip, cursor, table_name=table_name or None,
+                            record_ids=[record_id] if record_id is not None else None, user_id=user_id,
+                            action=action, start=start_date, end=end_date, q=q)
+    # UPDATE entries show the fields they changed
+    return [audit_history.entry_view(entry) for entry in entries]
+
+def _state(record_type: str, record_id: int, as_of: datetime, values: Optional[dict]) -> dict:
+    values = audit_history.without_credentials(values)
+    return {"table_name": record_type, "record_id": record_id, "as_of": as_of,
+            "exists": values is not None, "values": values}
+
+def _audited_type(record_type: str) -> str:
+    """Model name of a table whose states can be looked up; 404 for users, grants and other tables."""
+    if record_type not in audit_history.AUDITED_MODELS:
+        raise HTTPException(status_code=404, detail=f"No record states for {record_type}")
+    return audit_history.AUDITED_MODELS[record_type]
+
+def _check_state_access(db: Session, user: models.User, model_name: str, record_id: int, values: Optional[dict]):
+    """Read access to the live record or, once it is deleted, to its owner group or as its creator."""
+    if user.role in acl.UNRESTRICTED_ROLES:
+        return
+    if db.get(getattr(models, model_name), record_id) is not None:
+        allowed = record_id in acl.accessible_ids(db, user, model_name, [record_id])
+    elif values is not None:
+        group_ids = set(db.scalars(acl.user_group_ids_select(user.id)))
+        allowed = values.get("created_by") == user.id or values.get("owner_group_id") in group_ids
+    else:
+        allowed = True
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient Read access to {model_name} {record_id}"
+        )
+
+@router.get("/{record_type}/state")
+def stream_states_as_of(
+    record_type: str,
+    as_of: datetime,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("Manager"))
+):
+    """Every record of a type that existed at `as_of`, with its state then, as NDJSON (one per line)."""
+    _audited_type(record_type)
+    bind = db.get_bind()
+
+    def lines():
+        # Own connection: the request's session is closed before the body streams
+        with bind.connect() as conn:
+            for record_id, values in audit_history.stream_states_as_of(conn, record_type, as_of):
+                yield json.dumps(_state(record_type, record_id, as_of, values), default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/{record_type}/{record_id}/state", response_model=schemas.AuditRecordState)
+def get_record_state(
+    record_type: str,
+    record_id: int,
+    as_of: datetime,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("User"))
+):
+    """A record as it was at `as_of`, rebuilt from its audit trail."""
+    model_name = _audited_type(record_type)
+    values = audit_history.states_as_of(db, record_type, [record_id], as_of)[record_id]
+    _check_state_access(db, current_user, model_name, record_id, values)
+    return _state(record_type, record_id, as_of, values)
 
 @router.get("/{record_type}/{record_id}", response_model=List[schemas.AuditLog])
 def get_record_history(
     record_type: str,
     record_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_role("User"))
 ):
     # Users can see history of records they can see? 
     # For simplicity, let's just allow "User" role to see history if they know the ID.
-    return db.query(models.AuditLog).filter(
-        models.AuditLog.table_name == record_type, # Note: mapping might be needed if table name != record type
+    query = db.query(models.AuditLog).filter(
+        models.AuditLog.table_name == record_type,
         models.AuditLog.record_id == record_id
-    ).order_by(models.AuditLog.timestamp.desc()).all()
+    )
+    entries = paginate(query, models.AuditLog.timestamp, models.AuditLog.id, response, limit, skip, cursor)
+    entries = _with_archive(db, entries, query, response, limit, skip, cursor,
+                            table_name=record_type, record_ids=[record_id])
+    # Full before/after of every version, rebuilt from the stored diffs
+    return [
+        audit_history.entry_view(version["entry"], version["before"], version["after"])
+        for version in audit_history.history(db, record_type, record_id, entries)
+    ]
@@ -10,7 +10,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, principal_cache
 from ..auth import get_db, verify_password, get_password_hash, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES, now_utc
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -87,6 +87,8 @@ def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(),
     # Update last login
     user.last_login = now_utc()
     db.commit()
+    # Drop this worker's snapshots so /auth/me reflects the new last_login
+    principal_cache.cache.drop_user(user.id)
 
     # Create access token with longer expiry for cookie storage
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -209,6 +211,7 @@ def update_users_me(
     current_user.updated_by = current_user.id
     current_user.updated_at = now_utc()
     
+    principal_cache.invalidate_user(db, current_user.id)
     db.commit()
     db.refresh(current_user)
     return current_user
@@ -241,6 +244,7 @@ def change_password(
     current_user.updated_by = current_user.id
     current_user.updated_at = now_utc()
     
+    principal_cache.invalidate_user(db, current_user.id)
     db.commit()
     
     return {"message": "Password changed successfully"}
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from .. import models, schemas
+from .. import models, schemas, acl, audit_writer
 from ..database import SessionLocal
 from ..auth import get_current_user, require_role, check_record_access, audit_log_change, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/budget-items", tags=["budget-items"])
 
@@ -19,43 +20,20 @@ def get_db():
 
 @router.get("/", response_model=List[schemas.BudgetItem])
 def list_budget_items(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     fiscal_year: int = None,
     owner_group_id: int = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """List all budget items with pagination and filtering."""
-    from app.auth import user_in_owner_group
-
     query = db.query(models.BudgetItem)
 
-    # CRITICAL: Filter by owner_group_id access (only show records user can access)
-    if current_user.role not in ["Admin", "Manager"]:
-        # Get all groups the user is a member of
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [membership.group_id for membership in user_groups]
-
-        # Filter to records owned by user's groups OR created by user OR explicit RecordAccess grants
-        accessible_ids_query = db.query(models.BudgetItem.id).filter(
-            (models.BudgetItem.owner_group_id.in_(group_ids)) |
-            (models.BudgetItem.created_by == current_user.id)
-        )
-
-        # Add explicit RecordAccess grants
-        explicit_access = db.query(models.RecordAccess.record_id).filter(
-            models.RecordAccess.record_type == "BudgetItem",
-            models.RecordAccess.user_id == current_user.id,
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        )
-
-        accessible_ids = [item.id for item in accessible_ids_query.all()]
-        accessible_ids += [access.record_id for access in explicit_access.all()]
-
-        query = query.filter(models.BudgetItem.id.in_(accessible_ids))
+    # CRITICAL: Filter by access (owner group, creator, explicit grants) in SQL
+    query = acl.filter_accessible(query, current_user, models.BudgetItem)
 
     # Apply filters
     if fiscal_year:
@@ -63,11 +41,8 @@ def list_budget_items(
     if owner_group_id:
         query = query.filter(models.BudgetItem.owner_group_id == owner_group_id)
 
-    # Order by created_at descending
-    query = query.order_by(models.BudgetItem.created_at.desc())
-
     # Apply pagination
-    items = query.offset(skip).limit(limit).all()
+    items = paginate(query, models.BudgetItem.created_at, models.BudgetItem.id, response, limit, skip, cursor)
     return items
 
 
@@ -85,7 +60,7 @@ def get_budget_item(
 
 
 @router.post("/", response_model=schemas.BudgetItem)
-async def create_budget_item(
+def create_budget_item(
     budget_item: schemas.BudgetItemCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -138,7 +113,7 @@ def update_budget_item(
         raise HTTPException(status_code=404, detail="Budget item not found")
 
     # Store old values for audit
-    old_values = schemas.BudgetItem.model_validate(db_budget_item).model_dump()
+    old_values = schemas.BudgetItem.model_validate(db_budget_item).model_dump(mode="json")
 
     # Update fields
     update_data = budget_item_update.model_dump(exclude_unset=True)
@@ -149,14 +124,9 @@ def update_budget_item(
     db_budget_item.updated_at = now_utc()
 
     # Add audit log
+    new_values = schemas.BudgetItem.model_validate(db_budget_item).model_dump(mode="json")
     audit_entry = models.AuditLog(
-        table_name="budget_item",
-        record_id=id,
-        action="UPDATE",
-        old_values=schemas.BudgetItem(**old_values).model_dump_json(),
-        new_values=schemas.BudgetItem.model_validate(db_budget_item).model_dump_json(),
-        user_id=current_user.id,
-        timestamp=now_utc()
+        **audit_writer.audit_row("budget_item", id, "UPDATE", current_user.id, old_values, new_values)
     )
     db.add(audit_entry)
 
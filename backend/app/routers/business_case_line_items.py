@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from .. import models, schemas
+from .. import models, schemas, acl, audit_writer
 from ..database import SessionLocal
 from ..auth import get_current_user, require_role, check_record_access, audit_log_change, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/business-case-line-items", tags=["business-case-line-items"])
 
@@ -19,8 +20,10 @@ def get_db():
 
 @router.get("/", response_model=List[schemas.BusinessCaseLineItem])
 def list_line_items(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     business_case_id: int = None,
     owner_group_id: int = None,
     spend_category: str = None,
@@ -30,31 +33,8 @@ def list_line_items(
     """List all business case line items with pagination and filtering."""
     query = db.query(models.BusinessCaseLineItem)
 
-    # CRITICAL: Filter by owner_group_id access (only show records user can access)
-    if current_user.role not in ["Admin", "Manager"]:
-        # Get all groups the user is a member of
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [membership.group_id for membership in user_groups]
-
-        # Filter to accessible records
-        accessible_ids_query = db.query(models.BusinessCaseLineItem.id).filter(
-            (models.BusinessCaseLineItem.owner_group_id.in_(group_ids)) |
-            (models.BusinessCaseLineItem.created_by == current_user.id)
-        )
-
-        # Add explicit RecordAccess grants
-        explicit_access = db.query(models.RecordAccess.record_id).filter(
-            models.RecordAccess.record_type == "BusinessCaseLineItem",
-            models.RecordAccess.user_id == current_user.id,
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        )
-
-        accessible_ids = [item.id for item in accessible_ids_query.all()]
-        accessible_ids += [access.record_id for access in explicit_access.all()]
-
-        query = query.filter(models.BusinessCaseLineItem.id.in_(accessible_ids))
+    # CRITICAL: Filter by access (owner group, creator, explicit grants) in SQL
+    query = acl.filter_accessible(query, current_user, models.BusinessCaseLineItem)
 
     # Apply filters
     if business_case_id:
@@ -64,11 +44,8 @@ def list_line_items(
     if spend_category:
         query = query.filter(models.BusinessCaseLineItem.spend_category == spend_category)
 
-    # Order by created_at descending
-    query = query.order_by(models.BusinessCaseLineItem.created_at.desc())
-
     # Apply pagination
-    items = query.offset(skip).limit(limit).all()
+    items = paginate(query, models.BusinessCaseLineItem.created_at, models.BusinessCaseLineItem.id, response, limit, skip, cursor)
     return items
 
 
@@ -140,7 +117,7 @@ def update_line_item(
         raise HTTPException(status_code=404, detail="Business case line item not found")
 
     # Store old values for audit
-    old_values = schemas.BusinessCaseLineItem.model_validate(db_line_item).model_dump()
+    old_values = schemas.BusinessCaseLineItem.model_validate(db_line_item).model_dump(mode="json")
 
     # Update fields
     update_data = line_item_update.model_dump(exclude_unset=True)
@@ -151,14 +128,9 @@ def update_line_item(
     db_line_item.updated_at = now_utc()
 
     # Add audit log
+    new_values = schemas.BusinessCaseLineItem.model_validate(db_line_item).model_dump(mode="json")
     audit_entry = models.AuditLog(
-        table_name="business_case_line_item",
-        record_id=id,
-        action="UPDATE",
-        old_values=schemas.BusinessCaseLineItem(**old_values).model_dump_json(),
-        new_values=schemas.BusinessCaseLineItem.model_validate(db_line_item).model_dump_json(),
-        user_id=current_user.id,
-        timestamp=now_utc()
+        **audit_writer.audit_row("business_case_line_item", id, "UPDATE", current_user.id, old_values, new_values)
     )
     db.add(audit_entry)
 
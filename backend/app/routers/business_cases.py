@@ -1,49 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, selectinload
+from typing import Any, Dict, List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, acl
 from ..auth import get_db, get_current_user, check_record_access, audit_log_change, require_role, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/business-cases", tags=["business-cases"])
 
 @router.get("/", response_model=List[schemas.BusinessCase])
 def list_business_cases(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: str = None,
     requestor: str = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_role("User"))
 ):
     """List all business cases with pagination and filtering - implements hybrid access control."""
-    from app.auth import check_business_case_access
-
     query = db.query(models.BusinessCase)
 
+    # CRITICAL: Filter by hybrid access control (creator + line-item + explicit) in SQL
+    query = query.filter(acl.business_case_access_clause(current_user, "Read"))
+
     # Apply filters
     if status:
         query = query.filter(models.BusinessCase.status == status)
     if requestor:
         query = query.filter(models.BusinessCase.requestor.ilike(f"%{requestor}%"))
 
-    # Order by created_at descending
-    query = query.order_by(models.BusinessCase.created_at.desc())
-
-    # Get all BCs and filter by hybrid access control
-    all_bcs = query.all()
-
-    # CRITICAL: Filter by hybrid access control (creator + line-item + explicit)
-    if current_user.role not in ["Admin", "Manager"]:
-        accessible_bcs = []
-        for bc in all_bcs:
-            if check_business_case_access(current_user, bc, db, "Read"):
-                accessible_bcs.append(bc)
-        # Apply pagination to filtered results
-        return accessible_bcs[skip:skip+limit]
-
-    # Admin/Manager see all - apply pagination
-    return all_bcs[skip:skip+limit]
+    # Apply pagination to the filtered result in the database
+    return paginate(query, models.BusinessCase.created_at, models.BusinessCase.id, response, limit, skip, cursor)
 
 @router.get("/{bc_id}", response_model=schemas.BusinessCase)
 def get_business_case(
@@ -65,9 +54,101 @@ def get_business_case(
 
     return bc
 
+# Levels of /tree below the business case: (key, parent model, relationship, schema).
+# Each level is one selectinload query; purchase orders have two child collections.
+TREE_LEVELS = [
+    [("line_items", models.BusinessCase, "line_items", schemas.BusinessCaseLineItem)],
+    [("wbs_items", models.BusinessCaseLineItem, "wbs_items", schemas.WBS)],
+    [("assets", models.WBS, "assets", schemas.Asset)],
+    [("purchase_orders", models.Asset, "purchase_orders", schemas.PurchaseOrder)],
+    [
+        ("goods_receipts", models.PurchaseOrder, "goods_receipts", schemas.GoodsReceipt),
+        ("allocations", models.PurchaseOrder, "allocations", schemas.ResourcePOAllocation),
+    ],
+]
+TREE_SCHEMAS = {"business_case": schemas.BusinessCase}
+TREE_SCHEMAS.update({key: schema for level in TREE_LEVELS for key, _, _, schema in level})
+
+
+def _tree_fields(fields: Optional[str]) -> Dict[str, set]:
+    """Parse `fields=line_items.title,purchase_orders.po_number` into {key: {field, ...}}."""
+    projection: Dict[str, set] = {}
+    for item in filter(None, (part.strip() for part in (fields or "").split(","))):
+        key, _, field = item.partition(".")
+        schema = TREE_SCHEMAS.get(key)
+        if schema is None or field not in schema.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown tree field: {item}")
+        projection.setdefault(key, {"id"}).add(field)
+    return projection
+
+
+def _tree_options(user: models.User, depth: int):
+    """selectinload chains down to `depth`, each relationship filtered by the user's read access."""
+    def load(parent_model, relationship_name):
+        attr = getattr(parent_model, relationship_name)
+        target = attr.property.mapper.class_
+        if user.role not in acl.UNRESTRICTED_ROLES:
+            attr = attr.and_(acl.record_access_clause(user, target))
+        return attr
+
+    chain = None
+    for level in TREE_LEVELS[:depth]:
+        leaves = [load(parent, name) for _, parent, name, _ in level]
+        if chain is None:
+            chain = selectinload(leaves[0])
+            continue
+        if len(leaves) == 1:
+            chain = chain.selectinload(leaves[0])
+        else:
+            # Sibling collections hang off the same parent loader
+            return [chain.selectinload(leaf) for leaf in leaves]
+    return [chain] if chain is not None else []
+
+
+def _tree_node(obj, key: str, depth: int, level: int, projection: Dict[str, set]) -> Dict[str, Any]:
+    node = TREE_SCHEMAS[key].model_validate(obj).model_dump(mode="json", include=projection.get(key))
+    if level < depth:
+        for child_key, _, relationship_name, _ in TREE_LEVELS[level]:
+            children = sorted(getattr(obj, relationship_name), key=lambda child: child.id)
+            node[child_key] = [_tree_node(child, child_key, depth, level + 1, projection) for child in children]
+    return node
+
+
+@router.get("/{bc_id}/tree")
+def get_business_case_tree(
+    bc_id: int,
+    depth: int = Query(len(TREE_LEVELS), ge=0, le=len(TREE_LEVELS)),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("User"))
+):
+    """
+    A business case with its line items, WBS, assets, POs, goods receipts and
+    allocations nested, in one query per level. Records the user cannot read are
+    left out together with everything below them.
+    """
+    from app.auth import check_business_case_access
+
+    projection = _tree_fields(fields)
+    bc = (
+        db.query(models.BusinessCase)
+        .options(*_tree_options(current_user, depth))
+        .populate_existing()
+        .filter(models.BusinessCase.id == bc_id)
+        .first()
+    )
+    if not bc:
+        raise HTTPException(status_code=404, detail="BusinessCase not found")
+
+    if current_user.role not in ["Admin", "Manager"]:
+        if not check_business_case_access(current_user, bc, db, "Read"):
+            raise HTTPException(status_code=403, detail="Insufficient permissions to access this business case")
+
+    return _tree_node(bc, "business_case", depth, 0, projection)
+
 @router.post("/", response_model=schemas.BusinessCase)
 @audit_log_change(action="CREATE", table_name="business_case")
-async def create_business_case(
+def create_business_case(
     bc: schemas.BusinessCaseCreate, 
     request: Request,
     db: Session = Depends(get_db),
@@ -84,7 +165,7 @@ async def create_business_case(
     return db_bc
 
 @router.put("/{bc_id}", response_model=schemas.BusinessCase)
-async def update_business_case(
+def update_business_case(
     bc_id: int,
     bc_update: schemas.BusinessCaseUpdate,
     request: Request,
@@ -128,7 +209,7 @@ async def update_business_case(
     return bc
 
 @router.delete("/{bc_id}")
-async def delete_business_case(
+def delete_business_case(
     bc_id: int,
     request: Request,
     db: Session = Depends(get_db),
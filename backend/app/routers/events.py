@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from .. import models
+from ..auth import get_current_user
+from ..events import hub, stream
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+@router.get("/stream")
+def stream_events(
+    request: Request,
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Server-Sent Events: record changes and alert deltas the user can access.
+
+    Browsers resume with the Last-Event-ID header automatically after a
+    reconnect; `since` does the same for a fresh EventSource.
+    """
+    resume_from = last_event_id if last_event_id is not None else since
+    return StreamingResponse(
+        stream(hub, current_user.id, resume_from, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,57 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
-from ..auth import get_db, get_current_user, check_record_access, audit_log_change, now_utc
+from .. import models, schemas, acl
+from ..auth import get_db, get_current_user, check_record_access, audit_log_change, get_principal, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/goods-receipts", tags=["goods-receipts"])
 
-def get_user_group_ids(db: Session, user_id: int) -> List[int]:
-    memberships = db.query(models.UserGroupMembership).filter(
-        models.UserGroupMembership.user_id == user_id
-    ).all()
-    return [m.group_id for m in memberships]
-
-def get_accessible_gr_ids(db: Session, user: models.User) -> List[int]:
-    if user.role in ["Admin", "Manager"]:
-        all_grs = db.query(models.GoodsReceipt.id).all()
-        return [g[0] for g in all_grs]
-    
-    user_group_ids = get_user_group_ids(db, user.id)
-    
-    owned_grs = db.query(models.GoodsReceipt.id).filter(
-        models.GoodsReceipt.owner_group_id.in_(user_group_ids)
-    ).all()
-    owned_ids = [g[0] for g in owned_grs]
-    
-    created_grs = db.query(models.GoodsReceipt.id).filter(
-        models.GoodsReceipt.created_by == user.id
-    ).all()
-    created_ids = [g[0] for g in created_grs]
-    
-    user_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "GoodsReceipt",
-        models.RecordAccess.user_id == user.id,
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    group_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "GoodsReceipt",
-        models.RecordAccess.group_id.in_(user_group_ids),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    accessible_ids = set(owned_ids + created_ids)
-    for access in user_access + group_access:
-        accessible_ids.add(access.record_id)
-    
-    return list(accessible_ids)
-
 @router.get("/", response_model=List[schemas.GoodsReceipt])
 def list_goods_receipts(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     po_id: Optional[int] = None,
     owner_group_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -64,18 +26,14 @@ def list_goods_receipts(
     - Explicit RecordAccess grants
     - Records they created
     """
-    accessible_ids = get_accessible_gr_ids(db, current_user)
-    
-    query = db.query(models.GoodsReceipt).filter(models.GoodsReceipt.id.in_(accessible_ids))
+    query = acl.filter_accessible(db.query(models.GoodsReceipt), current_user, models.GoodsReceipt)
 
     if po_id is not None:
         query = query.filter(models.GoodsReceipt.po_id == po_id)
     if owner_group_id is not None:
         query = query.filter(models.GoodsReceipt.owner_group_id == owner_group_id)
 
-    query = query.order_by(models.GoodsReceipt.gr_date.desc())
-
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, models.GoodsReceipt.gr_date, models.GoodsReceipt.id, response, limit, skip, cursor)
 
 @router.get("/{gr_id}", response_model=schemas.GoodsReceipt)
 def get_goods_receipt(
@@ -90,7 +48,7 @@ def get_goods_receipt(
 
 @router.post("/", response_model=schemas.GoodsReceipt)
 @audit_log_change(action="CREATE", table_name="goods_receipt")
-async def create_goods_receipt(
+def create_goods_receipt(
     gr: schemas.GoodsReceiptCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -105,10 +63,7 @@ async def create_goods_receipt(
         raise HTTPException(status_code=403, detail="Viewers cannot create goods receipts")
 
     if current_user.role not in ["Admin", "Manager"]:
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [m.group_id for m in user_groups]
+        group_ids = get_principal(request).group_ids
 
         if po.owner_group_id not in group_ids:
             po_access = db.query(models.RecordAccess).filter(
@@ -142,7 +97,7 @@ async def create_goods_receipt(
 
 @router.put("/{gr_id}", response_model=schemas.GoodsReceipt)
 @audit_log_change(action="UPDATE", table_name="goods_receipt")
-async def update_goods_receipt(
+def update_goods_receipt(
     gr_id: int,
     gr_update: schemas.GoodsReceiptUpdate,
     request: Request,
@@ -167,7 +122,7 @@ async def update_goods_receipt(
 
 @router.delete("/{gr_id}")
 @audit_log_change(action="DELETE", table_name="goods_receipt")
-async def delete_goods_receipt(
+def delete_goods_receipt(
     gr_id: int,
     request: Request,
     db: Session = Depends(get_db),
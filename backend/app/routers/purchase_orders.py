@@ -1,67 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from decimal import Decimal
 from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
-from ..auth import get_db, get_current_user, check_record_access, audit_log_change, now_utc
+from .. import models, schemas, acl
+from ..auth import get_db, get_current_user, check_record_access, audit_log_change, get_principal, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/purchase-orders", tags=["purchase-orders"])
 
-def get_user_group_ids(db: Session, user_id: int) -> List[int]:
-    """Get all group IDs the user belongs to."""
-    memberships = db.query(models.UserGroupMembership).filter(
-        models.UserGroupMembership.user_id == user_id
-    ).all()
-    return [m.group_id for m in memberships]
-
-def get_accessible_po_ids(db: Session, user: models.User) -> List[int]:
-    """
-    Get all PO IDs the user can access based on:
-    1. Owner-group membership
-    2. Explicit RecordAccess grants (user or group)
-    3. Records the user created
-    """
-    if user.role in ["Admin", "Manager"]:
-        all_pos = db.query(models.PurchaseOrder.id).all()
-        return [p[0] for p in all_pos]
-    
-    user_group_ids = get_user_group_ids(db, user.id)
-    
-    owned_pos = db.query(models.PurchaseOrder.id).filter(
-        models.PurchaseOrder.owner_group_id.in_(user_group_ids)
-    ).all()
-    owned_ids = [p[0] for p in owned_pos]
-    
-    created_pos = db.query(models.PurchaseOrder.id).filter(
-        models.PurchaseOrder.created_by == user.id
-    ).all()
-    created_ids = [p[0] for p in created_pos]
-    
-    user_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "PurchaseOrder",
-        models.RecordAccess.user_id == user.id,
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    group_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "PurchaseOrder",
-        models.RecordAccess.group_id.in_(user_group_ids),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    accessible_ids = set(owned_ids + created_ids)
-    for access in user_access + group_access:
-        accessible_ids.add(access.record_id)
-    
-    return list(accessible_ids)
+# List orders (descending); each has a (column, id) index for keyset pagination
+SORT_COLUMNS = {
+    "created_at": models.PurchaseOrder.created_at,
+    "remaining_amount": models.PurchaseOrder.remaining_amount,
+    "received_amount": models.PurchaseOrder.received_amount,
+}
 
 @router.get("/", response_model=List[schemas.PurchaseOrder])
 def list_purchase_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     owner_group_id: Optional[int] = None,
     supplier: Optional[str] = None,
+    remaining_amount_lt: Optional[Decimal] = None,
+    remaining_amount_gte: Optional[Decimal] = None,
+    has_goods_receipts: Optional[bool] = None,
+    sort_by: str = "created_at",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -71,10 +38,12 @@ def list_purchase_orders(
     - Owner-group membership
     - Explicit RecordAccess grants
     - Records they created
+
+    sort_by: created_at, remaining_amount or received_amount (descending).
     """
-    accessible_ids = get_accessible_po_ids(db, current_user)
-    
-    query = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id.in_(accessible_ids))
+    if sort_by not in SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(SORT_COLUMNS)}")
+    query = acl.filter_accessible(db.query(models.PurchaseOrder), current_user, models.PurchaseOrder)
 
     if status is not None:
         query = query.filter(models.PurchaseOrder.status == status)
@@ -82,10 +51,16 @@ def list_purchase_orders(
         query = query.filter(models.PurchaseOrder.owner_group_id == owner_group_id)
     if supplier is not None:
         query = query.filter(models.PurchaseOrder.supplier.ilike(f"%{supplier}%"))
+    if remaining_amount_lt is not None:
+        query = query.filter(models.PurchaseOrder.remaining_amount < remaining_amount_lt)
+    if remaining_amount_gte is not None:
+        query = query.filter(models.PurchaseOrder.remaining_amount >= remaining_amount_gte)
+    if has_goods_receipts is True:
+        query = query.filter(models.PurchaseOrder.gr_count > 0)
+    elif has_goods_receipts is False:
+        query = query.filter(models.PurchaseOrder.gr_count == 0)
 
-    query = query.order_by(models.PurchaseOrder.created_at.desc())
-
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, SORT_COLUMNS[sort_by], models.PurchaseOrder.id, response, limit, skip, cursor)
 
 @router.get("/{po_id}", response_model=schemas.PurchaseOrder)
 def get_purchase_order(
@@ -100,7 +75,7 @@ def get_purchase_order(
 
 @router.post("/", response_model=schemas.PurchaseOrder)
 @audit_log_change(action="CREATE", table_name="purchase_order")
-async def create_purchase_order(
+def create_purchase_order(
     po: schemas.PurchaseOrderCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -115,10 +90,7 @@ async def create_purchase_order(
         raise HTTPException(status_code=403, detail="Viewers cannot create purchase orders")
 
     if current_user.role not in ["Admin", "Manager"]:
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [m.group_id for m in user_groups]
+        group_ids = get_principal(request).group_ids
 
         if asset.owner_group_id not in group_ids:
             asset_access = db.query(models.RecordAccess).filter(
@@ -152,7 +124,7 @@ async def create_purchase_order(
 
 @router.delete("/{po_id}")
 @audit_log_change(action="DELETE", table_name="purchase_order")
-async def delete_purchase_order(
+def delete_purchase_order(
     po_id: int, 
     request: Request,
     db: Session = Depends(get_db),
@@ -167,7 +139,7 @@ async def delete_purchase_order(
 
 @router.put("/{po_id}", response_model=schemas.PurchaseOrder)
 @audit_log_change(action="UPDATE", table_name="purchase_order")
-async def update_purchase_order(
+def update_purchase_order(
     po_id: int,
     po_update: schemas.PurchaseOrderUpdate,
     request: Request,
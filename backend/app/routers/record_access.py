@@ -2,11 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, acl
 from ..auth import get_db, get_current_user, require_role, now_utc
 
 router = APIRouter(prefix="/record-access", tags=["record-access"])
 
+MAX_BATCH_CHECK_IDS = 5000
+
 @router.get("/{record_type}/{record_id}", response_model=List[schemas.RecordAccess])
 def get_record_access_list(
     record_type: str,
@@ -21,6 +23,32 @@ def get_record_access_list(
         models.RecordAccess.record_id == record_id
     ).all()
 
+@router.post("/check", response_model=schemas.RecordAccessCheckResponse)
+def check_access_batch(
+    check: schemas.RecordAccessCheckRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Return which of the given records the current user can access at the requested level."""
+    if check.access_level not in acl.ACCESS_LEVELS:
+        raise HTTPException(status_code=400, detail="Invalid access level")
+    if len(check.record_ids) > MAX_BATCH_CHECK_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_CHECK_IDS} record IDs can be checked per request"
+        )
+
+    try:
+        allowed = acl.accessible_ids(db, current_user, check.record_type, check.record_ids, check.access_level)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid record type")
+
+    return {
+        "record_type": check.record_type,
+        "access_level": check.access_level,
+        "allowed_ids": [record_id for record_id in check.record_ids if record_id in allowed]
+    }
+
 @router.post("/", response_model=schemas.RecordAccess)
 def grant_access(
     access: schemas.RecordAccessCreate,
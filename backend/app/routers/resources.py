@@ -1,57 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, acl
 from ..auth import get_db, get_current_user, check_record_access, audit_log_change, require_role, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/resources", tags=["resources"])
 
-def get_user_group_ids(db: Session, user_id: int) -> List[int]:
-    memberships = db.query(models.UserGroupMembership).filter(
-        models.UserGroupMembership.user_id == user_id
-    ).all()
-    return [m.group_id for m in memberships]
-
-def get_accessible_resource_ids(db: Session, user: models.User) -> List[int]:
-    if user.role in ["Admin", "Manager"]:
-        all_resources = db.query(models.Resource.id).all()
-        return [r[0] for r in all_resources]
-    
-    user_group_ids = get_user_group_ids(db, user.id)
-    
-    owned_resources = db.query(models.Resource.id).filter(
-        models.Resource.owner_group_id.in_(user_group_ids)
-    ).all()
-    owned_ids = [r[0] for r in owned_resources]
-    
-    created_resources = db.query(models.Resource.id).filter(
-        models.Resource.created_by == user.id
-    ).all()
-    created_ids = [r[0] for r in created_resources]
-    
-    user_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "Resource",
-        models.RecordAccess.user_id == user.id,
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    group_access = db.query(models.RecordAccess).filter(
-        models.RecordAccess.record_type == "Resource",
-        models.RecordAccess.group_id.in_(user_group_ids),
-        (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-    ).all()
-    
-    accessible_ids = set(owned_ids + created_ids)
-    for access in user_access + group_access:
-        accessible_ids.add(access.record_id)
-    
-    return list(accessible_ids)
-
 @router.get("/", response_model=List[schemas.Resource])
 def list_resources(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     owner_group_id: Optional[int] = None,
     status: Optional[str] = None,
     vendor: Optional[str] = None,
@@ -65,9 +27,7 @@ def list_resources(
     - Explicit RecordAccess grants
     - Records they created
     """
-    accessible_ids = get_accessible_resource_ids(db, current_user)
-    
-    query = db.query(models.Resource).filter(models.Resource.id.in_(accessible_ids))
+    query = acl.filter_accessible(db.query(models.Resource), current_user, models.Resource)
 
     if owner_group_id is not None:
         query = query.filter(models.Resource.owner_group_id == owner_group_id)
@@ -76,9 +36,7 @@ def list_resources(
     if vendor is not None:
         query = query.filter(models.Resource.vendor.ilike(f"%{vendor}%"))
 
-    query = query.order_by(models.Resource.created_at.desc())
-
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, models.Resource.created_at, models.Resource.id, response, limit, skip, cursor)
 
 @router.get("/{resource_id}", response_model=schemas.Resource)
 def get_resource(
@@ -93,7 +51,7 @@ def get_resource(
 
 @router.post("/", response_model=schemas.Resource)
 @audit_log_change(action="CREATE", table_name="resource")
-async def create_resource(
+def create_resource(
     resource: schemas.ResourceCreate, 
     request: Request,
     db: Session = Depends(get_db),
@@ -111,7 +69,7 @@ async def create_resource(
 
 @router.put("/{resource_id}", response_model=schemas.Resource)
 @audit_log_change(action="UPDATE", table_name="resource")
-async def update_resource(
+def update_resource(
     resource_id: int,
     resource_update: schemas.ResourceUpdate,
     request: Request,
@@ -135,7 +93,7 @@ async def update_resource(
 
 @router.delete("/{resource_id}")
 @audit_log_change(action="DELETE", table_name="resource")
-async def delete_resource(
+def delete_resource(
     resource_id: int,
     request: Request,
     db: Session = Depends(get_db),
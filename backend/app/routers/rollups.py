@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+from .. import budget_rollup, models, scheduler, schemas
+from ..auth import get_db, get_current_user
+
+router = APIRouter(prefix="/rollups", tags=["rollups"])
+
+@router.get("/budget", response_model=schemas.BudgetRollup)
+def get_budget_rollup(
+    budget_item_id: Optional[int] = None,
+    business_case_id: Optional[int] = None,
+    fiscal_year: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Budget, requested, committed (PO) and actual (GR) amounts per budget item,
+    business case, line item and WBS the user can read.
+
+    Committed and actual totals only count POs the user can read; filters restrict
+    the line items counted.
+    """
+    # The refresh_budget_rollup job keeps the cache current; without the scheduler, refresh here
+    if budget_rollup.CACHE_ENABLED and not scheduler.SCHEDULER_ENABLED:
+        budget_rollup.bring_up_to_date(db)
+    return budget_rollup.rollup(db, current_user, budget_item_id, business_case_id, fiscal_year)
@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, principal_cache
 from ..auth import get_db, get_current_user, require_role, get_password_hash, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/", response_model=List[schemas.User])
 def list_users(
+    response: Response,
+    skip: int = 0,
+    limit: Optional[int] = None,  # No limit by default: existing clients expect every user
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_role("User")) # Users can see other users
 ):
-    return db.query(models.User).all()
+    return paginate(db.query(models.User), models.User.created_at, models.User.id, response, limit, skip, cursor)
 
 @router.get("/{user_id}", response_model=schemas.User)
 def get_user(
@@ -48,7 +53,9 @@ def update_user(
         db_user.role = user_update.role
     if user_update.password:
         db_user.hashed_password = get_password_hash(user_update.password)
-        
+
+    # Cached principals (this and other workers) must not keep serving the old role
+    principal_cache.invalidate_user(db, user_id)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -63,5 +70,6 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
+    principal_cache.invalidate_user(db, user_id)
     db.commit()
     return {"status": "deleted"}
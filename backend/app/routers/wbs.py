@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..database import SessionLocal
-from .. import models, schemas
-from ..auth import get_db, get_current_user, check_record_access, audit_log_change, now_utc
+from .. import models, schemas, acl
+from ..auth import get_db, get_current_user, check_record_access, audit_log_change, get_principal, now_utc
+from ..pagination import paginate
 
 router = APIRouter(prefix="/wbs", tags=["wbs"])
 
 @router.get("/", response_model=List[schemas.WBS])
 def list_wbs(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     business_case_line_item_id: int = None,
     owner_group_id: int = None,
     status: str = None,
@@ -20,31 +23,8 @@ def list_wbs(
     """List all WBS items with pagination and filtering."""
     query = db.query(models.WBS)
 
-    # CRITICAL: Filter by owner_group_id access (only show records user can access)
-    if current_user.role not in ["Admin", "Manager"]:
-        # Get all groups the user is a member of
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [membership.group_id for membership in user_groups]
-
-        # Filter to accessible records
-        accessible_ids_query = db.query(models.WBS.id).filter(
-            (models.WBS.owner_group_id.in_(group_ids)) |
-            (models.WBS.created_by == current_user.id)
-        )
-
-        # Add explicit RecordAccess grants
-        explicit_access = db.query(models.RecordAccess.record_id).filter(
-            models.RecordAccess.record_type == "WBS",
-            models.RecordAccess.user_id == current_user.id,
-            (models.RecordAccess.expires_at.is_(None)) | (models.RecordAccess.expires_at > now_utc())
-        )
-
-        accessible_ids = [item.id for item in accessible_ids_query.all()]
-        accessible_ids += [access.record_id for access in explicit_access.all()]
-
-        query = query.filter(models.WBS.id.in_(accessible_ids))
+    # CRITICAL: Filter by access (owner group, creator, explicit grants) in SQL
+    query = acl.filter_accessible(query, current_user, models.WBS)
 
     # Apply filters
     if business_case_line_item_id:
@@ -54,11 +34,8 @@ def list_wbs(
     if status:
         query = query.filter(models.WBS.status == status)
 
-    # Order by created_at descending
-    query = query.order_by(models.WBS.created_at.desc())
-
     # Apply pagination
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, models.WBS.created_at, models.WBS.id, response, limit, skip, cursor)
 
 @router.get("/{wbs_id}", response_model=schemas.WBS)
 def get_wbs(
@@ -73,7 +50,7 @@ def get_wbs(
 
 @router.post("/", response_model=schemas.WBS)
 @audit_log_change(action="CREATE", table_name="wbs")
-async def create_wbs(
+def create_wbs(
     wbs: schemas.WBSCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -89,10 +66,7 @@ async def create_wbs(
         raise HTTPException(status_code=403, detail="Viewers cannot create WBS items")
 
     if current_user.role not in ["Admin", "Manager"]:
-        user_groups = db.query(models.UserGroupMembership).filter(
-            models.UserGroupMembership.user_id == current_user.id
-        ).all()
-        group_ids = [m.group_id for m in user_groups]
+        group_ids = get_principal(request).group_ids
 
         if line_item.owner_group_id not in group_ids:
             line_item_access = db.query(models.RecordAccess).filter(
@@ -126,7 +100,7 @@ async def create_wbs(
 
 @router.put("/{wbs_id}", response_model=schemas.WBS)
 @audit_log_change(action="UPDATE", table_name="wbs")
-async def update_wbs(
+def update_wbs(
     wbs_id: int,
     wbs_update: schemas.WBSUpdate,
     request: Request,
@@ -151,7 +125,7 @@ async def update_wbs(
 
 @router.delete("/{wbs_id}")
 @audit_log_change(action="DELETE", table_name="wbs")
-async def delete_wbs(
+def delete_wbs(
     wbs_id: int,
     request: Request,
     db: Session = Depends(get_db),
@@ -0,0 +1,301 @@
+"""
+In-process scheduler for periodic background jobs.
+
+Jobs are registered with an interval (optionally aligned to wall-clock
+multiples of the interval, e.g. every hour on the hour), random jitter and a
+timeout. A single leader runs them: every replica competes for the
+scheduler_lease row, the holder renews it while alive and another replica
+takes over once it expires. Run results are stored in scheduler_job so
+/admin/jobs shows the same status on every replica.
+
+Started from main.lifespan unless SCHEDULER_ENABLED=false.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, sql_metrics
+from .models import now_utc
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ["true", "1", "yes"]
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "1"))
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+# How long shutdown waits for the scheduling loop; running jobs are not waited for
+STOP_TIMEOUT_SECONDS = 5
+
+LEASE_NAME = "scheduler"
+
+
+class Job:
+    """A registered job and this process's view of its schedule."""
+
+    def __init__(self, name: str, func: Callable[[Session], object], interval_seconds: float,
+                 jitter_seconds: float = 0, timeout_seconds: Optional[float] = None, align: bool = False):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.timeout_seconds = timeout_seconds
+        self.align = align
+        self.next_run = None  # epoch seconds
+        self.future = None
+        self.started_at = None  # monotonic
+        self.timed_out = False
+
+    @property
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def schedule_next(self, now: float):
+        if self.align:
+            next_run = (now // self.interval_seconds + 1) * self.interval_seconds
+        else:
+            next_run = now + self.interval_seconds
+        self.next_run = next_run + random.uniform(0, self.jitter_seconds)
+
+
+class Scheduler:
+    def __init__(self, session_factory, lease_seconds: float = SCHEDULER_LEASE_SECONDS,
+                 tick_seconds: float = SCHEDULER_TICK_SECONDS, workers: int = SCHEDULER_WORKERS,
+                 holder: Optional[str] = None):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick_seconds
+        self.workers = workers
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self.is_leader = False
+        self._lease_checked_at = 0.0
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, name: str, func: Callable[[Session], object], interval_seconds: float,
+                 jitter_seconds: float = 0, timeout_seconds: Optional[float] = None, align: bool = False) -> Job:
+        """Register `func(db)`; the scheduler commits after it returns and rolls back on error."""
+        job = Job(name, func, interval_seconds, jitter_seconds, timeout_seconds, align)
+        self.jobs[name] = job
+        return job
+
+    # Leader election
+
+    def try_acquire_lease(self) -> bool:
+        """Take or renew the lease if it is ours or expired. Returns whether we hold it."""
+        db = self.session_factory()
+        try:
+            now = now_utc()
+            expires_at = now + timedelta(seconds=self.lease_seconds)
+            Lease = models.SchedulerLease
+            acquired = db.execute(
+                update(Lease)
+                .where(Lease.name == LEASE_NAME, (Lease.holder == self.holder) | (Lease.expires_at < now))
+                .values(holder=self.holder, expires_at=expires_at)
+            ).rowcount
+            if not acquired and db.get(Lease, LEASE_NAME) is None:
+                db.add(Lease(name=LEASE_NAME, holder=self.holder, expires_at=expires_at))
+                try:
+                    db.flush()
+                    acquired = 1
+                except IntegrityError:
+                    db.rollback()
+                    acquired = 0
+            db.commit()
+        finally:
+            db.close()
+
+        if bool(acquired) != self.is_leader:
+            logger.info(f"Scheduler {self.holder} {'became' if acquired else 'is no longer'} leader")
+        self.is_leader = bool(acquired)
+        return self.is_leader
+
+    def release_lease(self):
+        if not self.is_leader:
+            return
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(models.SchedulerLease)
+                .where(models.SchedulerLease.name == LEASE_NAME, models.SchedulerLease.holder == self.holder)
+                .values(expires_at=now_utc())
+            )
+            db.commit()
+        finally:
+            db.close()
+        self.is_leader = False
+
+    # Running jobs
+
+    def _record(self, job: Job, **values):
+        db = self.session_factory()
+        try:
+            state = db.get(models.SchedulerJob, job.name)
+            if state is None:
+                state = models.SchedulerJob(name=job.name, run_count=0, failure_count=0)
+                db.add(state)
+            for key, value in values.items():
+                setattr(state, key, value)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, job: Job):
+        started = time.monotonic()
+        self._record(job, last_started_at=now_utc(), last_status="running", holder=self.holder)
+        status, error = "ok", None
+        db = self.session_factory()
+        try:
+            with sql_metrics.track(f"job {job.name}"):
+                job.func(db)
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            status, error = "error", repr(e)
+            logger.exception(f"Scheduled job {job.name} failed")
+        finally:
+            db.close()
+
+        if job.timed_out and status == "ok":
+            status = "timeout"
+        duration_ms = int((time.monotonic() - started) * 1000)
+        db = self.session_factory()
+        try:
+            state = db.get(models.SchedulerJob, job.name)
+            state.last_finished_at = now_utc()
+            state.last_duration_ms = duration_ms
+            state.last_status = status
+            state.last_error = error
+            state.run_count = (state.run_count or 0) + 1
+            state.failure_count = (state.failure_count or 0) + (status != "ok")
+            db.commit()
+        finally:
+            db.close()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduler")
+        return self._executor
+
+    def tick(self, now: Optional[float] = None) -> list:
+        """
+        One scheduling round: renew or acquire the lease, flag timed-out jobs and
+        start due ones. Returns the futures started in this round.
+        """
+        now = now if now is not None else time.time()
+        if time.monotonic() - self._lease_checked_at >= self.lease_seconds / 3 or not self.is_leader:
+            self.try_acquire_lease()
+            self._lease_checked_at = time.monotonic()
+        if not self.is_leader:
+            return []
+
+        started = []
+        for job in self.jobs.values():
+            if job.running:
+                if (job.timeout_seconds and not job.timed_out
+                        and time.monotonic() - job.started_at > job.timeout_seconds):
+                    # Threads cannot be killed; flag it and skip runs until it returns
+                    job.timed_out = True
+                    logger.warning(f"Scheduled job {job.name} exceeded its {job.timeout_seconds}s timeout")
+                continue
+            if job.next_run is None:
+                job.schedule_next(now)
+            if now < job.next_run:
+                continue
+            job.timed_out = False
+            job.started_at = time.monotonic()
+            job.schedule_next(now)
+            job.future = self._get_executor().submit(self._run, job)
+            started.append(job.future)
+        return started
+
+    def trigger(self, name: str):
+        """Make a job due on the next tick."""
+        self.jobs[name].next_run = 0
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            self._stop.wait(self.tick_seconds)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler {self.holder} started with jobs: {', '.join(self.jobs) or 'none'}")
+
+    def stop(self, timeout: float = STOP_TIMEOUT_SECONDS):
+        """
+        Stop scheduling, waiting at most `timeout` for the loop. Jobs not yet
+        started are cancelled; running ones are left to finish in the background,
+        and the lease is then kept (it expires on its own) so no other replica
+        starts them again meanwhile.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        running = [job.name for job in self.jobs.values() if job.running]
+        if running:
+            logger.warning(f"Scheduler stopped while {', '.join(running)} still running; leaving the lease to expire")
+        else:
+            self.release_lease()
+
+    def status(self, db: Session) -> dict:
+        lease = db.get(models.SchedulerLease, LEASE_NAME)
+        states = {state.name: state for state in db.query(models.SchedulerJob)}
+        jobs = []
+        for job in self.jobs.values():
+            state = states.get(job.name)
+            jobs.append({
+                "name": job.name,
+                "interval_seconds": job.interval_seconds,
+                "jitter_seconds": job.jitter_seconds,
+                "timeout_seconds": job.timeout_seconds,
+                "aligned": job.align,
+                "running_here": job.running,
+                "last_status": state.last_status if state else None,
+                "last_started_at": state.last_started_at if state else None,
+                "last_finished_at": state.last_finished_at if state else None,
+                "last_duration_ms": state.last_duration_ms if state else None,
+                "last_error": state.last_error if state else None,
+                "run_count": state.run_count if state else 0,
+                "failure_count": state.failure_count if state else 0,
+                "last_run_by": state.holder if state else None,
+            })
+        return {
+            "enabled": self._thread is not None,
+            "this_instance": self.holder,
+            "is_leader": self.is_leader,
+            "leader": lease.holder if lease else None,
+            "lease_expires_at": lease.expires_at if lease else None,
+            "jobs": jobs,
+        }
+
+
+def _default_session_factory():
+    from .database import SessionLocal
+    return SessionLocal()
+
+
+scheduler = Scheduler(_default_session_factory)
@@ -106,12 +106,23 @@ class RecordAccess(RecordAccessBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class RecordAccessCheckRequest(BaseModel):
+    record_type: str
+    record_ids: List[int]
+    access_level: str = "Read"
+
+class RecordAccessCheckResponse(BaseModel):
+    record_type: str
+    access_level: str
+    allowed_ids: List[int]
+
 class AuditLogBase(BaseModel):
     table_name: str
     record_id: int
     action: str
     old_values: Optional[str] = None
     new_values: Optional[str] = None
+    changes: Optional[str] = None
     user_id: Optional[int] = None
     timestamp: datetime
     ip_address: Optional[str] = None
@@ -121,6 +132,13 @@ class AuditLog(AuditLogBase):
     id: int
     model_config = ConfigDict(from_attributes=True)
 
+class AuditRecordState(BaseModel):
+    table_name: str
+    record_id: int
+    as_of: datetime
+    exists: bool
+    values: Optional[dict] = None
+
 
 # --- Base Audit Mixin for Schemas ---
 class AuditMixin(BaseModel):
@@ -359,6 +377,9 @@ class PurchaseOrderUpdate(BaseModel):
 
 class PurchaseOrder(PurchaseOrderBase, AuditMixin):
     id: int
+    received_amount: Optional[Decimal] = None
+    remaining_amount: Optional[Decimal] = None
+    gr_count: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -486,6 +507,44 @@ class ResourcePOAllocation(ResourcePOAllocationBase, AuditMixin):
     model_config = ConfigDict(from_attributes=True)
 
 
+# --- Budget rollup ---
+class SpendTotals(BaseModel):
+    committed: Decimal
+    actual: Decimal
+
+class WBSRollup(SpendTotals):
+    id: int
+    wbs_code: Optional[str] = None
+    line_item_id: int
+
+class LineItemRollup(SpendTotals):
+    id: int
+    title: str
+    budget_item_id: int
+    business_case_id: Optional[int] = None
+    requested: Decimal
+
+class BusinessCaseRollup(SpendTotals):
+    id: int
+    title: str
+    requested: Decimal
+
+class BudgetItemRollup(SpendTotals):
+    id: int
+    workday_ref: str
+    title: str
+    fiscal_year: int
+    budget: Decimal
+    requested: Decimal
+
+class BudgetRollup(BaseModel):
+    budget_items: List[BudgetItemRollup]
+    business_cases: List[BusinessCaseRollup]
+    line_items: List[LineItemRollup]
+    wbs: List[WBSRollup]
+    cached: bool
+
+
 # --- Pagination ---
 class PaginationParams(BaseModel):
     skip: int = 0
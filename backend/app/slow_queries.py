@@ -0,0 +1,197 @@
+"""
+Slow-query log.
+
+Cursor-execute hooks time every statement on the engine. A statement slower
+than SLOW_QUERY_THRESHOLD_MS is recorded in an in-memory ring buffer with:
+
+- its SQL text and a fingerprint (the statement shape from app.sql_metrics,
+  so IN (...) lists of any length aggregate together),
+- the shape of its parameters (count and types, never the values),
+- its duration and the request or job that ran it,
+- the query plan: EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere. The plan
+  is taken on the same DBAPI connection right after the statement, at most
+  once per fingerprint every SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS.
+
+Per-fingerprint totals (count, total/max time, last plan) are kept alongside,
+so GET /admin/slow-queries shows both the latest offenders and the top ones.
+The log is per process, like the password hashing and event hub stats.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from . import sql_metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() in ["true", "1", "yes"]
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = 60
+
+# Distinct fingerprints kept; the least recently seen is dropped beyond this
+MAX_FINGERPRINTS = 500
+
+# Only statements that EXPLAIN accepts; never PRAGMA, DDL or transaction control
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(sql_metrics.statement_shape(statement).encode()).hexdigest()[:12]
+
+
+def parameter_shape(parameters, executemany: bool) -> Dict[str, Any]:
+    """Count and types of the bound parameters, e.g. {"count": 3, "types": {"int": 2, "str": 1}}."""
+    if executemany:
+        rows = list(parameters or ())
+        shape = parameter_shape(rows[0], False) if rows else {"count": 0, "types": {}}
+        return {**shape, "rows": len(rows)}
+    values = list(parameters.values()) if isinstance(parameters, dict) else list(parameters or ())
+    return {"count": len(values), "types": dict(Counter(type(value).__name__ for value in values))}
+
+
+def explain(cursor, dialect_name: str, statement: str, parameters) -> Optional[List[str]]:
+    """Plan of a statement, run on the DBAPI connection that just executed it."""
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    plan_cursor = cursor.connection.cursor()
+    try:
+        plan_cursor.execute(prefix + statement, parameters)
+        rows = plan_cursor.fetchall()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e!r}"]
+    finally:
+        plan_cursor.close()
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, size: int = SLOW_QUERY_BUFFER_SIZE):
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=size)
+        self.fingerprints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _needs_plan(self, key: str) -> bool:
+        stats = self.fingerprints.get(key)
+        return stats is None or stats["plan_at"] is None or (
+            time.monotonic() - stats["plan_at"] > SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+        )
+
+    def observe(self, cursor, dialect_name: str, statement: str, parameters, executemany: bool, duration_ms: float):
+        if duration_ms < self.threshold_ms:
+            return
+        key = fingerprint(statement)
+        with self._lock:
+            needs_plan = self._needs_plan(key)
+        plan = None
+        if needs_plan and not executemany:
+            plan = explain(cursor, dialect_name, statement, parameters)
+
+        stats = sql_metrics.current()
+        entry = {
+            "fingerprint": key,
+            "statement": statement,
+            "parameters": parameter_shape(parameters, executemany),
+            "duration_ms": round(duration_ms, 2),
+            "route": stats.route if stats is not None else None,
+            "plan": plan,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self.entries.append(entry)
+            aggregate = self.fingerprints.pop(key, None) or {
+                "fingerprint": key,
+                "statement": sql_metrics.statement_shape(statement),
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "routes": Counter(),
+                "plan": None,
+                "plan_at": None,
+            }
+            aggregate["count"] += 1
+            aggregate["total_ms"] += duration_ms
+            aggregate["max_ms"] = max(aggregate["max_ms"], duration_ms)
+            if entry["route"]:
+                aggregate["routes"][entry["route"]] += 1
+            if plan is not None:
+                aggregate["plan"], aggregate["plan_at"] = plan, time.monotonic()
+            # Re-inserted last: dict order is least recently seen first
+            self.fingerprints[key] = aggregate
+            while len(self.fingerprints) > MAX_FINGERPRINTS:
+                self.fingerprints.pop(next(iter(self.fingerprints)))
+        logger.info(f"Slow query ({duration_ms:.1f} ms, {entry['route'] or 'no request'}): {key}")
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            recent = list(self.entries)[-limit:][::-1]
+            top = sorted(self.fingerprints.values(), key=lambda item: item["total_ms"], reverse=True)[:limit]
+            top = [
+                {
+                    "fingerprint": item["fingerprint"],
+                    "statement": item["statement"],
+                    "count": item["count"],
+                    "total_ms": round(item["total_ms"], 2),
+                    "avg_ms": round(item["total_ms"] / item["count"], 2),
+                    "max_ms": round(item["max_ms"], 2),
+                    "routes": dict(item["routes"].most_common(5)),
+                    "plan": item["plan"],
+                }
+                for item in top
+            ]
+        return {
+            "enabled": SLOW_QUERY_LOG_ENABLED,
+            "threshold_ms": self.threshold_ms,
+            "buffer_size": self.entries.maxlen,
+            "recorded": len(self.entries),
+            "top": top,
+            "recent": recent,
+        }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.fingerprints.clear()
+
+
+log = SlowQueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("slow_query_started")
+    if not started:
+        return
+    duration_ms = (time.perf_counter() - started.pop()) * 1000
+    if duration_ms >= log.threshold_ms:
+        log.observe(cursor, conn.dialect.name, statement, parameters, executemany, duration_ms)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("slow_query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument(engine):
+    """Attach the slow-query hooks to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
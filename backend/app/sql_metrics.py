@@ -0,0 +1,149 @@
+"""
+Per-request SQL instrumentation.
+
+Cursor-execute hooks on the engine (instrument()) add every statement's
+duration to the QueryStats of the current request, held in a context
+variable that the HTTP middleware sets around each request. Sync endpoints
+run in a thread pool that copies the context, so their queries are counted.
+
+Statements are grouped by shape: the SQL text with IN (...) lists collapsed,
+which is the same for every row of an N+1 loop. For each request the
+middleware then:
+
+- emits `Server-Timing: db;dur=<ms>;desc="<n> queries"`,
+- warns when one shape ran SQL_N_PLUS_ONE_THRESHOLD times or more,
+- warns when the request ran more than SQL_QUERY_BUDGET statements.
+
+count_statements() collects the same stats for a block of code, which the
+test suite uses to put query-count ceilings on endpoints.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_INSTRUMENTATION_ENABLED = os.getenv("SQL_INSTRUMENTATION_ENABLED", "true").lower() in ["true", "1", "yes"]
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "50"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+
+# "(?, ?, ?)", "(%(id_1_1)s, %(id_1_2)s)" and "(:id_1, :id_2)" all become "(?)"
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|%s|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("sql_query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statement count, total time and per-shape counts of one request or block."""
+
+    def __init__(self, route: Optional[str] = None):
+        self.route = route
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """Shapes executed at least `threshold` times, most frequent first (likely N+1)."""
+        threshold = threshold or SQL_N_PLUS_ONE_THRESHOLD
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms:.1f};desc="{self.count} queries"'
+
+    def summary(self, limit: int = 5) -> str:
+        return "\n".join(f"{count:>4} x {shape[:200]}" for shape, count in self.shapes.most_common(limit))
+
+
+def current() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track(route: Optional[str] = None):
+    """Collect the statements run in this context (and threads started from it)."""
+    stats = QueryStats(route)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("sql_metrics_started")
+    if stats is None or not started:
+        return
+    stats.record(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("sql_metrics_started") if exception_context.connection else None
+    if _current.get() is not None and started:
+        started.pop()
+
+
+def instrument(engine):
+    """Attach the request statistics hooks to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def count_statements(engine):
+    """Count every statement `engine` runs inside the block, from any thread."""
+    stats = QueryStats()
+    started = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        started.append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, (time.perf_counter() - started.pop()) * 1000 if started else 0.0)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+
+
+def report(method: str, path: str, stats: QueryStats):
+    """Log requests that look like N+1 loops or exceed the query budget."""
+    for shape, count in stats.repeated():
+        logger.warning(f"{method} {path}: possible N+1, {count} x {shape[:200]}")
+    if stats.count > SQL_QUERY_BUDGET:
+        logger.warning(
+            f"{method} {path}: {stats.count} queries in {stats.total_ms:.1f} ms "
+            f"(budget {SQL_QUERY_BUDGET})\n{stats.summary()}"
+        )
+    else:
+        logger.debug(f"{method} {path}: {stats.count} queries in {stats.total_ms:.1f} ms")
@@ -0,0 +1,143 @@
+"""
+Mixed read/write latency benchmark for the sync-session route handlers.
+
+Runs N concurrent clients against the ASGI app in-process (no server needed):
+each client issues reads (GET /health, GET /purchase-orders/{id}) and writes
+(PUT /purchase-orders/{id}) and the script reports p50/p99 per operation.
+
+--mode threadpool  writes go through the real PUT route (sync def, runs in
+                   FastAPI's threadpool)
+--mode blocking    writes go through an `async def` route that does the same
+                   sync session work inline, i.e. how the audited handlers
+                   behaved before, blocking the event loop on every query
+
+Usage (from backend/):
+    python benchmarks/concurrency_benchmark.py --mode blocking
+    python benchmarks/concurrency_benchmark.py --mode threadpool
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="ebrose-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from fastapi import Depends, Request  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.auth import check_record_access, create_access_token, get_db, now_utc  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers.purchase_orders import update_purchase_order  # noqa: E402
+
+PO_COUNT = 20
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        # Only the PO rows matter here; skip building the asset/WBS/business case chain
+        db.execute(text("PRAGMA foreign_keys=OFF"))
+        admin = models.User(username="bench", email="bench@example.com", hashed_password="x",
+                            role="Admin", created_at=now_utc())
+        db.add(admin)
+        db.flush()
+        for i in range(PO_COUNT):
+            db.add(models.PurchaseOrder(
+                asset_id=1,
+                po_number=f"PO-BENCH-{i:03d}",
+                supplier="Bench",
+                total_amount=1000,
+                currency="USD",
+                spend_category="OPEX",
+                owner_group_id=1,
+                status="Open",
+                created_by=admin.id,
+                created_at=now_utc()
+            ))
+        db.commit()
+    finally:
+        db.close()
+    return create_access_token({"sub": "bench"}, expires_delta=timedelta(hours=1))
+
+
+@app.put("/bench/blocking-update/{po_id}")
+async def blocking_update(
+    po_id: int,
+    po_update: schemas.PurchaseOrderUpdate,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(check_record_access("PurchaseOrder", "po_id", "Write"))
+):
+    """Reproduces the old handlers: the same audited sync route body, run inside an async route."""
+    return update_purchase_order(po_id=po_id, po_update=po_update, request=request, db=db, current_user=current_user)
+
+
+async def worker(client, mode, requests_per_client, write_ratio, client_id, samples):
+    for n in range(requests_per_client):
+        po_id = (client_id + n) % PO_COUNT + 1
+        if (n % 100) < write_ratio * 100:
+            path = f"/bench/blocking-update/{po_id}" if mode == "blocking" else f"/purchase-orders/{po_id}"
+            op, request = "write", client.put(path, json={"supplier": f"Bench {client_id}-{n}"})
+        elif n % 2:
+            op, request = "read_po", client.get(f"/purchase-orders/{po_id}")
+        else:
+            op, request = "health", client.get("/health")
+        started = time.perf_counter()
+        response = await request
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"{op} failed: {response.status_code} {response.text}")
+        samples.setdefault(op, []).append(elapsed)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(args):
+    token = seed()
+    samples = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            worker(client, args.mode, args.requests, args.write_ratio, i, samples)
+            for i in range(args.clients)
+        ])
+        total = time.perf_counter() - started
+
+    print(f"mode={args.mode} clients={args.clients} requests/client={args.requests} write_ratio={args.write_ratio}")
+    print(f"{'operation':<10} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for op, values in sorted(samples.items()):
+        print(f"{op:<10} {len(values):>6} {percentile(values, 0.5) * 1000:>9.2f} "
+              f"{percentile(values, 0.99) * 1000:>9.2f} {statistics.mean(values) * 1000:>9.2f}")
+    print(f"throughput: {sum(len(v) for v in samples.values()) / total:.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["threadpool", "blocking"], default="threadpool")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Concurrent read/write throughput on SQLite, with and without the performance
+profile (WAL, synchronous=NORMAL, busy_timeout, mmap, cache, temp_store, pool).
+
+Each of --processes worker processes (think: backend replicas sharing one
+database file) runs --readers reader threads and --writers writer threads
+against its own engine for --seconds. Readers run the purchase order list
+query; writers insert audit log rows and commit.
+
+Usage (from backend/):
+    python benchmarks/sqlite_profile_benchmark.py
+    python benchmarks/sqlite_profile_benchmark.py --processes 2 --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import Base, create_db_engine  # noqa: E402
+from app.models import now_utc  # noqa: E402
+
+SEED_ROWS = 2000
+
+
+def seed(url, env):
+    engine = create_db_engine(url, env=env)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.execute(text("PRAGMA foreign_keys=OFF"))
+    db.add_all([
+        models.PurchaseOrder(
+            asset_id=1, po_number=f"PO-{i:05d}", supplier=f"Supplier {i % 50}",
+            total_amount=1000, currency="USD", spend_category="OPEX",
+            owner_group_id=1 + i % 10, status="Open", created_at=now_utc()
+        )
+        for i in range(SEED_ROWS)
+    ])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def run_process(url, env, readers, writers, seconds, results):
+    engine = create_db_engine(url, env=env)
+    Session = sessionmaker(bind=engine)
+    deadline = time.perf_counter() + seconds
+    samples = {"read": [], "write": [], "errors": 0}
+    lock = threading.Lock()
+
+    def read_loop(n):
+        while time.perf_counter() < deadline:
+            db = Session()
+            started = time.perf_counter()
+            db.query(models.PurchaseOrder).filter(
+                models.PurchaseOrder.owner_group_id == 1 + n % 10
+            ).order_by(models.PurchaseOrder.id.desc()).limit(100).all()
+            elapsed = time.perf_counter() - started
+            db.close()
+            with lock:
+                samples["read"].append(elapsed)
+
+    def write_loop(n):
+        while time.perf_counter() < deadline:
+            db = Session()
+            started = time.perf_counter()
+            try:
+                db.execute(text("PRAGMA foreign_keys=OFF"))
+                db.add(models.AuditLog(table_name="bench", record_id=n, action="UPDATE", user_id=1, timestamp=now_utc()))
+                db.commit()
+                with lock:
+                    samples["write"].append(time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    samples["errors"] += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=write_loop, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    results.put(samples)
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench(name, env, args):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ebrose-sqlite-'), 'bench.db')}"
+    seed(url, env)
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=run_process, args=(url, env, args.readers, args.writers, args.seconds, results))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    merged = {"read": [], "write": [], "errors": 0}
+    for _ in processes:
+        samples = results.get()
+        merged["read"] += samples["read"]
+        merged["write"] += samples["write"]
+        merged["errors"] += samples["errors"]
+    for process in processes:
+        process.join()
+
+    print(f"{name:<8} reads/s {len(merged['read']) / args.seconds:>8.0f}  read p99 {percentile(merged['read'], 0.99) * 1000:>7.1f}ms  "
+          f"writes/s {len(merged['write']) / args.seconds:>6.0f}  write p99 {percentile(merged['write'], 0.99) * 1000:>7.1f}ms  "
+          f"locked errors {merged['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=8, help="reader threads per process")
+    parser.add_argument("--writers", type=int, default=2, help="writer threads per process")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"processes={args.processes} readers={args.readers} writers={args.writers} seconds={args.seconds}")
+    bench("default", {}, args)
+    bench("profile", {"SQLITE_PERFORMANCE_PROFILE": "true"}, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
+import os
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+# Tests drive the scheduler explicitly; no background jobs against the test database
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
 # Import app and database components
 import app.main
 from app.database import Base
-from app import models
+from app import models, slow_queries, sql_metrics
 
 # Test database - completely separate from production
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,6 +21,8 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+sql_metrics.instrument(engine)
+slow_queries.instrument(engine)
 
 
 @pytest.fixture(scope="function")
@@ -44,6 +52,10 @@ def client(db_session):
     from app.routers.budget_items import get_db as budget_get_db
     from app.routers.business_case_line_items import get_db as line_items_get_db
 
+    # Cached principals must not leak between tests (each test has a fresh database)
+    from app import principal_cache
+    principal_cache.cache.clear()
+
     # Override ALL get_db dependencies with our test session
     app.main.app.dependency_overrides[auth_get_db] = override_get_db
     app.main.app.dependency_overrides[main_get_db] = override_get_db
@@ -57,6 +69,22 @@ def client(db_session):
     app.main.app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def max_queries():
+    """
+    Query-count ceiling for a block, e.g.:
+
+        with max_queries(8):
+            client.get("/purchase-orders/", ...)
+    """
+    @contextmanager
+    def check(limit: int):
+        with sql_metrics.count_statements(engine) as stats:
+            yield stats
+        assert stats.count <= limit, f"{stats.count} queries, limit {limit}:\n{stats.summary()}"
+    return check
+
+
 @pytest.fixture(scope="function")
 def admin_user(db_session):
     """Create an admin user for testing."""
@@ -39,7 +39,6 @@ def test_regular_user_cannot_create_groups(client, regular_user, user_token):
     assert response.status_code in [401, 403]
 
 
-@pytest.mark.skip(reason="WBS endpoint has decorator issue with args/kwargs - manual audit logging pattern works in budget_items")
 def test_owner_group_inheritance_wbs_from_line_item(client, admin_user, admin_token, test_group, db_session):
     """Test that WBS inherits owner_group_id from BusinessCaseLineItem."""
     from app.models import BudgetItem, BusinessCase, BusinessCaseLineItem, WBS
@@ -109,7 +108,6 @@ def test_owner_group_inheritance_wbs_from_line_item(client, admin_user, admin_to
     assert data["owner_group_id"] == test_group.id
 
 
-@pytest.mark.skip(reason="Resources endpoint has decorator issue with args/kwargs - manual audit logging works in budget_items")
 def test_manager_can_create_resources(client, manager_user, manager_token, test_group):
     """Test that managers can create resources."""
     response = client.post(
@@ -221,10 +219,10 @@ def test_audit_log_created_on_update(client, admin_user, admin_token, test_group
         AuditLog.action == "UPDATE"
     ).all()
     assert len(audit_logs) >= 1
-    # Old values should contain "Original Title"
+    # The stored diff should contain the old title
     import json
-    old_values = json.loads(audit_logs[0].old_values) if audit_logs[0].old_values else {}
-    assert "title" in old_values or audit_logs[0].old_values is not None
+    changes = json.loads(audit_logs[0].changes)
+    assert {"op": "test", "path": "/title", "value": "Original Title"} in changes
 
 
 def test_record_access_prevents_granting_write_to_viewer(client, admin_user, admin_token, db_session):
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from app.auth import now_utc
+
+
+def _make_po(db_session, po_number, owner_group_id, created_by):
+    from app.models import PurchaseOrder
+
+    po = PurchaseOrder(
+        asset_id=1,
+        po_number=po_number,
+        supplier="Acme",
+        total_amount=1000,
+        currency="USD",
+        spend_category="OPEX",
+        owner_group_id=owner_group_id,
+        status="Open",
+        created_by=created_by,
+        created_at=now_utc()
+    )
+    db_session.add(po)
+    db_session.commit()
+    db_session.refresh(po)
+    return po
+
+
+def test_po_list_includes_group_grants(client, admin_user, regular_user, user_token, test_group, db_session):
+    """Group-level RecordAccess grants make records visible in list endpoints."""
+    from app.models import UserGroupMembership, RecordAccess, UserGroup
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    other_group = UserGroup(name="Other Group", created_by=admin_user.id)
+    db_session.add(other_group)
+    db_session.commit()
+
+    owned = _make_po(db_session, "PO-OWNED", test_group.id, admin_user.id)
+    granted = _make_po(db_session, "PO-GRANTED", other_group.id, admin_user.id)
+    hidden = _make_po(db_session, "PO-HIDDEN", other_group.id, admin_user.id)
+
+    db_session.add(RecordAccess(
+        record_type="PurchaseOrder",
+        record_id=granted.id,
+        group_id=test_group.id,
+        access_level="Read",
+        granted_by=admin_user.id,
+        granted_at=now_utc()
+    ))
+    db_session.commit()
+
+    response = client.get("/purchase-orders", cookies={"access_token": user_token})
+    assert response.status_code == 200
+    ids = {po["id"] for po in response.json()}
+    assert owned.id in ids
+    assert granted.id in ids
+    assert hidden.id not in ids
+
+
+def test_po_list_excludes_expired_grants(client, admin_user, regular_user, user_token, test_group, db_session):
+    """Expired RecordAccess grants do not make records visible."""
+    from app.models import RecordAccess
+
+    po = _make_po(db_session, "PO-EXPIRED", test_group.id, admin_user.id)
+    db_session.add(RecordAccess(
+        record_type="PurchaseOrder",
+        record_id=po.id,
+        user_id=regular_user.id,
+        access_level="Read",
+        granted_by=admin_user.id,
+        granted_at=now_utc(),
+        expires_at=now_utc() - timedelta(days=1)
+    ))
+    db_session.commit()
+
+    response = client.get("/purchase-orders", cookies={"access_token": user_token})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_acl_clause_does_not_inline_id_lists(regular_user):
+    """The ACL filter is expressed as subqueries, not a materialized IN list."""
+    from app import acl, models
+    from sqlalchemy import select
+
+    stmt = select(models.PurchaseOrder.id).where(
+        acl.record_access_clause(regular_user, models.PurchaseOrder)
+    )
+    compiled = stmt.compile()
+    sql = str(compiled)
+    assert "user_group_membership" in sql
+    assert "record_access" in sql
+    # Only scalar parameters (user id, record type, levels, now) regardless of table size
+    assert len(compiled.params) < 10
+
+
+def test_batch_access_check(client, admin_user, regular_user, user_token, admin_token, test_group, db_session):
+    """POST /record-access/check returns the accessible subset in request order."""
+    from app.models import UserGroupMembership, RecordAccess, UserGroup
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    other_group = UserGroup(name="Batch Group", created_by=admin_user.id)
+    db_session.add(other_group)
+    db_session.commit()
+
+    owned = _make_po(db_session, "PO-BATCH-OWNED", test_group.id, admin_user.id)
+    read_only = _make_po(db_session, "PO-BATCH-READ", other_group.id, admin_user.id)
+    hidden = _make_po(db_session, "PO-BATCH-HIDDEN", other_group.id, admin_user.id)
+    db_session.add(RecordAccess(
+        record_type="PurchaseOrder",
+        record_id=read_only.id,
+        user_id=regular_user.id,
+        access_level="Read",
+        granted_by=admin_user.id,
+        granted_at=now_utc()
+    ))
+    db_session.commit()
+
+    ids = [hidden.id, read_only.id, owned.id, 99999]
+    response = client.post(
+        "/record-access/check",
+        json={"record_type": "PurchaseOrder", "record_ids": ids},
+        cookies={"access_token": user_token}
+    )
+    assert response.status_code == 200
+    assert response.json()["allowed_ids"] == [read_only.id, owned.id]
+
+    response = client.post(
+        "/record-access/check",
+        json={"record_type": "PurchaseOrder", "record_ids": ids, "access_level": "Write"},
+        cookies={"access_token": user_token}
+    )
+    assert response.json()["allowed_ids"] == [owned.id]
+
+    response = client.post(
+        "/record-access/check",
+        json={"record_type": "NotARecord", "record_ids": ids},
+        cookies={"access_token": user_token}
+    )
+    assert response.status_code == 400
+
+    # Tables without per-record access are refused, even for Admins (no ID-existence oracle)
+    for record_type in ("User", "RecordAccess", "AuditLog", "Alert"):
+        response = client.post(
+            "/record-access/check",
+            json={"record_type": record_type, "record_ids": [admin_user.id]},
+            cookies={"access_token": admin_token}
+        )
+        assert response.status_code == 400
@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.auth import now_utc
+
+
+def _chain(db_session, admin_user, group_id, suffix):
+    """BudgetItem -> BusinessCase -> LineItem -> WBS -> Asset; returns the asset."""
+    from app.models import Asset, BudgetItem, BusinessCase, BusinessCaseLineItem, WBS
+
+    budget = BudgetItem(workday_ref=f"WD-AL-{suffix}", title="Budget", budget_amount=100000, currency="USD",
+                        fiscal_year=2025, owner_group_id=group_id, created_by=admin_user.id)
+    bc = BusinessCase(title=f"BC {suffix}", status="Draft", created_by=admin_user.id)
+    db_session.add_all([budget, bc])
+    db_session.flush()
+    line_item = BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=budget.id, title="Line",
+                                     spend_category="OPEX", requested_amount=1000, currency="USD",
+                                     owner_group_id=group_id, created_by=admin_user.id)
+    db_session.add(line_item)
+    db_session.flush()
+    wbs = WBS(business_case_line_item_id=line_item.id, wbs_code=f"WBS-AL-{suffix}", owner_group_id=group_id,
+              created_by=admin_user.id)
+    db_session.add(wbs)
+    db_session.flush()
+    asset = Asset(wbs_id=wbs.id, asset_code=f"AS-AL-{suffix}", owner_group_id=group_id, created_by=admin_user.id)
+    db_session.add(asset)
+    db_session.flush()
+    return asset
+
+
+def _po(db_session, admin_user, asset_id, number, group_id, total=1000, status="Open"):
+    from app.models import PurchaseOrder
+
+    po = PurchaseOrder(asset_id=asset_id, po_number=number, total_amount=total, currency="USD",
+                       spend_category="OPEX", owner_group_id=group_id, status=status,
+                       created_by=admin_user.id, created_at=now_utc())
+    db_session.add(po)
+    db_session.flush()
+    return po
+
+
+def _gr(db_session, admin_user, po, number, amount, gr_date):
+    from app.models import GoodsReceipt
+
+    db_session.add(GoodsReceipt(po_id=po.id, gr_number=number, gr_date=gr_date, amount=amount,
+                                owner_group_id=po.owner_group_id, created_by=admin_user.id))
+
+
+def test_alert_rules(admin_user, test_group, db_session):
+    """Each rule fires exactly for the rows that match it."""
+    from app.alert_rules import compute_alerts
+    from app.models import Resource, ResourcePOAllocation
+
+    now = datetime(2025, 6, 15, 12, 0)
+    asset = _chain(db_session, admin_user, test_group.id, "1")
+
+    healthy = _po(db_session, admin_user, asset.id, "PO-HEALTHY", test_group.id)
+    _gr(db_session, admin_user, healthy, "GR-1", 100, now - timedelta(days=2))
+    low = _po(db_session, admin_user, asset.id, "PO-LOW", test_group.id)
+    _gr(db_session, admin_user, low, "GR-2", 500, now - timedelta(days=40))
+    _gr(db_session, admin_user, low, "GR-3", 450, now - timedelta(days=1))
+    stale = _po(db_session, admin_user, asset.id, "PO-STALE", test_group.id)
+    _gr(db_session, admin_user, stale, "GR-4", 100, now - timedelta(days=40))
+    orphan = _po(db_session, admin_user, 9999, "PO-ORPHAN", test_group.id, status="Closed")
+
+    idle = Resource(name="Idle", owner_group_id=test_group.id, status="Active", created_by=admin_user.id)
+    busy = Resource(name="Busy", owner_group_id=test_group.id, status="Active", created_by=admin_user.id)
+    db_session.add_all([idle, busy])
+    db_session.flush()
+    db_session.add(ResourcePOAllocation(resource_id=busy.id, po_id=healthy.id, owner_group_id=test_group.id,
+                                        allocation_start=now - timedelta(days=30), allocation_end=now))
+    db_session.add(ResourcePOAllocation(resource_id=idle.id, po_id=healthy.id, owner_group_id=test_group.id,
+                                        allocation_start=now - timedelta(days=30), allocation_end=now - timedelta(days=1)))
+    db_session.commit()
+
+    alerts = {(a["type"], a["entity_type"], a["entity_id"]) for a in compute_alerts(db_session, admin_user, now)}
+    assert alerts == {
+        ("low_po_balance", "purchase_order", low.id),
+        ("no_gr_this_month", "purchase_order", stale.id),
+        ("missing_chain", "purchase_order", orphan.id),
+        ("resource_without_po", "resource", idle.id),
+    }
+    low_alert = next(a for a in compute_alerts(db_session, admin_user, now) if a["type"] == "low_po_balance")
+    assert low_alert["message"] == "PO PO-LOW has low balance (50.00 remaining)"
+
+
+def test_alerts_use_fixed_number_of_queries(admin_user, regular_user, test_group, db_session):
+    """Query count does not grow with the number of POs, including for restricted users."""
+    from sqlalchemy import event
+    from app.alert_rules import compute_alerts
+    from app.models import UserGroupMembership
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    asset = _chain(db_session, admin_user, test_group.id, "2")
+    for n in range(30):
+        po = _po(db_session, admin_user, asset.id if n % 2 else 9999, f"PO-N-{n}", test_group.id)
+        _gr(db_session, admin_user, po, f"GR-N-{n}", 950, datetime.now())
+    db_session.commit()
+    db_session.refresh(regular_user)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        alerts = compute_alerts(db_session, regular_user)
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+    assert len([a for a in alerts if a["type"] == "low_po_balance"]) == 30
+    assert len(statements) == 2
+
+
+def test_alert_store_refreshes_only_dirty_sources(client, admin_user, admin_token, test_group, db_session):
+    """Writes mark their PO dirty and the next read recomputes just that PO."""
+    from app.models import Alert, AlertDirty
+
+    asset = _chain(db_session, admin_user, test_group.id, "3")
+    target = _po(db_session, admin_user, asset.id, "PO-TARGET", test_group.id)
+    other = _po(db_session, admin_user, asset.id, "PO-OTHER", test_group.id)
+    for po in (target, other):
+        _gr(db_session, admin_user, po, f"GR-{po.po_number}", 100, datetime.now())
+    db_session.commit()
+
+    response = client.get("/alerts", cookies={"access_token": admin_token})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert db_session.query(AlertDirty).count() == 0
+
+    # Receiving almost everything on one PO makes its balance low
+    _gr(db_session, admin_user, target, "GR-TARGET-2", 850, datetime.now())
+    db_session.commit()
+    assert {(d.entity_type, d.entity_id) for d in db_session.query(AlertDirty)} == {("PurchaseOrder", target.id)}
+
+    response = client.get("/alerts", cookies={"access_token": admin_token})
+    assert [(a["type"], a["entity_id"]) for a in response.json()] == [("low_po_balance", target.id)]
+    assert db_session.query(Alert).count() == 1
+    assert db_session.query(AlertDirty).count() == 0
+
+
+def test_alerts_read_only_when_the_job_refreshes(client, admin_user, admin_token, test_group, db_session,
+                                                monkeypatch):
+    """With the scheduler running, GET /alerts reads the table and leaves dirty sources to refresh_alerts."""
+    from app import jobs, scheduler
+    from app.models import AlertDirty
+
+    monkeypatch.setattr(scheduler, "SCHEDULER_ENABLED", True)
+    asset = _chain(db_session, admin_user, test_group.id, "4")
+    po = _po(db_session, admin_user, asset.id, "PO-JOB", test_group.id)
+    _gr(db_session, admin_user, po, "GR-PO-JOB", 950, datetime.now())
+    db_session.commit()
+
+    assert client.get("/alerts", cookies={"access_token": admin_token}).json() == []
+    assert db_session.query(AlertDirty).count() > 0
+
+    jobs.refresh_alerts(db_session)
+    db_session.commit()
+    response = client.get("/alerts", cookies={"access_token": admin_token})
+    assert [(a["type"], a["entity_id"]) for a in response.json()] == [("low_po_balance", po.id)]
+
+
+def test_alert_store_follows_chain_changes(admin_user, test_group, db_session):
+    """Changing an asset's WBS recomputes the POs under that asset."""
+    from app import alert_store
+    from app.models import Asset
+
+    now = datetime.now()
+    asset = _chain(db_session, admin_user, test_group.id, "4")
+    po = _po(db_session, admin_user, asset.id, "PO-CHAIN", test_group.id)
+    _gr(db_session, admin_user, po, "GR-CHAIN", 100, now)
+    db_session.commit()
+    alert_store.sweep_if_due(db_session, now)
+    db_session.commit()
+    assert alert_store.read_alerts(db_session, admin_user) == []
+
+    db_session.get(Asset, asset.id).wbs_id = 9999
+    db_session.commit()
+    assert alert_store.refresh_dirty(db_session, now) == 1
+    alerts = alert_store.read_alerts(db_session, admin_user)
+    assert [(a["type"], a["entity_type"], a["entity_id"]) for a in alerts] == [("missing_chain", "asset", asset.id)]
+
+
+def test_alert_store_daily_sweep(admin_user, test_group, db_session):
+    """Time-based rules are recomputed once per day, by whoever gets there first."""
+    from app import alert_store
+
+    day_one = datetime(2025, 6, 30, 9, 0)
+    asset = _chain(db_session, admin_user, test_group.id, "5")
+    po = _po(db_session, admin_user, asset.id, "PO-SWEEP", test_group.id)
+    _gr(db_session, admin_user, po, "GR-SWEEP", 100, day_one)
+    db_session.commit()
+
+    assert alert_store.sweep_if_due(db_session, day_one)
+    assert alert_store.read_alerts(db_session, admin_user) == []
+    assert not alert_store.sweep_if_due(db_session, day_one.replace(hour=17))
+
+    # New month: the June GR no longer counts
+    assert alert_store.sweep_if_due(db_session, datetime(2025, 7, 1, 9, 0))
+    alerts = alert_store.read_alerts(db_session, admin_user)
+    assert [(a["type"], a["entity_id"]) for a in alerts] == [("no_gr_this_month", po.id)]
+
+
+def test_alert_store_read_is_access_filtered(admin_user, regular_user, test_group, db_session):
+    from app import alert_store
+    from app.models import UserGroupMembership
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    visible = _po(db_session, admin_user, 9999, "PO-VISIBLE", test_group.id)
+    _po(db_session, admin_user, 9999, "PO-HIDDEN", test_group.id + 1)
+    db_session.commit()
+    alert_store.bring_up_to_date(db_session)
+
+    assert len(alert_store.read_alerts(db_session, admin_user)) == 4
+    assert {a["entity_id"] for a in alert_store.read_alerts(db_session, regular_user)} == {visible.id}
+
+
+def test_alert_rows_are_unique_per_source_rule_and_entity(db_session):
+    from app.models import Alert
+
+    def alert():
+        return Alert(source_type="PurchaseOrder", source_id=1, rule="low_po_balance", entity_type="PurchaseOrder",
+                     entity_id=1, severity="warning", message="Low balance", computed_at=now_utc())
+
+    db_session.add(alert())
+    db_session.commit()
+    db_session.add(alert())
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
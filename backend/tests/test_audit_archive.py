@@ -0,0 +1,157 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import audit_archive, audit_history, audit_writer, models
+
+NOW = datetime(2026, 10, 17, tzinfo=timezone.utc)
+JAN = datetime(2025, 1, 10, tzinfo=timezone.utc)
+FEB = datetime(2025, 2, 10, tzinfo=timezone.utc)
+HOT = datetime(2026, 9, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_archive, "AUDIT_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(audit_archive, "ARCHIVE_BLOCK_SIZE", 2)
+    return tmp_path
+
+
+def _add(db_session, timestamp, table_name, record_id, action, user_id, old=None, new=None):
+    row = audit_writer.audit_row(table_name, record_id, action, user_id, old, new)
+    db_session.add(models.AuditLog(**{**row, "timestamp": timestamp}))
+
+
+def _seed(db_session, admin_user, regular_user, test_group):
+    """A PO created in January 2025, changed in January, February and (hot) September 2026."""
+    po = models.PurchaseOrder(asset_id=1, po_number="PO-ARCHIVE", total_amount=100, spend_category="OPEX",
+                              owner_group_id=test_group.id, status="Closed", created_by=admin_user.id,
+                              created_at=JAN)
+    db_session.add(po)
+    db_session.commit()
+    _add(db_session, JAN, "purchase_order", po.id, "CREATE", admin_user.id,
+         new={"po_number": "PO-ARCHIVE", "status": "Open"})
+    _add(db_session, JAN + timedelta(days=1), "purchase_order", po.id, "UPDATE", regular_user.id,
+         {"status": "Open"}, {"status": "Pending"})
+    _add(db_session, JAN + timedelta(days=2), "goods_receipt", 7, "CREATE", regular_user.id,
+         new={"gr_number": "GR-Müller"})
+    _add(db_session, FEB, "purchase_order", po.id, "UPDATE", admin_user.id,
+         {"status": "Pending"}, {"status": "Approved"})
+    _add(db_session, FEB + timedelta(days=1), "goods_receipt", 7, "DELETE", admin_user.id,
+         old={"gr_number": "GR-Müller"})
+    _add(db_session, HOT, "purchase_order", po.id, "UPDATE", admin_user.id,
+         {"status": "Approved"}, {"status": "Closed"})
+    db_session.commit()
+    return po
+
+
+def _actions(response):
+    assert response.status_code == 200
+    return [(entry["table_name"], entry["action"]) for entry in response.json()]
+
+
+def test_archive_moves_complete_old_months(admin_user, regular_user, test_group, db_session, archive_dir):
+    po = _seed(db_session, admin_user, regular_user, test_group)
+
+    assert audit_archive.archive(db_session, now=NOW, dry_run=True) == [
+        {"month": "2025-01", "entries": 3}, {"month": "2025-02", "entries": 2}
+    ]
+    assert db_session.query(models.AuditArchiveSegment).count() == 0
+
+    segments = audit_archive.archive(db_session, now=NOW)
+    assert [(segment["month"], segment["entries"]) for segment in segments] == [("2025-01", 3), ("2025-02", 2)]
+    assert sorted(path.name for path in archive_dir.iterdir()) == sorted(
+        name for segment in segments for name in (segment["name"], segment["name"] + ".idx.json")
+    )
+    assert [entry.timestamp.year for entry in db_session.query(models.AuditLog).all()] == [2026]
+    assert audit_archive.verify(db_session) == []
+    assert audit_archive.horizon(db_session) == FEB + timedelta(days=1)
+
+    # Each archived month leaves the state of the records it touched at its end
+    snapshots = db_session.query(models.AuditSnapshot).filter(models.AuditSnapshot.table_name == "purchase_order")
+    assert [json.loads(snapshot.state)["status"] for snapshot in snapshots.order_by(models.AuditSnapshot.id)] == \
+        ["Pending", "Approved"]
+    # The receipt deleted in February ends it with a null state
+    receipts = db_session.query(models.AuditSnapshot).filter(models.AuditSnapshot.table_name == "goods_receipt")
+    assert [json.loads(snapshot.state) for snapshot in receipts.order_by(models.AuditSnapshot.id)] == \
+        [{"gr_number": "GR-Müller"}, None]
+
+    assert audit_archive.archive(db_session, now=NOW) == []
+    # An entry that arrives later for an archived month goes to a segment of its own
+    _add(db_session, JAN + timedelta(days=3), "purchase_order", po.id, "UPDATE", admin_user.id,
+         {"status": "Pending"}, {"status": "Pending"})
+    db_session.commit()
+    [late] = audit_archive.archive(db_session, now=NOW)
+    assert late["month"] == "2025-01" and late["entries"] == 1
+    assert audit_archive.verify(db_session) == []
+
+    (archive_dir / segments[0]["name"]).write_bytes(b"not gzip")
+    audit_archive._index.cache_clear()
+    assert [problem.split(":")[0] for problem in audit_archive.verify(db_session)] == [segments[0]["name"]]
+
+
+def test_list_reads_across_the_archive(client, admin_user, regular_user, admin_token, test_group, db_session):
+    _seed(db_session, admin_user, regular_user, test_group)
+    cookies = {"access_token": admin_token}
+    before = client.get("/audit-logs/", cookies=cookies).json()
+    audit_archive.archive(db_session, now=NOW)
+
+    after = client.get("/audit-logs/", cookies=cookies).json()
+    assert [entry["id"] for entry in after] == [entry["id"] for entry in before]
+    assert after == before
+
+    def query(**params):
+        return _actions(client.get("/audit-logs/", params=params, cookies=cookies))
+
+    assert query(user_id=regular_user.id) == [("goods_receipt", "CREATE"), ("purchase_order", "UPDATE")]
+    assert query(table_name="goods_receipt", action="delete") == [("goods_receipt", "DELETE")]
+    assert query(q="Müller") == [("goods_receipt", "DELETE"), ("goods_receipt", "CREATE")]
+    assert query(q="Approved", end_date=(FEB + timedelta(hours=1)).isoformat()) == [("purchase_order", "UPDATE")]
+    assert len(query(skip=4)) == 2
+
+    # Cursor pages run from the table into the archive
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/audit-logs/", params=params, cookies=cookies)
+        seen += [entry["id"] for entry in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [entry["id"] for entry in before]
+
+
+def test_history_and_states_across_the_archive(client, admin_user, regular_user, admin_token, test_group,
+                                               db_session, monkeypatch):
+    po = _seed(db_session, admin_user, regular_user, test_group)
+    cookies = {"access_token": admin_token}
+    before = client.get(f"/audit-logs/purchase_order/{po.id}", cookies=cookies).json()
+    audit_archive.archive(db_session, now=NOW)
+
+    assert client.get(f"/audit-logs/purchase_order/{po.id}", cookies=cookies).json() == before
+    response = client.get(f"/audit-logs/purchase_order/{po.id}", params={"limit": 2}, cookies=cookies)
+    older = client.get(f"/audit-logs/purchase_order/{po.id}", cookies=cookies,
+                       params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert response.json() + older.json() == before
+    assert json.loads(older.json()[0]["old_values"]) == {"po_number": "PO-ARCHIVE", "status": "Open"}
+
+    def status(as_of):
+        state = audit_history.states_as_of(db_session, "purchase_order", [po.id], as_of)[po.id]
+        return state and state["status"]
+
+    # After the horizon the end-of-month snapshot is enough
+    with monkeypatch.context() as patch:
+        patch.setattr(audit_archive, "read_entries", lambda *args, **kwargs: iter(()))
+        assert status(FEB + timedelta(days=30)) == "Approved"
+        assert status(HOT) == "Closed"
+    assert status(JAN - timedelta(days=1)) is None
+    assert status(JAN + timedelta(hours=1)) == "Open"
+    assert status(JAN + timedelta(days=1, hours=1)) == "Pending"
+    assert status(FEB + timedelta(hours=1)) == "Approved"
+
+    response = client.get("/audit-logs/goods_receipt/state",
+                          params={"as_of": (JAN + timedelta(days=3)).isoformat()}, cookies=cookies)
+    assert [json.loads(line)["values"] for line in response.text.splitlines()] == [{"gr_number": "GR-Müller"}]
+    response = client.get("/audit-logs/goods_receipt/state", params={"as_of": HOT.isoformat()}, cookies=cookies)
+    assert response.text == ""
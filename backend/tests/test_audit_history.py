@@ -0,0 +1,216 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app import audit_history, audit_writer, models
+from app.auth import now_utc
+
+
+def _po(db_session, admin_user, test_group, status="Open"):
+    po = models.PurchaseOrder(asset_id=1, po_number="PO-HISTORY", total_amount=100, spend_category="OPEX",
+                              owner_group_id=test_group.id, status=status, created_by=admin_user.id,
+                              created_at=now_utc())
+    db_session.add(po)
+    db_session.commit()
+    return po
+
+
+def test_diff_round_trip():
+    old = {"status": "Open", "a/b": 1, "amount": 5, "note": None}
+    new = {"status": "Closed", "a/b": 2, "amount": 5, "extra": "x"}
+    ops = audit_history.diff(old, new)
+    assert {"op": "test", "path": "/a~1b", "value": 1} in ops
+    assert {"op": "add", "path": "/extra", "value": "x"} in ops
+    assert not any(op["path"] == "/amount" for op in ops)
+
+    # "note" is missing from the new snapshot, so it is unchanged rather than removed
+    assert audit_history.apply(old, ops) == {**old, **new}
+    assert audit_history.revert({**old, **new}, ops) == old
+    assert audit_history.changed_views(ops) == ({"status": "Open", "a/b": 1},
+                                                {"status": "Closed", "a/b": 2, "extra": "x"})
+
+
+def test_history_rebuilds_full_versions(client, admin_user, admin_token, test_group, db_session):
+    po = _po(db_session, admin_user, test_group)
+    cookies = {"access_token": admin_token}
+    gr_id = client.post("/goods-receipts/", cookies=cookies, json={
+        "po_id": po.id, "gr_number": "GR-HISTORY", "amount": 5, "owner_group_id": test_group.id
+    }).json()["id"]
+    for amount, description in ((6, None), (7, "late")):
+        body = {"amount": amount, **({"description": description} if description else {})}
+        assert client.put(f"/goods-receipts/{gr_id}", cookies=cookies, json=body).status_code == 200
+
+    updates = db_session.query(models.AuditLog).filter(models.AuditLog.action == "UPDATE").all()
+    assert len(updates) == 2
+    assert all(entry.old_values is None and entry.new_values is None for entry in updates)
+
+    history = client.get(f"/audit-logs/goods_receipt/{gr_id}", cookies=cookies).json()
+    assert [entry["action"] for entry in history] == ["UPDATE", "UPDATE", "CREATE"]
+    latest, first, created = history
+    assert json.loads(first["old_values"])["gr_number"] == "GR-HISTORY"
+    assert float(json.loads(first["old_values"])["amount"]) == 5
+    assert float(json.loads(first["new_values"])["amount"]) == 6
+    assert json.loads(latest["old_values"]) == json.loads(first["new_values"])
+    assert json.loads(latest["new_values"])["description"] == "late"
+    assert json.loads(latest["new_values"])["gr_number"] == "GR-HISTORY"
+
+    # The list shows only the fields an update changed
+    listed = client.get("/audit-logs/", cookies=cookies).json()
+    latest_listed = next(entry for entry in listed if entry["id"] == latest["id"])
+    assert "gr_number" not in json.loads(latest_listed["new_values"])
+    assert json.loads(latest_listed["new_values"])["description"] == "late"
+
+
+def test_history_without_create_entry_rebuilds_from_current_row(admin_user, test_group, db_session):
+    po = _po(db_session, admin_user, test_group, status="Closed")
+    for old, new in (("Open", "Pending"), ("Pending", "Closed")):
+        db_session.add(models.AuditLog(**audit_writer.audit_row(
+            "purchase_order", po.id, "UPDATE", admin_user.id, {"status": old}, {"status": new})))
+    db_session.commit()
+
+    latest, first = audit_history.history(db_session, "purchase_order", po.id)
+    assert (first["before"]["status"], first["after"]["status"]) == ("Open", "Pending")
+    assert (latest["before"]["status"], latest["after"]["status"]) == ("Pending", "Closed")
+    assert first["before"]["po_number"] == "PO-HISTORY"
+
+
+def test_migrate_converts_snapshots(client, admin_user, admin_token, test_group, db_session):
+    po = _po(db_session, admin_user, test_group, status="Closed")
+    snapshot = {"id": po.id, "po_number": "PO-HISTORY", "total_amount": "100.00", "status": "Open"}
+    db_session.add(models.AuditLog(
+        table_name="purchase_order", record_id=po.id, action="UPDATE", user_id=admin_user.id,
+        old_values=json.dumps(snapshot), new_values=json.dumps({**snapshot, "status": "Closed"}),
+        timestamp=now_utc()
+    ))
+    db_session.commit()
+    cookies = {"access_token": admin_token}
+    before = client.get(f"/audit-logs/purchase_order/{po.id}", cookies=cookies).json()
+
+    assert audit_history.migrate(db_session, dry_run=True)["converted"] == 1
+    report = audit_history.migrate(db_session, batch_size=1)
+    assert report["converted"] == 1 and report["bytes_after"] < report["bytes_before"]
+    assert audit_history.migrate(db_session)["converted"] == 0
+
+    [entry] = db_session.query(models.AuditLog).all()
+    db_session.refresh(entry)
+    assert entry.old_values is None and entry.new_values is None
+    after = client.get(f"/audit-logs/purchase_order/{po.id}", cookies=cookies).json()
+    assert json.loads(after[0]["old_values"])["status"] == "Open"
+    assert json.loads(after[0]["new_values"])["status"] == "Closed"
+    assert json.loads(before[0]["old_values"])["status"] == "Open"
+
+
+def _trail(db_session, admin_user, po, changes, start):
+    """A CREATE entry at `start` and one status UPDATE per minute after it; returns the timestamps."""
+    timestamps = [start + timedelta(minutes=n) for n in range(len(changes) + 1)]
+    rows = [audit_writer.audit_row("purchase_order", po.id, "CREATE", admin_user.id, None,
+                                   {"po_number": po.po_number, "status": "Open"})]
+    status = "Open"
+    for new_status in changes:
+        rows.append(audit_writer.audit_row("purchase_order", po.id, "UPDATE", admin_user.id,
+                                           {"status": status}, {"status": new_status}))
+        status = new_status
+    for row, timestamp in zip(rows, timestamps):
+        db_session.add(models.AuditLog(**{**row, "timestamp": timestamp}))
+    db_session.commit()
+    return timestamps
+
+
+def test_state_as_of_starts_from_snapshots(admin_user, test_group, db_session, monkeypatch):
+    po = _po(db_session, admin_user, test_group, status="S120")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    timestamps = _trail(db_session, admin_user, po, [f"S{n}" for n in range(1, 121)], start)
+
+    monkeypatch.setattr(audit_history, "_snapshot_watermark", 0)
+    assert audit_history.take_snapshots(db_session, every=50) == 2
+    assert audit_history.take_snapshots(db_session, every=50) == 0
+    snapshots = db_session.query(models.AuditSnapshot).order_by(models.AuditSnapshot.id).all()
+    assert [json.loads(snapshot.state)["status"] for snapshot in snapshots] == ["S49", "S99"]
+
+    replayed = []
+    versions = audit_history.versions
+    monkeypatch.setattr(audit_history, "versions",
+                        lambda entries, *args, **kwargs: replayed.append(len(entries)) or versions(entries, *args, **kwargs))
+    for n in (0, 30, 49, 75, 120):
+        assert audit_history.states_as_of(db_session, "purchase_order", [po.id], timestamps[n])[po.id]["status"] == \
+            ("Open" if n == 0 else f"S{n}")
+    assert max(replayed) <= 50
+    # Later instants, even between entries
+    state = audit_history.states_as_of(db_session, "purchase_order", [po.id], timestamps[120] + timedelta(days=1))
+    assert state[po.id] == {"po_number": "PO-HISTORY", "status": "S120"}
+    assert audit_history.states_as_of(db_session, "purchase_order", [po.id], start - timedelta(seconds=1)) == {po.id: None}
+
+
+def test_state_endpoints(client, admin_user, admin_token, test_group, db_session):
+    cookies = {"access_token": admin_token}
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    closed = _po(db_session, admin_user, test_group, status="Closed")
+    timestamps = _trail(db_session, admin_user, closed, ["Closed"], start)
+
+    # Never audited, existing since before the trail
+    legacy = models.PurchaseOrder(asset_id=1, po_number="PO-LEGACY", total_amount=1, spend_category="OPEX",
+                                  owner_group_id=test_group.id, status="Open", created_at=start - timedelta(days=1))
+    # Deleted after the first minute, with only an older diff in its trail
+    deleted = {"po_number": "PO-GONE", "status": "Pending"}
+    db_session.add(legacy)
+    db_session.add(models.AuditLog(**{**audit_writer.audit_row("purchase_order", 9999, "UPDATE", admin_user.id,
+                                                                {"status": "Open"}, {"status": "Pending"}),
+                                      "timestamp": start}))
+    db_session.add(models.AuditLog(**{**audit_writer.audit_row("purchase_order", 9999, "DELETE", admin_user.id,
+                                                                deleted, None),
+                                      "timestamp": start + timedelta(minutes=2)}))
+    db_session.commit()
+
+    as_of = (timestamps[0] + timedelta(seconds=30)).isoformat()
+    response = client.get(f"/audit-logs/purchase_order/{closed.id}/state", params={"as_of": as_of}, cookies=cookies)
+    assert response.status_code == 200
+    assert response.json()["exists"] and response.json()["values"]["status"] == "Open"
+
+    response = client.get("/audit-logs/purchase_order/state", params={"as_of": as_of}, cookies=cookies)
+    assert response.status_code == 200 and response.headers["content-type"] == "application/x-ndjson"
+    states = {line["record_id"]: line["values"] for line in map(json.loads, response.text.splitlines())}
+    assert set(states) == {closed.id, legacy.id, 9999}
+    assert states[closed.id]["status"] == "Open"
+    assert states[legacy.id]["po_number"] == "PO-LEGACY"
+    assert states[9999] == deleted
+
+    later = (start + timedelta(minutes=5)).isoformat()
+    response = client.get("/audit-logs/purchase_order/state", params={"as_of": later}, cookies=cookies)
+    assert {json.loads(line)["record_id"] for line in response.text.splitlines()} == {closed.id, legacy.id}
+    response = client.get(f"/audit-logs/purchase_order/{closed.id}/state",
+                          params={"as_of": (start - timedelta(days=2)).isoformat()}, cookies=cookies)
+    assert response.json() == {"table_name": "purchase_order", "record_id": closed.id,
+                               "as_of": (start - timedelta(days=2)).isoformat().replace("+00:00", "Z"),
+                               "exists": False, "values": None}
+
+
+def test_state_lookups_check_table_and_access(client, admin_user, regular_user, user_token, manager_token,
+                                              test_group, db_session):
+    po = _po(db_session, admin_user, test_group)
+    as_of = {"as_of": "2030-01-01T00:00:00"}
+
+    # Users, grants and the audit log itself have no states, whoever asks
+    for record_type in ("user", "record_access", "audit_log"):
+        for cookies in ({"access_token": user_token}, {"access_token": manager_token}):
+            assert client.get(f"/audit-logs/{record_type}/{admin_user.id}/state", params=as_of,
+                              cookies=cookies).status_code == 404
+        assert client.get(f"/audit-logs/{record_type}/state", params=as_of,
+                          cookies={"access_token": manager_token}).status_code == 404
+
+    # Not in the owner group, not the creator, no grant
+    response = client.get(f"/audit-logs/purchase_order/{po.id}/state", params=as_of,
+                          cookies={"access_token": user_token})
+    assert response.status_code == 403
+    db_session.add(models.UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+    response = client.get(f"/audit-logs/purchase_order/{po.id}/state", params=as_of,
+                          cookies={"access_token": user_token})
+    assert response.status_code == 200 and response.json()["values"]["po_number"] == "PO-HISTORY"
+
+    # A deleted record is checked against its last owner group
+    db_session.add(models.AuditLog(**audit_writer.audit_row(
+        "purchase_order", 9999, "DELETE", admin_user.id,
+        {"po_number": "PO-GONE", "owner_group_id": test_group.id + 1}, None)))
+    db_session.commit()
+    before = {"as_of": (now_utc() - timedelta(seconds=1)).isoformat()}
+    response = client.get("/audit-logs/purchase_order/9999/state", params=before, cookies={"access_token": user_token})
+    assert response.status_code == 403
@@ -0,0 +1,36 @@
+import asyncio
+import inspect
+
+
+def test_decorated_route_writes_audit_entry(client, manager_user, manager_token, test_group, db_session):
+    """Sync routes wrapped by audit_log_change keep their signature and log the change."""
+    from app.models import AuditLog
+
+    response = client.post(
+        "/resources",
+        json={"name": "Jane Roe", "owner_group_id": test_group.id, "status": "Active"},
+        cookies={"access_token": manager_token}
+    )
+    assert response.status_code == 200
+
+    entry = db_session.query(AuditLog).filter(AuditLog.table_name == "resource").one()
+    assert entry.action == "CREATE"
+    assert entry.record_id == response.json()["id"]
+    assert entry.user_id == manager_user.id
+
+
+def test_decorator_supports_async_functions(admin_user, db_session):
+    """Async functions stay coroutines and are audited without blocking the loop."""
+    from app.auth import audit_log_change
+    from app.models import AuditLog
+
+    @audit_log_change(action="CREATE", table_name="resource")
+    async def create(payload: dict, db=None, current_user=None):
+        return {"id": payload["id"]}
+
+    assert inspect.iscoroutinefunction(create)
+    assert list(inspect.signature(create).parameters) == ["payload", "db", "current_user"]
+
+    assert asyncio.run(create(payload={"id": 42}, db=db_session, current_user=admin_user)) == {"id": 42}
+    entry = db_session.query(AuditLog).one()
+    assert (entry.table_name, entry.record_id, entry.action) == ("resource", 42, "CREATE")
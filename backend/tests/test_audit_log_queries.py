@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text, tuple_
+
+from app import audit_writer, models
+
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _entry(db_session, minutes, table_name, record_id, action, user_id, old=None, new=None):
+    row = audit_writer.audit_row(table_name, record_id, action, user_id, old, new)
+    db_session.add(models.AuditLog(**{**row, "timestamp": START + timedelta(minutes=minutes)}))
+
+
+def _seed(db_session, admin_user, regular_user):
+    _entry(db_session, 0, "purchase_order", 1, "CREATE", admin_user.id, new={"supplier": "Müller_AG"})
+    _entry(db_session, 1, "purchase_order", 1, "UPDATE", regular_user.id, {"status": "Open"}, {"status": "Closed"})
+    _entry(db_session, 2, "purchase_order", 2, "CREATE", regular_user.id, new={"supplier": "Acme"})
+    _entry(db_session, 3, "goods_receipt", 1, "CREATE", admin_user.id, new={"description": "100% delivered"})
+    _entry(db_session, 4, "purchase_order", 1, "DELETE", admin_user.id, old={"supplier": "Müller_AG"})
+    db_session.commit()
+
+
+def _ids(response):
+    assert response.status_code == 200
+    return [(entry["table_name"], entry["record_id"], entry["action"]) for entry in response.json()]
+
+
+def test_filters(client, admin_user, regular_user, admin_token, db_session):
+    _seed(db_session, admin_user, regular_user)
+    cookies = {"access_token": admin_token}
+
+    def query(**params):
+        return _ids(client.get("/audit-logs/", params=params, cookies=cookies))
+
+    assert query(user_id=regular_user.id) == [("purchase_order", 2, "CREATE"), ("purchase_order", 1, "UPDATE")]
+    assert query(table_name="goods_receipt") == [("goods_receipt", 1, "CREATE")]
+    assert query(table_name="purchase_order", record_id=1, action="update") == [("purchase_order", 1, "UPDATE")]
+    window = {"start_date": (START + timedelta(minutes=1)).isoformat(),
+              "end_date": (START + timedelta(minutes=2)).isoformat()}
+    assert query(**window) == [("purchase_order", 2, "CREATE"), ("purchase_order", 1, "UPDATE")]
+    # Offsets are converted to UTC
+    assert query(start_date="2026-03-01T01:03:00+01:00") == [("purchase_order", 1, "DELETE"),
+                                                             ("goods_receipt", 1, "CREATE")]
+
+    # Text in old, new and changed values; LIKE wildcards are literal, non-ASCII matches
+    assert query(q="Müller_AG") == [("purchase_order", 1, "DELETE"), ("purchase_order", 1, "CREATE")]
+    assert query(q="Müller%") == []
+    assert query(q="100%") == [("goods_receipt", 1, "CREATE")]
+    assert query(q="Closed") == [("purchase_order", 1, "UPDATE")]
+
+
+def test_filtered_cursor_pagination(client, admin_user, regular_user, admin_token, db_session):
+    _seed(db_session, admin_user, regular_user)
+    cookies = {"access_token": admin_token}
+    seen, cursor = [], None
+    while True:
+        params = {"table_name": "purchase_order", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/audit-logs/", params=params, cookies=cookies)
+        seen += _ids(response)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [action for _, _, action in seen] == ["DELETE", "CREATE", "UPDATE", "CREATE"]
+
+    response = client.get("/audit-logs/purchase_order/1", params={"limit": 2}, cookies=cookies)
+    assert [entry["action"] for entry in response.json()] == ["DELETE", "UPDATE"]
+    response = client.get("/audit-logs/purchase_order/1", cookies=cookies,
+                          params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [entry["action"] for entry in response.json()] == ["CREATE"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_filters_seek_an_index(db_session):
+    AuditLog = models.AuditLog
+    order = (AuditLog.timestamp.desc().nulls_last(), AuditLog.id.desc())
+    after = tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(START, 10)
+    cases = {
+        "ix_audit_log_timestamp_id": [],
+        "ix_audit_log_user_timestamp": [AuditLog.user_id == 1],
+        "ix_audit_log_table_timestamp": [AuditLog.table_name == "purchase_order"],
+        "ix_audit_log_record_timestamp": [AuditLog.table_name == "purchase_order", AuditLog.record_id == 1],
+    }
+    for index, conditions in cases.items():
+        query = db_session.query(AuditLog).filter(*conditions, after).order_by(*order).limit(101)
+        sql = str(query.statement.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db_session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+        assert f"USING INDEX {index}" in plan and "TEMP B-TREE" not in plan, plan
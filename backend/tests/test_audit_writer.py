@@ -0,0 +1,101 @@
+import json
+
+from sqlalchemy import event
+
+from app import audit_history, audit_writer, models
+from app.auth import now_utc
+
+
+def _po(db_session, admin_user, test_group):
+    po = models.PurchaseOrder(asset_id=1, po_number="PO-AUDIT", total_amount=100, spend_category="OPEX",
+                              owner_group_id=test_group.id, status="Open", created_by=admin_user.id,
+                              created_at=now_utc())
+    db_session.add(po)
+    db_session.commit()
+    return po
+
+
+def _entries(db_session, table_name):
+    return db_session.query(models.AuditLog).filter(models.AuditLog.table_name == table_name) \
+        .order_by(models.AuditLog.id).all()
+
+
+def test_audit_entry_commits_with_the_change(client, admin_user, admin_token, test_group, db_session):
+    po = _po(db_session, admin_user, test_group)
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(db_session.get_bind(), "commit", listener)
+    try:
+        response = client.put(f"/purchase-orders/{po.id}", cookies={"access_token": admin_token},
+                              json={"status": "Closed"})
+    finally:
+        event.remove(db_session.get_bind(), "commit", listener)
+    assert response.status_code == 200
+    assert len(commits) == 1
+
+    [entry] = _entries(db_session, "purchase_order")
+    assert (entry.action, entry.record_id, entry.user_id) == ("UPDATE", po.id, admin_user.id)
+    assert {"op": "replace", "path": "/status", "value": "Closed"} in json.loads(entry.changes)
+    assert {"op": "test", "path": "/status", "value": "Open"} in json.loads(entry.changes)
+
+    response = client.post("/goods-receipts/", cookies={"access_token": admin_token}, json={
+        "po_id": po.id, "gr_number": "GR-AUDIT", "amount": 5, "owner_group_id": test_group.id
+    })
+    [created] = _entries(db_session, "goods_receipt")
+    assert (created.action, created.record_id) == ("CREATE", response.json()["id"])
+    assert json.loads(created.new_values)["gr_number"] == "GR-AUDIT"
+
+    assert client.delete(f"/goods-receipts/{created.record_id}", cookies={"access_token": admin_token}).status_code == 200
+    deleted = _entries(db_session, "goods_receipt")[-1]
+    assert deleted.action == "DELETE" and json.loads(deleted.old_values)["gr_number"] == "GR-AUDIT"
+
+
+def test_rolled_back_change_is_not_audited(admin_user, test_group, db_session):
+    po = _po(db_session, admin_user, test_group)
+    with audit_writer.capture(db_session, "UPDATE", "purchase_order", models.PurchaseOrder, admin_user.id, po.id):
+        po.status = "Closed"
+        db_session.flush()
+        db_session.rollback()
+    assert _entries(db_session, "purchase_order") == []
+
+
+def test_queue_mode_writes_after_commit(client, admin_user, admin_token, test_group, db_session, monkeypatch):
+    writer = audit_writer.AuditWriter(size=100, overflow="block", batch_size=10)
+    monkeypatch.setattr(audit_writer, "AUDIT_WRITE_MODE", "queue")
+    monkeypatch.setattr(audit_writer, "writer", writer)
+    po = _po(db_session, admin_user, test_group)
+
+    for status in ("Closed", "Open", "Closed"):
+        response = client.put(f"/purchase-orders/{po.id}", cookies={"access_token": admin_token},
+                              json={"status": status})
+        assert response.status_code == 200
+    writer.flush()
+
+    entries = _entries(db_session, "purchase_order")
+    statuses = [audit_history.changed_views(json.loads(entry.changes))[1]["status"] for entry in entries]
+    assert statuses == ["Closed", "Open", "Closed"]
+    stats = client.get("/admin/audit-writer", cookies={"access_token": admin_token}).json()
+    assert stats["mode"] == "queue" and stats["enqueued"] == 3 and stats["written"] == 3
+    assert stats["queue_depth"] == 0 and stats["lag_seconds"] == 0
+    writer.stop()
+
+
+def test_queue_overflow_policies(admin_user, db_session):
+    bind = db_session.get_bind()
+    rows = [audit_writer.audit_row("resource", n, "CREATE", admin_user.id, None, {"n": n}) for n in range(3)]
+
+    dropping = audit_writer.AuditWriter(size=1, overflow="drop")
+    dropping._ensure_thread = lambda: None  # nothing drains, so the queue stays full
+    dropping.submit(bind, rows)
+    assert (dropping.enqueued, dropping.dropped, dropping.queue.qsize()) == (1, 2, 1)
+    assert dropping.lag_seconds() >= 0
+    dropping.stop()  # shutdown writes what is still queued
+    assert dropping.written == 1
+
+    inline = audit_writer.AuditWriter(size=1, overflow="sync")
+    inline._ensure_thread = lambda: None
+    inline.submit(bind, rows)
+    assert (inline.enqueued, inline.sync_writes, inline.written) == (1, 2, 2)
+    inline.stop()
+    assert inline.written == 3
+    assert db_session.query(models.AuditLog).count() == 4
@@ -0,0 +1,147 @@
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from app import budget_rollup, models
+from app.auth import now_utc
+
+
+def _build(db_session, admin_user, group_id, other_group_id):
+    """Two budget items funding one business case; POs under two WBS, one owned by another group."""
+    bi_a = models.BudgetItem(workday_ref="WD-ROLL-A", title="A", budget_amount=10000, currency="USD",
+                             fiscal_year=2025, owner_group_id=group_id, created_by=admin_user.id)
+    bi_b = models.BudgetItem(workday_ref="WD-ROLL-B", title="B", budget_amount=5000, currency="USD",
+                             fiscal_year=2026, owner_group_id=other_group_id, created_by=admin_user.id)
+    bc = models.BusinessCase(title="Case", status="Draft", created_by=admin_user.id)
+    db_session.add_all([bi_a, bi_b, bc])
+    db_session.flush()
+    li_a = models.BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=bi_a.id, title="LI A",
+                                       spend_category="OPEX", requested_amount=4000, currency="USD",
+                                       owner_group_id=group_id, created_by=admin_user.id)
+    li_b = models.BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=bi_b.id, title="LI B",
+                                       spend_category="OPEX", requested_amount=1000, currency="USD",
+                                       owner_group_id=other_group_id, created_by=admin_user.id)
+    db_session.add_all([li_a, li_b])
+    db_session.flush()
+    wbs_mine = models.WBS(business_case_line_item_id=li_a.id, wbs_code="WBS-ROLL-1", owner_group_id=group_id,
+                          created_by=admin_user.id)
+    wbs_theirs = models.WBS(business_case_line_item_id=li_a.id, wbs_code="WBS-ROLL-2",
+                            owner_group_id=other_group_id, created_by=admin_user.id)
+    db_session.add_all([wbs_mine, wbs_theirs])
+    db_session.flush()
+    pos = []
+    for n, (wbs, total, received) in enumerate([(wbs_mine, 1000, 250), (wbs_mine, 500, 0), (wbs_theirs, 2000, 2000)]):
+        asset = models.Asset(wbs_id=wbs.id, asset_code=f"AS-ROLL-{n}", owner_group_id=wbs.owner_group_id,
+                             created_by=admin_user.id)
+        db_session.add(asset)
+        db_session.flush()
+        po = models.PurchaseOrder(asset_id=asset.id, po_number=f"PO-ROLL-{n}", total_amount=total,
+                                  spend_category="OPEX", owner_group_id=wbs.owner_group_id, status="Open",
+                                  created_by=admin_user.id, created_at=now_utc())
+        db_session.add(po)
+        db_session.flush()
+        if received:
+            db_session.add(models.GoodsReceipt(po_id=po.id, gr_number=f"GR-ROLL-{n}", amount=received,
+                                               owner_group_id=wbs.owner_group_id, created_by=admin_user.id))
+        pos.append(po)
+    db_session.commit()
+    return bi_a, bi_b, bc, li_a, wbs_mine, wbs_theirs, pos
+
+
+def _other_group(db_session, admin_user):
+    group = models.UserGroup(name="Other Group", created_by=admin_user.id)
+    db_session.add(group)
+    db_session.commit()
+    return group
+
+
+def _amounts(row, *keys):
+    return tuple(Decimal(str(row[key])) for key in keys)
+
+
+def test_rollup_totals_in_one_statement(admin_user, test_group, db_session):
+    bi_a, bi_b, bc, li_a, wbs_mine, wbs_theirs, _ = _build(
+        db_session, admin_user, test_group.id, _other_group(db_session, admin_user).id
+    )
+    db_session.refresh(admin_user)
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        result = budget_rollup.rollup(db_session, admin_user, cached=False)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    budget_items = {row["id"]: row for row in result["budget_items"]}
+    keys = ("budget", "requested", "committed", "actual")
+    assert _amounts(budget_items[bi_a.id], *keys) == (10000, 4000, 3500, 2250)
+    assert _amounts(budget_items[bi_b.id], *keys) == (5000, 1000, 0, 0)
+    [case] = result["business_cases"]
+    assert _amounts(case, "requested", "committed", "actual") == (5000, 3500, 2250)
+    wbs = {row["id"]: row for row in result["wbs"]}
+    assert _amounts(wbs[wbs_mine.id], "committed", "actual") == (1500, 250)
+
+    filtered = budget_rollup.rollup(db_session, admin_user, fiscal_year=2026, cached=False)
+    assert [row["id"] for row in filtered["budget_items"]] == [bi_b.id]
+
+
+def test_rollup_and_its_totals_are_access_filtered(admin_user, regular_user, test_group, db_session, monkeypatch):
+    db_session.add(models.UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+    other_group = _other_group(db_session, admin_user)
+    bi_a, _, bc, li_a, wbs_mine, _, pos = _build(db_session, admin_user, test_group.id, other_group.id)
+    # A PO of the other group under the user's WBS
+    hidden = models.PurchaseOrder(asset_id=pos[0].asset_id, po_number="PO-ROLL-HIDDEN", total_amount=7000,
+                                  spend_category="OPEX", owner_group_id=other_group.id, status="Open",
+                                  created_by=admin_user.id, created_at=now_utc())
+    db_session.add(hidden)
+    db_session.commit()
+
+    result = budget_rollup.rollup(db_session, regular_user, cached=False)
+    assert [row["id"] for row in result["budget_items"]] == [bi_a.id]
+    assert [row["id"] for row in result["line_items"]] == [li_a.id]
+    assert [row["id"] for row in result["wbs"]] == [wbs_mine.id]
+    # Line-item access through budget item A makes the business case readable
+    assert [row["id"] for row in result["business_cases"]] == [bc.id]
+    # Only the user's own POs count, under their WBS and up the chain
+    assert _amounts(result["wbs"][0], "committed", "actual") == (1500, 250)
+    assert _amounts(result["line_items"][0], "committed", "actual") == (1500, 250)
+    assert _amounts(result["budget_items"][0], "committed", "actual") == (1500, 250)
+
+    # The cache holds totals over every PO, so it is not used for them
+    monkeypatch.setattr(budget_rollup, "CACHE_ENABLED", True)
+    budget_rollup.rebuild(db_session)
+    db_session.commit()
+    assert budget_rollup.rollup(db_session, regular_user) == {**result, "cached": False}
+    admin = budget_rollup.rollup(db_session, admin_user)
+    assert admin["cached"] is True
+    assert _amounts(admin["line_items"][0], "committed", "actual") == (10500, 2250)
+
+
+def test_cache_is_refreshed_incrementally(client, admin_user, admin_token, test_group, db_session, monkeypatch):
+    monkeypatch.setattr(budget_rollup, "CACHE_ENABLED", True)
+    _, _, _, _, wbs_mine, wbs_theirs, pos = _build(db_session, admin_user, test_group.id,
+                                                   _other_group(db_session, admin_user).id)
+    budget_rollup.rebuild(db_session)
+    db_session.commit()
+    assert budget_rollup.rollup(db_session, admin_user, cached=True) == {
+        **budget_rollup.rollup(db_session, admin_user, cached=False), "cached": True
+    }
+
+    # A goods receipt and a PO moved to the other WBS mark only what they touch
+    db_session.add(models.GoodsReceipt(po_id=pos[1].id, gr_number="GR-ROLL-NEW", amount=100,
+                                       owner_group_id=test_group.id, created_by=admin_user.id))
+    pos[0].asset_id = pos[2].asset_id
+    db_session.commit()
+    assert db_session.query(models.WBSSpendDirty).count() > 0
+    assert budget_rollup.check(db_session) != []
+
+    response = client.get("/rollups/budget", cookies={"access_token": admin_token})
+    assert response.status_code == 200
+    assert response.json()["cached"] is True
+    wbs = {row["id"]: row for row in response.json()["wbs"]}
+    assert _amounts(wbs[wbs_mine.id], "committed", "actual") == (500, 100)
+    assert _amounts(wbs[wbs_theirs.id], "committed", "actual") == (3000, 2250)
+    assert db_session.query(models.WBSSpendDirty).count() == 0
+    assert budget_rollup.check(db_session) == []
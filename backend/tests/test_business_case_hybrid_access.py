@@ -386,3 +386,42 @@ def test_admin_sees_all_business_cases(client, admin_user, regular_user, admin_t
     bc_ids = [item["id"] for item in data]
     assert bc1.id in bc_ids
     assert bc2.id in bc_ids
+
+
+def test_bc_list_paginates_accessible_results(client, admin_user, regular_user, user_token, db_session):
+    """Test that skip/limit apply to the access-filtered list, not the raw table."""
+    from datetime import timedelta
+    from app.models import BusinessCase
+
+    base = now_utc()
+    accessible_ids = []
+    for i in range(6):
+        # Interleave inaccessible (admin-created) and accessible (user-created) BCs
+        creator = regular_user.id if i % 2 == 0 else admin_user.id
+        bc = BusinessCase(
+            title=f"Paged BC {i}",
+            status="Draft",
+            created_by=creator,
+            created_at=base + timedelta(minutes=i)
+        )
+        db_session.add(bc)
+        db_session.flush()
+        if creator == regular_user.id:
+            accessible_ids.append(bc.id)
+    db_session.commit()
+
+    # Newest first: accessible BCs are i=4, 2, 0
+    expected = list(reversed(accessible_ids))
+
+    response = client.get(
+        "/business-cases?skip=1&limit=1",
+        cookies={"access_token": user_token}
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == expected[1:2]
+
+    response = client.get(
+        "/business-cases?skip=0&limit=10",
+        cookies={"access_token": user_token}
+    )
+    assert [item["id"] for item in response.json()] == expected
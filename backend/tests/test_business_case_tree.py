@@ -0,0 +1,116 @@
+from sqlalchemy import event
+
+from app import models
+from app.auth import now_utc
+
+
+def _business_case(db_session, user, group_id):
+    bi = models.BudgetItem(workday_ref="WD-TREE", title="BI", budget_amount=1000, currency="USD",
+                           fiscal_year=2025, owner_group_id=group_id, created_by=user.id)
+    bc = models.BusinessCase(title="Tree", status="Draft", created_by=user.id)
+    db_session.add_all([bi, bc])
+    db_session.commit()
+    return bi, bc
+
+
+def _branch(db_session, user, bi, bc, group_id, n):
+    """One line item -> WBS -> asset -> PO with a GR and an allocation."""
+    li = models.BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=bi.id, title=f"LI {n}",
+                                     spend_category="OPEX", requested_amount=100, currency="USD",
+                                     owner_group_id=group_id, created_by=user.id)
+    db_session.add(li)
+    db_session.flush()
+    wbs = models.WBS(business_case_line_item_id=li.id, wbs_code=f"WBS-TREE-{n}", owner_group_id=group_id,
+                     created_by=user.id)
+    db_session.add(wbs)
+    db_session.flush()
+    asset = models.Asset(wbs_id=wbs.id, asset_code=f"AS-TREE-{n}", owner_group_id=group_id, created_by=user.id)
+    db_session.add(asset)
+    db_session.flush()
+    po = models.PurchaseOrder(asset_id=asset.id, po_number=f"PO-TREE-{n}", total_amount=100,
+                              spend_category="OPEX", owner_group_id=group_id, status="Open",
+                              created_by=user.id, created_at=now_utc())
+    resource = models.Resource(name=f"Resource {n}", owner_group_id=group_id, created_by=user.id)
+    db_session.add_all([po, resource])
+    db_session.flush()
+    db_session.add_all([
+        models.GoodsReceipt(po_id=po.id, gr_number=f"GR-TREE-{n}", amount=10, owner_group_id=group_id,
+                            created_by=user.id),
+        models.ResourcePOAllocation(resource_id=resource.id, po_id=po.id, owner_group_id=group_id,
+                                    created_by=user.id),
+    ])
+    db_session.commit()
+    return li, wbs, asset, po
+
+
+def _counted_get(client, db_session, url, token):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        response = client.get(url, cookies={"access_token": token})
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+
+def test_tree_query_count_is_constant(client, admin_user, admin_token, test_group, db_session):
+    bi, bc = _business_case(db_session, admin_user, test_group.id)
+    _branch(db_session, admin_user, bi, bc, test_group.id, 0)
+    _counted_get(client, db_session, f"/business-cases/{bc.id}", admin_token)  # warm the principal cache
+    small, small_count = _counted_get(client, db_session, f"/business-cases/{bc.id}/tree", admin_token)
+
+    for n in range(1, 6):
+        _branch(db_session, admin_user, bi, bc, test_group.id, n)
+    large, large_count = _counted_get(client, db_session, f"/business-cases/{bc.id}/tree", admin_token)
+
+    assert large_count == small_count
+    assert small_count <= 8  # business case + one query per level
+    assert len(small["line_items"]) == 1 and len(large["line_items"]) == 6
+    [po] = large["line_items"][5]["wbs_items"][0]["assets"][0]["purchase_orders"]
+    assert po["po_number"] == "PO-TREE-5"
+    assert [gr["gr_number"] for gr in po["goods_receipts"]] == ["GR-TREE-5"]
+    assert len(po["allocations"]) == 1
+
+
+def test_tree_prunes_unreadable_records(client, admin_user, regular_user, user_token, test_group, db_session):
+    db_session.add(models.UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    other = models.UserGroup(name="Other Group", created_by=admin_user.id)
+    db_session.add(other)
+    db_session.commit()
+
+    bi, bc = _business_case(db_session, regular_user, test_group.id)
+    li, wbs, asset, po = _branch(db_session, regular_user, bi, bc, test_group.id, 0)
+    _branch(db_session, admin_user, bi, bc, other.id, 1)
+    # A PO of another group below a visible asset is pruned with its GRs
+    hidden = models.PurchaseOrder(asset_id=asset.id, po_number="PO-TREE-HIDDEN", total_amount=5,
+                                  spend_category="OPEX", owner_group_id=other.id, status="Open",
+                                  created_by=admin_user.id, created_at=now_utc())
+    db_session.add(hidden)
+    db_session.commit()
+
+    tree, _ = _counted_get(client, db_session, f"/business-cases/{bc.id}/tree", user_token)
+    assert [item["id"] for item in tree["line_items"]] == [li.id]
+    [visible_asset] = tree["line_items"][0]["wbs_items"][0]["assets"]
+    assert [p["po_number"] for p in visible_asset["purchase_orders"]] == ["PO-TREE-0"]
+
+
+def test_tree_depth_and_projection(client, admin_user, admin_token, test_group, db_session):
+    bi, bc = _business_case(db_session, admin_user, test_group.id)
+    _branch(db_session, admin_user, bi, bc, test_group.id, 0)
+    url = f"/business-cases/{bc.id}/tree"
+
+    tree, _ = _counted_get(client, db_session, f"{url}?depth=2&fields=business_case.title,wbs_items.wbs_code", admin_token)
+    assert set(tree) == {"id", "title", "line_items"}
+    [wbs] = tree["line_items"][0]["wbs_items"]
+    assert wbs == {"id": wbs["id"], "wbs_code": "WBS-TREE-0"}
+    assert "spend_category" in tree["line_items"][0]
+
+    tree, _ = _counted_get(client, db_session, f"{url}?depth=0", admin_token)
+    assert "line_items" not in tree
+
+    response = client.get(f"{url}?fields=assets.nope", cookies={"access_token": admin_token})
+    assert response.status_code == 400
+    assert client.get(f"{url}?depth=9", cookies={"access_token": admin_token}).status_code == 422
+    assert client.get("/business-cases/999999/tree", cookies={"access_token": admin_token}).status_code == 404
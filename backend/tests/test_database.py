@@ -0,0 +1,54 @@
+import pytest
+
+
+def test_default_sqlite_settings(tmp_path):
+    """Without the profile only foreign keys are enforced."""
+    from app.database import create_db_engine, settings_report
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'plain.db'}", env={})
+    report = settings_report(engine)
+    assert report["pragmas"]["foreign_keys"] == 1
+    assert report["pragmas"]["journal_mode"] == "delete"
+    engine.dispose()
+
+
+def test_sqlite_performance_profile(tmp_path):
+    """The profile applies WAL and the tuned pragmas; single settings can be overridden."""
+    from app.database import create_db_engine, settings_report
+
+    env = {"SQLITE_PERFORMANCE_PROFILE": "true", "SQLITE_BUSY_TIMEOUT": "10000"}
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}", env=env)
+    pragmas = settings_report(engine)["pragmas"]
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1  # NORMAL
+    assert pragmas["busy_timeout"] == 10000
+    assert pragmas["temp_store"] == 2  # MEMORY
+    assert pragmas["cache_size"] == -65536
+    assert pragmas["foreign_keys"] == 1
+    assert engine.pool.size() == 20
+    engine.dispose()
+
+
+def test_invalid_pragma_value_rejected():
+    """Pragma values are interpolated into SQL, so anything unexpected fails at startup."""
+    from app.database import sqlite_pragmas
+
+    with pytest.raises(ValueError):
+        sqlite_pragmas({"SQLITE_JOURNAL_MODE": "WAL; DROP TABLE user"})
+
+
+def test_ensure_columns_adds_missing_model_columns(tmp_path):
+    """Existing databases get new model columns without a migration tool."""
+    from sqlalchemy import inspect
+    from app.database import Base, create_db_engine, ensure_columns
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'old.db'}", env={})
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE purchase_order (id INTEGER PRIMARY KEY, total_amount NUMERIC(10, 2))")
+
+    added = ensure_columns(engine)
+    assert {"purchase_order.remaining_amount", "purchase_order.gr_count"} <= set(added)
+    columns = {column["name"] for column in inspect(engine).get_columns("purchase_order")}
+    assert columns == {column.name for column in Base.metadata.tables["purchase_order"].columns}
+    assert ensure_columns(engine) == []
+    engine.dispose()
@@ -0,0 +1,119 @@
+import pytest
+
+from app.auth import now_utc
+
+
+@pytest.fixture
+def effective_access_enabled(monkeypatch):
+    from app import acl
+    monkeypatch.setattr(acl, "USE_EFFECTIVE_ACCESS", True)
+
+
+def _rows_for(db_session, user_id):
+    from app.models import EffectiveAccess
+    return {
+        (row.record_type, row.record_id, row.level)
+        for row in db_session.query(EffectiveAccess).filter(EffectiveAccess.user_id == user_id)
+    }
+
+
+def _make_budget_item(db_session, ref, owner_group_id, created_by):
+    from app.models import BudgetItem
+
+    item = BudgetItem(
+        workday_ref=ref,
+        title=ref,
+        budget_amount=1000,
+        currency="USD",
+        fiscal_year=2025,
+        owner_group_id=owner_group_id,
+        created_by=created_by,
+        created_at=now_utc()
+    )
+    db_session.add(item)
+    db_session.commit()
+    db_session.refresh(item)
+    return item
+
+
+def test_membership_changes_update_effective_access(effective_access_enabled, admin_user, regular_user, test_group, db_session):
+    """Adding and removing a membership adds and removes owner-group rows."""
+    from app.models import UserGroupMembership
+
+    item = _make_budget_item(db_session, "WD-EA-001", test_group.id, admin_user.id)
+    assert ("BudgetItem", item.id, "Full") not in _rows_for(db_session, regular_user.id)
+
+    membership = UserGroupMembership(user_id=regular_user.id, group_id=test_group.id)
+    db_session.add(membership)
+    db_session.commit()
+    assert ("BudgetItem", item.id, "Full") in _rows_for(db_session, regular_user.id)
+
+    db_session.delete(membership)
+    db_session.commit()
+    assert ("BudgetItem", item.id, "Full") not in _rows_for(db_session, regular_user.id)
+
+
+def test_group_grant_expands_to_members(effective_access_enabled, admin_user, regular_user, test_group, db_session):
+    """Group grants are materialized for each member and follow level changes."""
+    from app.models import RecordAccess, UserGroup, UserGroupMembership
+
+    other_group = UserGroup(name="Grant Group", created_by=admin_user.id)
+    db_session.add(other_group)
+    db_session.commit()
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=other_group.id))
+    item = _make_budget_item(db_session, "WD-EA-002", test_group.id, admin_user.id)
+
+    grant = RecordAccess(
+        record_type="BudgetItem",
+        record_id=item.id,
+        group_id=other_group.id,
+        access_level="Read",
+        granted_by=admin_user.id,
+        granted_at=now_utc()
+    )
+    db_session.add(grant)
+    db_session.commit()
+    assert ("BudgetItem", item.id, "Read") in _rows_for(db_session, regular_user.id)
+
+    grant.access_level = "Write"
+    db_session.commit()
+    rows = _rows_for(db_session, regular_user.id)
+    assert ("BudgetItem", item.id, "Write") in rows
+    assert ("BudgetItem", item.id, "Read") not in rows
+
+
+def test_rebuild_and_check(effective_access_enabled, admin_user, regular_user, test_group, db_session):
+    """The consistency checker detects drift and rebuild repairs it."""
+    from app import effective_access
+    from app.models import EffectiveAccess
+
+    _make_budget_item(db_session, "WD-EA-003", test_group.id, regular_user.id)
+    conn = db_session.connection()
+    assert effective_access.check(conn) == (set(), set())
+
+    # Simulate drift from an out-of-band write
+    db_session.query(EffectiveAccess).delete()
+    db_session.commit()
+    missing, unexpected = effective_access.check(db_session.connection())
+    assert missing and not unexpected
+
+    effective_access.rebuild(db_session.connection())
+    db_session.commit()
+    assert effective_access.check(db_session.connection()) == (set(), set())
+
+
+def test_endpoints_use_effective_access(effective_access_enabled, client, admin_user, regular_user, user_token, test_group, db_session):
+    """List filters and check_record_access read the materialized table."""
+    from app.models import UserGroupMembership
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+    visible = _make_budget_item(db_session, "WD-EA-004", test_group.id, admin_user.id)
+    hidden = _make_budget_item(db_session, "WD-EA-005", 999, admin_user.id)
+
+    response = client.get("/budget-items", cookies={"access_token": user_token})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [visible.id]
+
+    assert client.get(f"/budget-items/{visible.id}", cookies={"access_token": user_token}).status_code == 200
+    assert client.get(f"/budget-items/{hidden.id}", cookies={"access_token": user_token}).status_code == 403
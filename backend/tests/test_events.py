@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from app import events, models
+from app.alert_store import refresh_dirty
+from app.auth import now_utc
+
+
+def _resource(db_session, owner_group_id, created_by, name="Dev", status="Active"):
+    resource = models.Resource(name=name, owner_group_id=owner_group_id, status=status,
+                               created_by=created_by, created_at=now_utc())
+    db_session.add(resource)
+    db_session.commit()
+    return resource
+
+
+def _hub(db_session, **kwargs):
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    return events.EventHub(factory, poll_seconds=0.01, **kwargs)
+
+
+async def _never_disconnected():
+    return False
+
+
+def test_committed_changes_are_logged(admin_user, test_group, db_session):
+    resource = _resource(db_session, test_group.id, admin_user.id)
+    resource.vendor = "Acme"
+    db_session.commit()
+    resource_id = resource.id
+    db_session.delete(resource)
+    db_session.commit()
+
+    # Rolled back writes are never logged
+    db_session.add(models.Resource(name="Gone", owner_group_id=test_group.id, created_by=admin_user.id))
+    db_session.flush()
+    db_session.rollback()
+
+    logged = events.events_after(db_session, 0)
+    assert [(e["entity_type"], e["entity_id"], e["action"]) for e in logged] == [
+        ("Resource", resource_id, "create"), ("Resource", resource_id, "update"), ("Resource", resource_id, "delete")
+    ]
+    assert "name" in logged[0]["changed_fields"]
+    assert logged[1]["changed_fields"] == ["vendor"]
+    assert logged[2]["owner_group_id"] == test_group.id
+
+
+def test_events_are_access_filtered(admin_user, regular_user, test_group, db_session):
+    visible = _resource(db_session, test_group.id, regular_user.id, name="Mine")
+    hidden = _resource(db_session, test_group.id, admin_user.id, name="Theirs")
+    hidden_id = hidden.id
+    db_session.delete(hidden)
+    db_session.commit()
+
+    logged = events.events_after(db_session, 0)
+    assert len(events.visible_events(db_session, admin_user, logged)) == 3
+    # Not a member of test_group: only the resource they created
+    seen = events.visible_events(db_session, regular_user, logged)
+    assert [(e["entity_id"], e["action"]) for e in seen] == [(visible.id, "create")]
+
+    db_session.add(models.UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+    seen = events.visible_events(db_session, regular_user, logged)
+    assert (hidden_id, "delete") in [(e["entity_id"], e["action"]) for e in seen]
+
+
+def test_stream_resumes_goes_live_and_heartbeats(admin_user, test_group, db_session):
+    first = _resource(db_session, test_group.id, admin_user.id, name="First")
+    _resource(db_session, test_group.id, admin_user.id, name="Second")
+    first_event_id = events.events_after(db_session, 0)[0]["id"]
+    hub = _hub(db_session)
+
+    async def run():
+        chunks = events.stream(hub, admin_user.id, first_event_id, _never_disconnected, heartbeat_seconds=0.05)
+        received = [await chunks.__anext__() for _ in range(2)]  # retry hint, catch-up of "Second"
+
+        await asyncio.to_thread(_resource, db_session, test_group.id, admin_user.id, "Third")
+        received.append(await chunks.__anext__())
+        received.append(await chunks.__anext__())  # idle: heartbeat
+        stats = hub.stats()
+        await chunks.aclose()
+        return received, stats
+
+    received, stats = asyncio.run(run())
+    assert received[0].startswith("retry:")
+    assert '"action":"create"' in received[1] and received[1].startswith(f"id: {first_event_id + 1}\n")
+    assert received[2].startswith(f"id: {first_event_id + 2}\nevent: change\n")
+    assert received[3] == ": heartbeat\n\n"
+    assert stats["connections"] == 1
+    assert hub.stats()["connections"] == 0
+    assert first.id
+
+
+def test_slow_client_catches_up_from_the_log(admin_user, test_group, db_session):
+    hub = _hub(db_session, queue_size=1)
+
+    async def run():
+        chunks = events.stream(hub, admin_user.id, None, _never_disconnected, heartbeat_seconds=5)
+        await chunks.__anext__()  # retry hint
+        for name in ("A", "B", "C"):
+            await asyncio.to_thread(_resource, db_session, test_group.id, admin_user.id, name)
+        # Let the hub overflow the one-event queue before the client reads
+        while hub.last_id < 3:
+            await asyncio.sleep(0.01)
+        received = [await chunks.__anext__() for _ in range(3)]
+        await chunks.aclose()
+        return received
+
+    received = asyncio.run(run())
+    assert [chunk.split("\n")[0] for chunk in received] == ["id: 1", "id: 2", "id: 3"]
+
+
+def test_resume_after_prune_sends_reset(admin_user, test_group, db_session):
+    for name in ("A", "B", "C"):
+        _resource(db_session, test_group.id, admin_user.id, name)
+    db_session.query(models.ChangeEvent).filter(models.ChangeEvent.id < 3).delete()
+    db_session.commit()
+    hub = _hub(db_session)
+
+    async def run():
+        chunks = events.stream(hub, admin_user.id, 0, _never_disconnected, heartbeat_seconds=5)
+        received = [await chunks.__anext__() for _ in range(2)]
+        await chunks.aclose()
+        return received
+
+    received = asyncio.run(run())
+    assert received[1] == "id: 3\nevent: reset\ndata: {}\n\n"
+
+
+def test_alert_changes_are_published_once(admin_user, test_group, db_session):
+    resource = _resource(db_session, test_group.id, admin_user.id)
+    after = events.latest_event_id(db_session)
+    refresh_dirty(db_session)
+    refresh_dirty(db_session)  # nothing marked: no second delta
+    resource.vendor = "Acme"
+    db_session.commit()
+    refresh_dirty(db_session)  # same alerts as before: no delta either
+    db_session.commit()
+
+    deltas = [e for e in events.events_after(db_session, after) if e["event"] == "alerts"]
+    assert len(deltas) == 1
+    assert deltas[0]["entity_id"] == resource.id
+    assert [alert["type"] for alert in deltas[0]["payload"]] == ["resource_without_po"]
+    assert json.loads(events.format_event(deltas[0]).split("data: ")[1])["source_id"] == resource.id
+
+
+def test_stream_requires_authentication(client):
+    assert client.get("/events/stream").status_code == 401
@@ -0,0 +1,111 @@
+from sqlalchemy import event
+
+from app import hierarchy, models
+from app.auth import now_utc
+
+
+def _chain(db_session, admin_user, group_id, suffix, line_item=None):
+    """BudgetItem/BusinessCase -> line item -> WBS -> asset -> PO -> GR; reuses line_item when given."""
+    if line_item is None:
+        bi = models.BudgetItem(workday_ref=f"WD-H-{suffix}", title="BI", budget_amount=1000, currency="USD",
+                               fiscal_year=2025, owner_group_id=group_id, created_by=admin_user.id)
+        bc = models.BusinessCase(title=f"Case {suffix}", status="Draft", created_by=admin_user.id)
+        db_session.add_all([bi, bc])
+        db_session.flush()
+        line_item = models.BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=bi.id, title="LI",
+                                                spend_category="OPEX", requested_amount=100, currency="USD",
+                                                owner_group_id=group_id, created_by=admin_user.id)
+        db_session.add(line_item)
+        db_session.flush()
+    wbs = models.WBS(business_case_line_item_id=line_item.id, wbs_code=f"WBS-H-{suffix}", owner_group_id=group_id,
+                     created_by=admin_user.id)
+    db_session.add(wbs)
+    db_session.flush()
+    asset = models.Asset(wbs_id=wbs.id, asset_code=f"AS-H-{suffix}", owner_group_id=group_id,
+                         created_by=admin_user.id)
+    db_session.add(asset)
+    db_session.flush()
+    po = models.PurchaseOrder(asset_id=asset.id, po_number=f"PO-H-{suffix}", total_amount=100,
+                              spend_category="OPEX", owner_group_id=group_id, status="Open",
+                              created_by=admin_user.id, created_at=now_utc())
+    db_session.add(po)
+    db_session.flush()
+    gr = models.GoodsReceipt(po_id=po.id, gr_number=f"GR-H-{suffix}", amount=10, owner_group_id=group_id,
+                             created_by=admin_user.id)
+    db_session.add(gr)
+    db_session.commit()
+    return line_item, wbs, asset, po, gr
+
+
+def _descendants(db_session, node_type, node_id, descendant_type):
+    return set(db_session.execute(hierarchy.descendant_ids_select(node_type, node_id, descendant_type)).scalars())
+
+
+def test_descendants_and_root_are_single_lookups(admin_user, test_group, db_session):
+    line_item, wbs, asset, po, gr = _chain(db_session, admin_user, test_group.id, "1")
+    _, wbs_2, _, po_2, gr_2 = _chain(db_session, admin_user, test_group.id, "2", line_item=line_item)
+    business_case_id, budget_item_id, gr_ids = line_item.business_case_id, line_item.budget_item_id, {gr.id, gr_2.id}
+    gr_2_id = gr_2.id
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        descendants = _descendants(db_session, "BusinessCase", business_case_id, "GoodsReceipt")
+        budget_item_ids = hierarchy.ancestor_ids(db_session, "GoodsReceipt", gr_2_id, "BudgetItem")
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 2
+    assert descendants == gr_ids
+    assert budget_item_ids == [budget_item_id]
+
+    assert _descendants(db_session, "WBS", wbs.id, "PurchaseOrder") == {po.id}
+    assert _descendants(db_session, "PurchaseOrder", po.id, "PurchaseOrder") == {po.id}
+    assert hierarchy.check(db_session.connection()) == (set(), set())
+
+
+def test_reparenting_moves_the_whole_subtree(admin_user, test_group, db_session):
+    line_item, wbs, asset, po, gr = _chain(db_session, admin_user, test_group.id, "1")
+    other_line_item, other_wbs, *_ = _chain(db_session, admin_user, test_group.id, "2")
+
+    # Move the asset (with its PO and GR) to the other WBS
+    asset.wbs_id = other_wbs.id
+    db_session.commit()
+    assert _descendants(db_session, "WBS", wbs.id, "GoodsReceipt") == set()
+    assert gr.id in _descendants(db_session, "WBS", other_wbs.id, "GoodsReceipt")
+    assert hierarchy.ancestor_ids(db_session, "GoodsReceipt", gr.id, "BusinessCase") == [
+        other_line_item.business_case_id
+    ]
+
+    # Re-parenting higher up carries everything below it
+    other_wbs.business_case_line_item_id = line_item.id
+    db_session.commit()
+    assert hierarchy.ancestor_ids(db_session, "GoodsReceipt", gr.id, "BusinessCase") == [line_item.business_case_id]
+    assert hierarchy.check(db_session.connection()) == (set(), set())
+
+    gr_id = gr.id
+    db_session.delete(gr)
+    db_session.delete(po)
+    db_session.commit()
+    assert gr_id not in _descendants(db_session, "BusinessCaseLineItem", line_item.id, "GoodsReceipt")
+    assert _descendants(db_session, "Asset", asset.id, "PurchaseOrder") == set()
+    assert hierarchy.ancestor_ids(db_session, "GoodsReceipt", gr_id, "BusinessCase") == []
+    assert hierarchy.check(db_session.connection()) == (set(), set())
+
+def test_rebuild_and_cli(admin_user, test_group, db_session, capsys):
+    _chain(db_session, admin_user, test_group.id, "1")
+    conn = db_session.connection()
+    expected = hierarchy.stored_rows(conn)
+
+    conn.execute(models.HierarchyClosure.__table__.delete())
+    assert hierarchy.needs_rebuild(conn)
+    missing, unexpected = hierarchy.check(conn)
+    assert missing == expected and unexpected == set()
+
+    assert hierarchy.rebuild(conn) == len(expected)
+    assert hierarchy.stored_rows(conn) == expected
+    assert not hierarchy.needs_rebuild(conn)
+    db_session.commit()
+
+    assert hierarchy.main(["check"]) == 0
+    assert "matches" in capsys.readouterr().out
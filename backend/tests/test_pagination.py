@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from app.auth import now_utc
+
+
+def _make_budget_items(db_session, admin_user, test_group):
+    from app.models import BudgetItem
+
+    base = now_utc()
+    # Two items share a timestamp and one has none, to exercise the id tie-break and NULLS LAST
+    created = [base, base - timedelta(days=1), base - timedelta(days=1), base - timedelta(days=2), None,
+               base - timedelta(days=3), base - timedelta(days=4)]
+    for n, created_at in enumerate(created):
+        db_session.add(BudgetItem(
+            workday_ref=f"WD-PAGE-{n:03d}",
+            title=f"Item {n}",
+            budget_amount=1000,
+            currency="USD",
+            fiscal_year=2025,
+            owner_group_id=test_group.id,
+            created_by=admin_user.id,
+            created_at=created_at
+        ))
+    db_session.commit()
+
+
+def test_cursor_pages_match_full_listing(client, admin_user, admin_token, test_group, db_session):
+    """Walking X-Next-Cursor returns every row once, in the same order as one big page."""
+    _make_budget_items(db_session, admin_user, test_group)
+
+    full = client.get("/budget-items?limit=100", cookies={"access_token": admin_token})
+    assert "X-Next-Cursor" not in full.headers
+    expected = [item["id"] for item in full.json()]
+    assert len(expected) == 7
+
+    seen = []
+    url = "/budget-items?limit=3"
+    while True:
+        response = client.get(url, cookies={"access_token": admin_token})
+        assert response.status_code == 200
+        seen += [item["id"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        url = f"/budget-items?limit=3&cursor={cursor}"
+
+    assert seen == expected
+    # NULL created_at sorts last
+    assert full.json()[-1]["created_at"] is None
+
+
+def test_skip_limit_still_supported(client, admin_user, admin_token, test_group, db_session):
+    """Offset pagination keeps working and also reports a cursor for the next page."""
+    _make_budget_items(db_session, admin_user, test_group)
+
+    full = [item["id"] for item in client.get("/budget-items", cookies={"access_token": admin_token}).json()]
+    response = client.get("/budget-items?skip=2&limit=2", cookies={"access_token": admin_token})
+    assert [item["id"] for item in response.json()] == full[2:4]
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/budget-items?limit=2&cursor={cursor}", cookies={"access_token": admin_token})
+    assert [item["id"] for item in response.json()] == full[4:6]
+
+
+def test_zero_limit_returns_no_rows(client, admin_user, admin_token, test_group, db_session):
+    _make_budget_items(db_session, admin_user, test_group)
+
+    response = client.get("/budget-items?limit=0", cookies={"access_token": admin_token})
+    assert response.status_code == 200 and response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_invalid_cursor_rejected(client, admin_token):
+    response = client.get("/budget-items?cursor=not-a-cursor", cookies={"access_token": admin_token})
+    assert response.status_code == 400
+
+
+def test_cursor_query_seeks_composite_index(db_session):
+    """The next-page query is an index range seek, not a scan plus sort."""
+    from fastapi import Response
+    from sqlalchemy import event
+    from app import models
+    from app.pagination import encode_cursor, paginate
+
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, context, many: statements.append((statement, parameters))
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        paginate(db_session.query(models.BudgetItem), models.BudgetItem.created_at, models.BudgetItem.id,
+                 Response(), 10, cursor=encode_cursor(now_utc().replace(tzinfo=None), 5))
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+    statement, parameters = statements[0]
+    plan = " ".join(row[-1] for row in db_session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters
+    ))
+    assert "ix_budget_item_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,51 @@
+def test_hasher_round_trip_in_pool():
+    """Hashes produced by the worker processes verify correctly."""
+    from app.password_hashing import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    try:
+        hashed = hasher.hash("Secret123!")
+        assert hasher.verify("Secret123!", hashed)
+        assert not hasher.verify("wrong", hashed)
+        stats = hasher.stats()
+        assert stats["completed"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["latency_seconds"]["max"] > 0
+    finally:
+        hasher.shutdown()
+
+
+def test_full_queue_rejects_immediately():
+    """Once every worker and queue slot is taken, new requests fail fast."""
+    import pytest
+    from app.password_hashing import PasswordHasher, PasswordHashingBusy
+
+    hasher = PasswordHasher(workers=0, queue_size=0)
+    hasher._slots.acquire()  # Simulate a hash in progress
+    with pytest.raises(PasswordHashingBusy):
+        hasher.hash("Secret123!")
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_login_returns_503_when_hashing_is_saturated(client, regular_user, monkeypatch):
+    """Login sheds load with 503 and Retry-After instead of queueing."""
+    from app import auth
+    from app.password_hashing import PasswordHasher
+
+    saturated = PasswordHasher(workers=0, queue_size=0)
+    saturated._slots.acquire()
+    monkeypatch.setattr(auth, "hasher", saturated)
+
+    response = client.post("/auth/login", data={"username": "testuser", "password": "testpass123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+
+def test_password_hashing_stats_admin_only(client, admin_token, user_token):
+    """Hashing pool metrics are exposed to admins."""
+    response = client.get("/admin/password-hashing", cookies={"access_token": admin_token})
+    assert response.status_code == 200
+    assert {"queue_depth", "in_flight", "rejected", "latency_seconds"} <= set(response.json())
+
+    response = client.get("/admin/password-hashing", cookies={"access_token": user_token})
+    assert response.status_code == 403
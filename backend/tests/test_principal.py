@@ -0,0 +1,68 @@
+import logging
+
+from app.auth import now_utc
+
+
+def test_principal_loads_memberships_once(db_session, regular_user, test_group):
+    """Group IDs are queried once and reused for the rest of the request."""
+    from sqlalchemy import event
+    from app.auth import Principal
+    from app.models import UserGroupMembership
+
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        principal = Principal(regular_user, db_session)
+        assert principal.group_ids == [test_group.id]
+        assert principal.in_group(test_group.id)
+        assert not principal.in_group(test_group.id + 1)
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+    assert len([s for s in statements if "user_group_membership" in s]) == 1
+    assert principal.queries_saved == 2
+
+
+def test_record_access_reports_saved_queries(client, admin_user, regular_user, user_token, test_group, db_session,
+                                             caplog):
+    """check_record_access reuses the request principal for owner-group and grant checks."""
+    from app.models import BudgetItem, RecordAccess, UserGroup, UserGroupMembership
+
+    other_group = UserGroup(name="Owner Group", created_by=admin_user.id)
+    db_session.add(other_group)
+    db_session.add(UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    db_session.commit()
+
+    budget = BudgetItem(
+        workday_ref="WD-PRINCIPAL-001",
+        title="Granted via group",
+        budget_amount=1000,
+        currency="USD",
+        fiscal_year=2025,
+        owner_group_id=other_group.id,
+        created_by=admin_user.id,
+        created_at=now_utc()
+    )
+    db_session.add(budget)
+    db_session.commit()
+    db_session.add(RecordAccess(
+        record_type="BudgetItem",
+        record_id=budget.id,
+        group_id=test_group.id,
+        access_level="Read",
+        granted_by=admin_user.id,
+        granted_at=now_utc()
+    ))
+    db_session.commit()
+
+    with caplog.at_level(logging.DEBUG, logger="app.main"):
+        response = client.get(f"/budget-items/{budget.id}", cookies={"access_token": user_token})
+    assert response.status_code == 200
+    assert "X-Principal-Queries-Saved" not in response.headers
+    [message] = [record.getMessage() for record in caplog.records if "principal cache saved" in record.getMessage()]
+    assert int(message.split("saved ")[1].split()[0]) >= 1
@@ -0,0 +1,51 @@
+def test_cached_principal_skips_user_lookup(client, regular_user, user_token, db_session):
+    """Repeated requests with the same token are served from the principal cache."""
+    from app import principal_cache
+
+    stats_before = principal_cache.cache.stats()
+    for _ in range(3):
+        response = client.get("/auth/me", cookies={"access_token": user_token})
+        assert response.status_code == 200
+        assert response.json()["username"] == "testuser"
+    stats_after = principal_cache.cache.stats()
+    assert stats_after["hits"] - stats_before["hits"] >= 2
+
+
+def test_role_change_invalidates_cached_principal(client, admin_token, regular_user, user_token, db_session):
+    """Changing a user's role is visible on the user's next request."""
+    response = client.get("/audit-logs", cookies={"access_token": user_token})
+    assert response.status_code == 403
+
+    response = client.put(
+        f"/users/{regular_user.id}",
+        json={"role": "Manager"},
+        cookies={"access_token": admin_token}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/audit-logs", cookies={"access_token": user_token})
+    assert response.status_code == 200
+
+
+def test_version_stamp_clears_other_workers(db_session, regular_user):
+    """A bumped version stamp clears caches that did not see the invalidation."""
+    from app import principal_cache
+
+    other_worker = principal_cache.PrincipalCache(16, 60, max_staleness_seconds=0)
+    other_worker.put("token-a", regular_user, None)
+    assert other_worker.get("token-a", db_session) is not None
+
+    principal_cache.bump_version(db_session)
+    db_session.commit()
+
+    assert other_worker.get("token-a", db_session) is None
+
+
+def test_entries_expire_with_token(db_session, regular_user):
+    """Entries never outlive the token's exp claim."""
+    import time
+    from app import principal_cache
+
+    cache = principal_cache.PrincipalCache(16, 60, max_staleness_seconds=60)
+    cache.put("expired-token", regular_user, time.time() - 1)
+    assert cache.get("expired-token", db_session) is None
@@ -0,0 +1,139 @@
+import threading
+from datetime import timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.auth import now_utc
+from app.jobs import delete_expired_record_access
+from app.scheduler import Scheduler
+
+
+def _scheduler(db_session, holder, **kwargs):
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    return Scheduler(factory, holder=holder, **kwargs)
+
+
+def test_single_leader_and_failover(db_session):
+    first = _scheduler(db_session, "pod-a")
+    second = _scheduler(db_session, "pod-b")
+
+    assert first.try_acquire_lease()
+    assert not second.try_acquire_lease()
+    assert first.try_acquire_lease()  # renewal
+
+    # pod-a stops renewing; once the lease expires pod-b takes over
+    lease = db_session.get(models.SchedulerLease, "scheduler")
+    lease.expires_at = now_utc() - timedelta(seconds=1)
+    db_session.commit()
+    assert second.try_acquire_lease()
+    assert not first.try_acquire_lease()
+
+    second.stop()  # releases the lease
+    assert first.try_acquire_lease()
+
+
+def test_due_jobs_run_and_record_status(db_session):
+    scheduler = _scheduler(db_session, "pod-a")
+    calls = []
+
+    def failing(db):
+        raise RuntimeError("boom")
+
+    scheduler.register("counter", lambda db: calls.append(1), interval_seconds=60)
+    scheduler.register("failing", failing, interval_seconds=60)
+    try:
+        # First tick only schedules; nothing is due yet
+        assert scheduler.tick(now=1000) == []
+        for future in scheduler.tick(now=1061):
+            future.result()
+    finally:
+        scheduler.stop()
+
+    assert calls == [1]
+    db_session.expire_all()
+    jobs = {job["name"]: job for job in scheduler.status(db_session)["jobs"]}
+    assert jobs["counter"]["last_status"] == "ok"
+    assert jobs["counter"]["run_count"] == 1
+    assert jobs["counter"]["last_duration_ms"] is not None
+    assert jobs["failing"]["last_status"] == "error"
+    assert "boom" in jobs["failing"]["last_error"]
+    assert jobs["failing"]["failure_count"] == 1
+
+
+def test_follower_does_not_run_jobs_and_timeouts_are_flagged(db_session):
+    leader = _scheduler(db_session, "pod-a")
+    follower = _scheduler(db_session, "pod-b")
+    release = threading.Event()
+    follower.register("slow", lambda db: release.wait(5), interval_seconds=60, timeout_seconds=0.01)
+    leader.try_acquire_lease()
+    try:
+        follower.trigger("slow")
+        assert follower.tick() == []
+
+        leader.stop()
+        follower.trigger("slow")
+        [future] = follower.tick()
+        threading.Event().wait(0.05)
+        follower.trigger("slow")
+        assert follower.tick() == []  # still running: not started twice, flagged instead
+        assert follower.jobs["slow"].timed_out
+        release.set()
+        future.result()
+    finally:
+        release.set()
+        follower.stop()
+
+    db_session.expire_all()
+    assert db_session.get(models.SchedulerJob, "slow").last_status == "timeout"
+
+
+def test_delete_expired_record_access(db_session, regular_user, admin_user):
+    expired = models.RecordAccess(record_type="PurchaseOrder", record_id=1, user_id=regular_user.id,
+                                  access_level="Read", granted_by=admin_user.id,
+                                  expires_at=now_utc() - timedelta(days=1))
+    current = models.RecordAccess(record_type="PurchaseOrder", record_id=2, user_id=regular_user.id,
+                                  access_level="Read", granted_by=admin_user.id,
+                                  expires_at=now_utc() + timedelta(days=1))
+    permanent = models.RecordAccess(record_type="PurchaseOrder", record_id=3, user_id=regular_user.id,
+                                    access_level="Read", granted_by=admin_user.id)
+    db_session.add_all([expired, current, permanent])
+    db_session.commit()
+    expired_id = expired.id
+
+    assert delete_expired_record_access(db_session) == 1
+    remaining = {grant.record_id for grant in db_session.query(models.RecordAccess)}
+    assert remaining == {2, 3}
+    audit = db_session.query(models.AuditLog).filter_by(table_name="record_access", record_id=expired_id).one()
+    assert audit.action == "DELETE"
+
+
+def test_jobs_endpoint_admin_only(client, admin_token, user_token):
+    response = client.get("/admin/jobs", cookies={"access_token": admin_token})
+    assert response.status_code == 200
+    names = {job["name"] for job in response.json()["jobs"]}
+    assert {"refresh_alerts", "delete_expired_record_access"} <= names
+
+    assert client.get("/admin/jobs", cookies={"access_token": user_token}).status_code == 403
+    assert client.post("/admin/jobs/unknown/run", cookies={"access_token": admin_token}).status_code == 404
+
+
+def test_stop_does_not_wait_for_running_jobs(db_session):
+    scheduler = _scheduler(db_session, "pod-a")
+    started, release = threading.Event(), threading.Event()
+    scheduler.register("long", lambda db: started.set() or release.wait(5), interval_seconds=60)
+    assert scheduler.try_acquire_lease()
+    try:
+        scheduler.trigger("long")
+        [future] = scheduler.tick()
+        assert started.wait(5)
+
+        scheduler.stop(timeout=0.1)
+        assert not future.done()
+        # Still running, so the lease is left to expire instead of handed over
+        other = _scheduler(db_session, "pod-b")
+        assert not other.try_acquire_lease()
+    finally:
+        release.set()
+    future.result()
+
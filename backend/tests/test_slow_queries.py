@@ -0,0 +1,40 @@
+from app import models, slow_queries
+from app.auth import now_utc
+
+
+def test_fingerprint_and_parameter_shape():
+    assert slow_queries.fingerprint("SELECT * FROM po WHERE id IN (?, ?)") == \
+        slow_queries.fingerprint("SELECT *  FROM po WHERE id IN (?)")
+    assert slow_queries.parameter_shape((1, 2, "x"), False) == {"count": 3, "types": {"int": 2, "str": 1}}
+    assert slow_queries.parameter_shape([(1,), (2,)], True) == {"count": 1, "types": {"int": 1}, "rows": 2}
+
+
+def test_slow_queries_are_recorded_with_plan_and_route(
+    client, admin_user, admin_token, user_token, test_group, db_session, monkeypatch
+):
+    db_session.add(models.PurchaseOrder(asset_id=1, po_number="PO-SLOW", total_amount=10, spend_category="OPEX",
+                                        owner_group_id=test_group.id, status="Open", created_by=admin_user.id,
+                                        created_at=now_utc()))
+    db_session.commit()
+    slow_queries.log.clear()
+    monkeypatch.setattr(slow_queries.log, "threshold_ms", 0)
+
+    for _ in range(2):
+        assert client.get("/purchase-orders/?supplier=acme", cookies={"access_token": admin_token}).status_code == 200
+    monkeypatch.setattr(slow_queries.log, "threshold_ms", 10_000)
+
+    report = client.get("/admin/slow-queries?limit=200", cookies={"access_token": admin_token}).json()
+    listed = [entry for entry in report["recent"] if entry["route"] == "GET /purchase-orders/"
+              and "FROM purchase_order" in entry["statement"]]
+    assert len(listed) == 2
+    # The plan is captured once per fingerprint, values are never stored
+    assert listed[1]["plan"] and any("purchase_order" in line for line in listed[1]["plan"])
+    assert listed[0]["plan"] is None
+    assert "acme" not in str(listed[0]["parameters"]) and listed[0]["parameters"]["types"]["str"] >= 1
+
+    [top] = [item for item in report["top"] if item["fingerprint"] == listed[0]["fingerprint"]]
+    assert top["count"] == 2 and top["routes"] == {"GET /purchase-orders/": 2} and top["plan"]
+
+    assert client.get("/admin/slow-queries", cookies={"access_token": user_token}).status_code == 403
+    assert client.delete("/admin/slow-queries", cookies={"access_token": admin_token}).json() == {"cleared": True}
+    assert client.get("/admin/slow-queries", cookies={"access_token": admin_token}).json()["recent"] == []
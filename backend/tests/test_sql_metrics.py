@@ -0,0 +1,98 @@
+import logging
+
+import pytest
+from sqlalchemy import select
+
+from app import models, sql_metrics
+from app.auth import now_utc
+
+# Query ceilings for list endpoints, measured for a restricted user with 20 rows
+# per type. They must not depend on the number of rows; raise them deliberately.
+LIST_ENDPOINT_LIMITS = {
+    "/budget-items/": 1,
+    "/business-cases/": 1,
+    "/business-case-line-items/": 1,
+    "/wbs/": 1,
+    "/assets/": 1,
+    "/purchase-orders/": 1,
+    "/goods-receipts/": 1,
+    "/resources/": 1,
+    "/allocations/": 1,
+    "/alerts/": 4,
+}
+
+
+def test_statement_shape_collapses_in_lists():
+    one = sql_metrics.statement_shape("SELECT * FROM po\n WHERE id IN (?, ?, ?)")
+    other = sql_metrics.statement_shape("SELECT * FROM po WHERE id IN (?)")
+    assert one == other == "SELECT * FROM po WHERE id IN (?)"
+    assert sql_metrics.statement_shape("WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == "WHERE id IN (?)"
+
+
+def test_repeated_shapes_are_reported(db_session, caplog, monkeypatch):
+    monkeypatch.setattr(sql_metrics, "SQL_N_PLUS_ONE_THRESHOLD", 3)
+    with sql_metrics.track() as stats:
+        for user_id in range(4):
+            db_session.execute(select(models.User).where(models.User.id == user_id)).all()
+        db_session.execute(select(models.UserGroup)).all()
+
+    assert stats.count == 5
+    [(shape, count)] = stats.repeated()
+    assert count == 4 and "FROM user" in shape
+    with caplog.at_level(logging.WARNING, logger="app.sql_metrics"):
+        sql_metrics.report("GET", "/things", stats)
+    assert "possible N+1, 4 x" in caplog.text
+
+
+def test_requests_get_server_timing_and_budget_warning(client, admin_token, caplog, monkeypatch):
+    monkeypatch.setattr(sql_metrics, "SQL_QUERY_BUDGET", 0)
+    with caplog.at_level(logging.WARNING, logger="app.sql_metrics"):
+        response = client.get("/purchase-orders/", cookies={"access_token": admin_token})
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert "queries" in response.headers["Server-Timing"]
+    assert "GET /purchase-orders/:" in caplog.text and "(budget 0)" in caplog.text
+
+
+@pytest.fixture
+def populated(db_session, admin_user, regular_user, test_group):
+    """20 records of each type in the user's group, plus a grant so the ACL has work to do."""
+    db_session.add(models.UserGroupMembership(user_id=regular_user.id, group_id=test_group.id))
+    common = {"owner_group_id": test_group.id, "created_by": admin_user.id}
+    for n in range(20):
+        bi = models.BudgetItem(workday_ref=f"WD-Q-{n}", title="BI", budget_amount=100, currency="USD",
+                               fiscal_year=2025, **common)
+        bc = models.BusinessCase(title=f"BC {n}", status="Draft", created_by=regular_user.id)
+        resource = models.Resource(name=f"R {n}", **common)
+        db_session.add_all([bi, bc, resource])
+        db_session.flush()
+        li = models.BusinessCaseLineItem(business_case_id=bc.id, budget_item_id=bi.id, title="LI",
+                                         spend_category="OPEX", requested_amount=10, currency="USD", **common)
+        db_session.add(li)
+        db_session.flush()
+        wbs = models.WBS(business_case_line_item_id=li.id, wbs_code=f"WBS-Q-{n}", **common)
+        db_session.add(wbs)
+        db_session.flush()
+        asset = models.Asset(wbs_id=wbs.id, asset_code=f"AS-Q-{n}", **common)
+        db_session.add(asset)
+        db_session.flush()
+        po = models.PurchaseOrder(asset_id=asset.id, po_number=f"PO-Q-{n}", total_amount=100, status="Open",
+                                  spend_category="OPEX", created_at=now_utc(), **common)
+        db_session.add(po)
+        db_session.flush()
+        db_session.add_all([
+            models.GoodsReceipt(po_id=po.id, gr_number=f"GR-Q-{n}", amount=5, **common),
+            models.ResourcePOAllocation(resource_id=resource.id, po_id=po.id, **common),
+        ])
+    db_session.add(models.RecordAccess(record_type="PurchaseOrder", record_id=1, user_id=regular_user.id,
+                                       access_level="Read", granted_by=admin_user.id))
+    db_session.commit()
+
+
+@pytest.mark.parametrize("path", LIST_ENDPOINT_LIMITS)
+def test_list_endpoint_query_ceilings(path, client, user_token, populated, max_queries):
+    # Steady state: principal cache warm, daily alert sweep done
+    client.get(path, cookies={"access_token": user_token})
+    with max_queries(LIST_ENDPOINT_LIMITS[path]):
+        response = client.get(path, cookies={"access_token": user_token})
+    assert response.status_code == 200
+    assert len(response.json()) > 0